@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+'''
+Compares the size of a bout's keyframe, and the time taken to prepare and
+read it, when its cells are sent as json and when they're packed into bytes
+(see net.CELL_FORMATS). The keyframe is taken part way through the bout,
+once each player has probed PROBES cells without hitting a mine.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_cells.py
+'''
+
+import random
+import json
+import time
+import gzip
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision import game, net
+
+BOARDS = [16, 50, 100]
+PLAYERS = 2
+PROBES = 5
+
+
+def main():
+    print('{:>8} {:>7} {:>10} {:>10} {:>10} {:>10}'.format(
+        'board', 'cells', 'payload B', 'gzip B', 'encode s', 'decode s'))
+    row = '{:>8} {:>7} {:>10} {:>10} {:>10.4f} {:>10.4f}'
+    for size in BOARDS:
+        random.seed(size)
+        bout = game.Bout(max_players=PLAYERS, minefield_size=(size, size))
+        for _ in range(PLAYERS):
+            player = bout.add_player()
+            field = player.mfield
+            for _ in range(PROBES):
+                safe = [(x, y) for x in range(size) for y in range(size)
+                        if not field.board[x][y].probed
+                        and field.board[x][y].contents != game.Contents.mine]
+                field.selected = list(random.choice(safe))
+                player.send_input('PROBE')
+        state = bout.json()
+        for cells in sorted(net.CELL_FORMATS):
+            # A new Frame each time, so nothing is cached
+            start = time.perf_counter()
+            payload = net.Frame(('new-state', state)).payload(cells)
+            encode = time.perf_counter() - start
+            start = time.perf_counter()
+            net.unpack_message(json.loads(payload.decode('utf-8')))
+            decode = time.perf_counter() - start
+            print(row.format('{0}x{0}'.format(size), cells, len(payload),
+                             len(gzip.compress(payload)), encode, decode))
+
+
+if __name__ == '__main__':
+    main()
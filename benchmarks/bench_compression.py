@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+'''
+Compares the bytes sent and the CPU time spent per message when each message
+is gzip compressed on its own, and when every message of a connection is
+compressed as one zlib stream (see net.Codec). The messages are those a
+player receives during a bout of random moves.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_compression.py
+'''
+
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision import game, net
+
+KEYS = ['UP', 'DOWN', 'LEFT', 'RIGHT', 'PROBE', 'FLAG']
+INPUTS = 2000
+
+
+def capture(size, players):
+    random.seed(1)
+    bout = game.Bout(max_players=players, minefield_size=(size, size))
+    added = [bout.add_player() for _ in range(players)]
+    for _ in range(INPUTS):
+        player = random.choice(added)
+        if player.living:
+            player.send_input(random.choice(KEYS))
+    msgs = []
+    while not added[0].stateq.empty():
+        msgs.append(net.Frame(added[0].stateq.get()))
+    for msg in msgs:
+        # The json is shared by every player's connection, so serializing it
+        # isn't part of the cost of compressing it
+        msg.payload()
+    return msgs
+
+
+def measure(msgs, stream):
+    sender, receiver = net.Codec(), net.Codec()
+    if stream:
+        sender.start_stream()
+    start = time.process_time()
+    if stream:
+        sent = [sender.encode(msg) for msg in msgs]
+    else:
+        # Encoding a frame for gzip also serializes it, which isn't wanted
+        sent = [net.gzip.compress(msg.payload()) + net.SEP for msg in msgs]
+    compress = time.process_time() - start
+    start = time.process_time()
+    for data in sent:
+        receiver.feed(data)
+    decompress = time.process_time() - start
+    return sum(len(data) for data in sent), compress, decompress
+
+
+def main():
+    print('{:>6} {:>8} {:>6} {:>8} {:>5} {:>10} {:>12} {:>12}'.format(
+        'board', 'players', 'msgs', 'json B', 'mode', 'bytes/msg',
+        'send us/msg', 'recv us/msg'))
+    row = '{:>6} {:>8} {:>6} {:>8.0f} {:>5} {:>10.1f} {:>12.1f} {:>12.1f}'
+    for size, players in [(16, 2), (16, 8), (50, 4)]:
+        msgs = capture(size, players)
+        count = len(msgs)
+        raw = sum(len(msg.payload()) for msg in msgs) / count
+        for mode in ('gzip', 'zlib'):
+            sent, compress, decompress = measure(msgs, mode == 'zlib')
+            print(row.format('{0}x{0}'.format(size), players, count, raw,
+                             mode, sent / count, compress / count * 1e6,
+                             decompress / count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+'''
+Times the difficulty analysis of freshly placed layouts, on its own and
+including the conversion of a minefield's mines to a bitboard.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_difficulty.py
+'''
+
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision.minesweeper.arrayfield import ArrayMineField
+from defusedivision.minesweeper.difficulty import analyze, bitboard
+
+BOARDS = [(9, 9, 10), (16, 16, 40), (30, 16, 99), (100, 100, 1600)]
+LAYOUTS = 200
+
+
+def main():
+    print('{:>14} {:>16} {:>16}'.format('board', 'analyze/s',
+                                        'difficulty()/s'))
+    for width, height, mines in BOARDS:
+        fields = [ArrayMineField(width, height, mines)
+                  for _ in range(LAYOUTS)]
+        boards = [bitboard(field.mines) for field in fields]
+        start = time.perf_counter()
+        for bits in boards:
+            analyze(width, height, bits)
+        analyzed = time.perf_counter() - start
+        start = time.perf_counter()
+        for field in fields:
+            field.difficulty()
+        scored = time.perf_counter() - start
+        print('{:>14} {:>16.0f} {:>16.0f}'.format(
+            '{}x{}/{}'.format(width, height, mines), LAYOUTS / analyzed,
+            LAYOUTS / scored))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+'''
+Compares the time taken to receive messages of growing size, arriving in
+8 KiB reads, by the SEP-delimited receive loop net.msg_recv used to run and
+by net.Codec, which reads length-prefixed frames into a reusable buffer.
+The messages are keyframes of bouts on boards of growing size. Both decode
+the messages; only the framing differs.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_framing.py
+'''
+
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision import game, net
+
+CHUNK = 8192
+BOARDS = [16, 50, 100, 200]
+REPEATS = 5
+
+
+class Chunks(object):
+    '''
+    Chunks stands in for a socket, returning `data` CHUNK bytes at a time.
+    '''
+
+    def __init__(self, data):
+        self.view = memoryview(data)
+
+    def recv(self, size):
+        size = min(size, CHUNK)
+        data, self.view = self.view[:size], self.view[size:]
+        return bytes(data)
+
+    def recv_into(self, buf):
+        size = min(len(buf), CHUNK, len(self.view))
+        buf[:size] = self.view[:size]
+        self.view = self.view[size:]
+        return size
+
+
+def legacy_receive(conn, count):
+    # The loop of the old msg_recv, concatenating and splitting every read
+    received = []
+    buf = bytes()
+    while len(received) < count:
+        if net.SEP in buf:
+            data = bytes()
+        else:
+            data = conn.recv(CHUNK)
+        inbuf = buf + data
+        if net.SEP in inbuf:
+            parts = inbuf.split(net.SEP)
+            buf = parts[-1]
+            received += [net.decode(msg) for msg in parts[:-1]]
+        else:
+            buf += data
+    return received
+
+
+def codec_receive(conn, count):
+    received = []
+    codec = net.Codec()
+    while len(received) < count:
+        received += codec.receive(conn)
+    return received
+
+
+def main():
+    print('{:>8} {:>10} {:>10} {:>10} {:>10}'.format(
+        'board', 'json B', 'frame B', 'legacy s', 'codec s'))
+    sender = net.Codec()
+    sender.agree({'version': 2})
+    for size in BOARDS:
+        bout = game.Bout(max_players=2, minefield_size=(size, size))
+        for _ in range(2):
+            bout.add_player()
+        msg = net.Frame(('new-state', bout.json()))
+        legacy, framed = msg.encoded(), sender.encode(msg)
+        expected = [net.decode(legacy[:-len(net.SEP)])]
+        timings = []
+        for receive, data in ((legacy_receive, legacy),
+                              (codec_receive, framed)):
+            best = None
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                received = receive(Chunks(data), 1)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            timings.append(best)
+            assert received == expected
+        print('{:>8} {:>10} {:>10} {:>10.4f} {:>10.4f}'.format(
+            '{0}x{0}'.format(size), len(msg.payload()), len(framed),
+            *timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+'''
+Compares the construction time and memory use of the minefield storage
+engines in game.MINEFIELD_ENGINES.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_minefield.py
+'''
+
+import tracemalloc
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision import game
+from defusedivision.minesweeper import topology
+
+SIZES = [16, 100, 500]
+
+
+def measure(constructor, size):
+    # Time and memory are measured separately, since tracing allocations
+    # slows down construction considerably.
+    start = time.perf_counter()
+    field = constructor(width=size, height=size)
+    elapsed = time.perf_counter() - start
+    del field
+    tracemalloc.start()
+    field = constructor(width=size, height=size)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del field
+    return elapsed, current
+
+
+def measure_topology(size):
+    topology.board_topology.cache_clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    topology.board_topology(size, size)
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, current
+
+
+def main():
+    print("{:>9} {:>10} {:>12} {:>12}".format('engine', 'size', 'seconds',
+                                              'MiB'))
+    row = "{:>9} {:>10} {:>12.4f} {:>12.2f}"
+    for size in SIZES:
+        dims = "{0}x{0}".format(size)
+        # A Topology is built once per board size and then shared by every
+        # minefield of that size, so it's measured on its own.
+        elapsed, mem = measure_topology(size)
+        print(row.format('topology', dims, elapsed, mem / (1 << 20)))
+        for name in sorted(game.MINEFIELD_ENGINES):
+            constructor = game.MINEFIELD_ENGINES[name]
+            elapsed, mem = measure(constructor, size)
+            print(row.format(name, dims, elapsed, mem / (1 << 20)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+'''
+Times the generation of no-guess minefields, reporting how long a player
+would wait on their first probe and how many candidate boards each core
+checks per second.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_noguess.py
+'''
+
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision.noguess import NoGuessGenerator
+
+BOARDS = [(9, 9, 10), (16, 16, 40), (30, 16, 99)]
+LAYOUTS = 10
+
+
+def main():
+    print('{:>10} {:>8} {:>10} {:>10} {:>14}'.format(
+        'board', 'found', 'mean ms', 'max ms', 'boards/s/core'))
+    for width, height, mines in BOARDS:
+        generator = NoGuessGenerator(budget=5)
+        waits = []
+        for _ in range(LAYOUTS):
+            start = time.perf_counter()
+            generator.layout(width, height, mines, (width // 2, height // 2))
+            waits.append(time.perf_counter() - start)
+        stats = generator.stats()
+        generator.close()
+        print('{:>10} {:>8} {:>10.1f} {:>10.1f} {:>14.1f}'.format(
+            '{}x{}/{}'.format(width, height, mines),
+            '{}/{}'.format(stats['solved'], stats['requests']),
+            sum(waits) / len(waits) * 1000, max(waits) * 1000,
+            stats['boards_per_core_sec']))
+    print('workers: {}'.format(os.cpu_count()))
+
+
+if __name__ == '__main__':
+    main()
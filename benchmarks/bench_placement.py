@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+'''
+Times mine placement at several densities, comparing the sampling done by
+minefield.mine_positions against the rejection loop it replaced.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_placement.py
+'''
+
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision.minesweeper.minefield import mine_positions
+
+SIZES = [100, 500]
+DENSITIES = [0.15, 0.40, 0.80]
+# Past this many seconds, the rejection loop is abandoned
+REJECTION_BUDGET = 30
+
+
+def rejection_positions(width, height, count, budget):
+    '''
+    The rejection loop formerly used by MineField._populate_mines. Returns
+    None if it fails to finish within `budget` seconds.
+    '''
+    selectionfuncs = [
+        lambda y: not (y % 2),
+        lambda y: bool(y % 2),
+        lambda y: not (y % 3),
+    ]
+    yconstraint, xconstraint = random.sample(selectionfuncs * 2, 2)
+    deadline = time.perf_counter() + budget
+    placed = set()
+    for x in range(count):
+        while True:
+            if time.perf_counter() > deadline:
+                return None
+            rx, ry = random.randint(0, width - 1), random.randint(
+                0, height - 1)
+            if random.randint(0, 1):
+                if yconstraint(ry):
+                    continue
+                if xconstraint(rx):
+                    continue
+            if (rx, ry) not in placed:
+                placed.add((rx, ry))
+                break
+    return list(placed)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    rv = func(*args)
+    return time.perf_counter() - start, rv
+
+
+def main():
+    print("{:>10} {:>8} {:>12} {:>12}".format('size', 'density', 'sampling',
+                                              'rejection'))
+    for size in SIZES:
+        for density in DENSITIES:
+            count = int(density * size * size)
+            sampled, _ = timed(mine_positions, size, size, count)
+            rejected, rv = timed(rejection_positions, size, size, count,
+                                 REJECTION_BUDGET)
+            rejected = "{:.4f}".format(rejected) if rv else "gave up"
+            print("{:>10} {:>8.0%} {:>12.4f} {:>12}".format(
+                "{0}x{0}".format(size), density, sampled, rejected))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+'''
+Times the minefield solver on positions taken from games it plays itself:
+starting from an opening, every safe cell it finds is probed, and when it
+finds none the cell least likely to hold a mine is probed instead.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_solver.py
+'''
+
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision.minesweeper.arrayfield import ArrayMineField
+from defusedivision.minesweeper.solver import solve_field
+
+BOARDS = [(16, 16, 40), (30, 16, 99), (100, 100, 1600)]
+GAMES = 20
+
+
+def play(field, timings):
+    '''
+    Plays `field` to the end, appending the time taken by each solve to
+    `timings`. Returns True if the game was won.
+    '''
+    zeros = [idx for idx in range(field.width * field.height)
+             if not field.mines[idx] and not field.contacts[idx]]
+    field.probe(*divmod(random.choice(zeros), field.height))
+    while field.safe_remaining:
+        start = time.perf_counter()
+        solution = solve_field(field)
+        timings.append(time.perf_counter() - start)
+        moves = [pos for pos in solution.safe
+                 if not field.board[pos[0]][pos[1]].probed]
+        if not moves:
+            unprobed = [divmod(idx, field.height)
+                        for idx in range(field.width * field.height)
+                        if not field.probed[idx]]
+            moves = [min(unprobed, key=lambda p: solution.probability(*p))]
+        for x, y in moves:
+            if field.mines[x * field.height + y]:
+                return False
+            field.probe(x, y)
+    return True
+
+
+def main():
+    random.seed(0)
+    print('{:>12} {:>8} {:>10} {:>10} {:>10} {:>6}'.format(
+        'board', 'solves', 'median ms', 'p95 ms', 'max ms', 'won'))
+    for width, height, mines in BOARDS:
+        timings = []
+        won = 0
+        games = GAMES if width * height < 5000 else 3
+        for _ in range(games):
+            won += play(ArrayMineField(width, height, mines), timings)
+        timings.sort()
+        print('{:>12} {:>8} {:>10.3f} {:>10.3f} {:>10.3f} {:>6}'.format(
+            '{}x{}/{}'.format(width, height, mines), len(timings),
+            timings[len(timings) // 2] * 1000,
+            timings[int(len(timings) * 0.95)] * 1000,
+            timings[-1] * 1000, '{}/{}'.format(won, games)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+'''
+Measures how many state messages a dedicated server delivers per second to
+many players in 2-player bouts, with the bouts hosted in one process or
+spread over several worker processes. The players run in a separate process
+of their own, each sending inputs as fast as the server answers.
+
+Run from the root of the repository:
+
+    python3 benchmarks/bench_supervisor.py [WORKERS ...]
+'''
+
+import multiprocessing
+import threading
+import logging
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from defusedivision import game
+from defusedivision.client.client import PlayerClient
+from defusedivision.server import lobby, server, supervisor
+
+PLAYERS = 64
+DURATION = 5.0
+KEYS = ['UP', 'DOWN', 'LEFT', 'RIGHT', 'FLAG']
+
+
+def make_lobby(srv):
+    return lobby.Lobby(srv, bout_options={
+        'minefield_constructor': game.MINEFIELD_ENGINES['array'],
+        'tick_rate': 30,
+    })
+
+
+def play(port, results):
+    join = {'width': 16, 'height': 16, 'players': 2}
+    clients = [PlayerClient('127.0.0.1', port, join=join)
+               for _ in range(PLAYERS)]
+    received = [0]
+    lock = threading.Lock()
+    deadline = time.time() + DURATION
+
+    def run(client):
+        while time.time() < deadline:
+            client.send_input(random.choice(KEYS))
+            client.get_state()
+            with lock:
+                received[0] += 1
+
+    threads = [threading.Thread(target=run, args=(c, ), daemon=True)
+               for c in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(received[0] / DURATION)
+
+
+def measure(workers):
+    port = random.randint(20000, 40000)
+    srv = server.Server('127.0.0.1', port)
+    if workers == 1:
+        runner = make_lobby(srv)
+    else:
+        runner = supervisor.Supervisor(srv, make_lobby, workers=workers)
+    threading.Thread(target=runner.serve, daemon=True).start()
+    results = multiprocessing.Queue()
+    player = multiprocessing.Process(target=play, args=(port, results))
+    player.start()
+    rate = results.get()
+    player.join()
+    runner.close()
+    return rate
+
+
+def main():
+    logging.basicConfig(level=logging.ERROR)
+    counts = [int(arg) for arg in sys.argv[1:]] or [1, os.cpu_count() or 1]
+    print('{} cores, {} players'.format(os.cpu_count(), PLAYERS))
+    print('{:>8} {:>14}'.format('workers', 'messages/s'))
+    for workers in counts:
+        print('{:>8} {:>14.0f}'.format(workers, measure(workers)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+'''
+Module boardpool keeps minefields generated ahead of time, so that a player
+joining a Bout or asking for a new minefield doesn't have to wait for one to
+be built.
+'''
+
+import collections
+import threading
+import logging
+import queue
+
+from .concurrency import concurrent
+from .minesweeper.minefield import MineField
+
+
+class BoardFactory(object):
+    """
+    Class BoardFactory hands out minefields from bounded pools of ready-made
+    minefields, one pool per (width, height, mine_count). A background worker
+    refills the pools as boards are taken. Asking for a kind of minefield the
+    factory has no pool for yet builds one on request, and creates a pool for
+    it, so later requests for it are served from the pool.
+
+    `constructor` is a callable accepting the same arguments as class
+    `MineField`, used to build every minefield. At most `max_pools` pools of
+    `pool_size` boards each are kept. Once there are that many, the pool
+    least recently asked for is dropped to make room for a new one.
+    """
+
+    def __init__(self, constructor=None, pool_size=4, max_pools=16):
+        if constructor is None:
+            constructor = MineField
+        self.constructor = constructor
+        self.pool_size = pool_size
+        self.max_pools = max_pools
+        # Pools from least to most recently asked for
+        self.pools = collections.OrderedDict()
+        self.evicted = 0
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self._cond = threading.Condition()
+        self._refill()
+
+    @staticmethod
+    def _key(width, height, mine_count):
+        return (12 if width is None else width,
+                12 if height is None else height, mine_count)
+
+    def _pool(self, key):
+        '''
+        Method _pool returns the pool for `key`, creating it if there isn't
+        one, and dropping the least recently used pool if there are already
+        max_pools. Returns None if this factory keeps no pools.
+        '''
+        with self._cond:
+            if self.pool_size <= 0 or self.max_pools <= 0:
+                return None
+            if key in self.pools:
+                self.pools.move_to_end(key)
+            else:
+                while len(self.pools) >= self.max_pools:
+                    self.pools.popitem(last=False)
+                    self.evicted += 1
+                self.pools[key] = queue.Queue(maxsize=self.pool_size)
+            self._cond.notify()
+            return self.pools[key]
+
+    def prime(self, width=None, height=None, mine_count=None):
+        '''
+        Method prime starts filling the pool for the given kind of minefield
+        before any are asked for.
+        '''
+        self._pool(self._key(width, height, mine_count))
+
+    def get(self, width=None, height=None, mine_count=None):
+        '''
+        Method get returns a new minefield of the given kind, taken from its
+        pool if one is ready and otherwise built on the spot. Raises a
+        ValueError if the minefield is impossible to build.
+        '''
+        key = self._key(width, height, mine_count)
+        pool = self._pool(key)
+        try:
+            if pool is None:
+                raise queue.Empty()
+            field = pool.get_nowait()
+            with self._cond:
+                self.hits += 1
+        except queue.Empty:
+            with self._cond:
+                self.misses += 1
+            try:
+                field = self.constructor(
+                    width=key[0], height=key[1], mine_count=mine_count)
+            except ValueError:
+                with self._cond:
+                    self.pools.pop(key, None)
+                raise
+        logging.debug('Board pool stats: {}'.format(self.stats()))
+        return field
+
+    def stats(self):
+        '''
+        Method stats returns the hits and misses of this factory, how many
+        pools it dropped, and the number of boards ready in each pool.
+        '''
+        with self._cond:
+            pools = {
+                '{}x{}:{}'.format(*key): pool.qsize()
+                for key, pool in self.pools.items()
+            }
+            hits, misses = self.hits, self.misses
+            evicted = self.evicted
+            generated = self.generated
+        requests = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / requests if requests else 0.0,
+            'generated': generated,
+            'evicted': evicted,
+            'pools': pools,
+        }
+
+    def _emptiest(self):
+        '''
+        Method _emptiest returns the key and pool of the pool with the fewest
+        ready boards, or (None, None) if every pool is full.
+        '''
+        todo = [(pool.qsize(), key) for key, pool in self.pools.items()
+                if not pool.full()]
+        if not todo:
+            return None, None
+        _, key = min(todo, key=lambda t: t[0])
+        return key, self.pools[key]
+
+    @concurrent
+    def _refill(self):
+        '''
+        Method _refill runs forever in the background, building minefields for
+        whichever pool is emptiest.
+        '''
+        while True:
+            with self._cond:
+                key, pool = self._emptiest()
+                while key is None:
+                    self._cond.wait()
+                    key, pool = self._emptiest()
+            width, height, mine_count = key
+            try:
+                field = self.constructor(
+                    width=width, height=height, mine_count=mine_count)
+            except ValueError as e:
+                logging.warning('Cannot pool minefields {}: {}'.format(key, e))
+                with self._cond:
+                    self.pools.pop(key, None)
+                continue
+            except Exception:
+                # Only this pool is dropped; the others keep being refilled
+                logging.exception('Failed to build minefield {}'.format(key))
+                with self._cond:
+                    self.pools.pop(key, None)
+                continue
+            with self._cond:
+                self.generated += 1
+            try:
+                pool.put_nowait(field)
+            except queue.Full:
+                pass
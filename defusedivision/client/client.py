@@ -77,24 +77,45 @@ def zeroconf_info():
 
 
 class PlayerClient(game.Conveyor):
-    def __init__(self, host, port):
+    '''
+    PlayerClient plays in a Bout on a remote server. If `join` is given, it
+    asks the server's lobby for a bout with the given 'width', 'height',
+    'mine_count' and number of 'players'. Raises a ConnectionError if the
+    server turns the player away. Messages are framed with at most version
+    `version` of the protocol and compressed with a zlib stream if the server
+    offers them, unless `compress` is False, and cells are sent in the format
+    `cells` of net.CELL_FORMATS (see net.Codec).
+    '''
+
+    def __init__(self, host, port, join=None, compress=True,
+                 version=net.VERSION, cells='binary'):
         self.host = host
         self.port = int(port)
         self.stateq = queue.Queue()
         self.clientsock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.clientsock.connect((self.host, self.port))
-        net.msg_recv(self.clientsock, self.stateq.put, lambda: None)
+        self.codec = net.Codec()
+        if join is not None:
+            net.send(self.clientsock, {'join': join})
+        net.msg_recv(self.clientsock, self.stateq.put, lambda: None,
+                     codec=self.codec)
         conf = self.stateq.get()
         logging.debug("Conf: {}".format(conf))
+        if 'error' in conf:
+            # The server closes the connection, which stops msg_recv
+            raise ConnectionError(conf['error'])
         self.name = conf['name']
+        protocol = net.answer(conf.get('protocol'), version, compress, cells)
+        if protocol is not None:
+            self.codec.send(self.clientsock, {'protocol': protocol})
+            self.codec.agree(protocol)
 
     def send_input(self, inpt):
         logging.debug('PlayerClient "{}" sending: {}'.format(
             self.name, net.json_dump(inpt)))
         if isinstance(inpt, dict) and 'change-name' in inpt:
             self.name = inpt['change-name']
-        net.send(self.clientsock, inpt)
-        # self.clientsock.sendall(net.json_dump(inpt).encode('utf-8')+net.SEP)
+        self.codec.send(self.clientsock, inpt)
 
     def get_state(self):
         return self.stateq.get()
@@ -1,7 +1,14 @@
 
+import multiprocessing
 import threading
 import logging
 
+# How worker processes are started: from a clean process rather than forked
+# from the server, which has threads running by the time they're needed and
+# sockets its workers mustn't hold on to
+START_METHOD = ('forkserver' if 'forkserver' in
+                multiprocessing.get_all_start_methods() else 'spawn')
+
 
 def concurrent(f):
     """Concurrent is a decorator for a function which will cause that function
@@ -1,22 +1,21 @@
 #!/usr/bin/env python3
+import functools
 import logging
 import argparse
 import curses
-import time
-import sys
 import os
 
-# Since cell probing is donre recursively, for large minefields with fiew
-# mines, the default recursion limit may be reached.
-sys.setrecursionlimit(5000)
-
 # Set the delay on the escape key to be 100 milliseconds
 os.environ.setdefault('ESCDELAY', '100')
 
 from .termclient import termclient as tc
 from .server.server import Server
+from .server.lobby import Lobby, MAX_SIZE
+from .server.supervisor import Supervisor
 from .sound import sound
 from . import game
+from .boardpool import BoardFactory
+from .noguess import NoGuessGenerator
 from .termclient.menus import mainmenu
 from .termclient import instance_setup
 
@@ -67,11 +66,65 @@ def main():
         dest='serveronly',
         action='store_true',
         help='if true, run as dedicated server')
+    parser.add_argument(
+        '--engine',
+        default='cells',
+        choices=sorted(game.MINEFIELD_ENGINES.keys()),
+        help="how minefields are stored on the server (default=cells)")
+    parser.add_argument(
+        '--poolsize',
+        type=int,
+        default=4,
+        help="number of minefields of each size the server keeps ready "
+        "(default=4, 0 disables)")
+    parser.add_argument(
+        '--noguess',
+        type=float,
+        default=0,
+        help="seconds the server may spend finding a minefield which can be "
+        "solved without guessing when a player first probes (default=0, "
+        "disabled)")
+    parser.add_argument(
+        '--sharedlayout',
+        dest='sharedlayout',
+        action='store_true',
+        help='if passed, every player of a bout plays the same minefield')
+    parser.add_argument(
+        '--maxspread',
+        type=float,
+        default=None,
+        help="largest fraction by which the difficulty (3BV) of players' "
+        "minefields may differ (default=no limit)")
+    parser.add_argument(
+        '--tickrate',
+        type=float,
+        default=30,
+        help="most times a second the server sends changes to players "
+        "(default=30, 0 sends every change right away)")
+    parser.add_argument(
+        '--maxbouts',
+        type=int,
+        default=200,
+        help="most bouts a dedicated server hosts at once (default=200)")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="number of processes a dedicated server hosts bouts in "
+        "(default=1, 0 starts one per core)")
+    parser.add_argument(
+        '--jsoncells',
+        dest='jsoncells',
+        action='store_true',
+        help='if passed, boards are sent over the network as json rather '
+        'than packed, for debugging')
     parser.set_defaults(space=True)
     parser.set_defaults(debug=False)
     parser.set_defaults(maxsize=False)
     parser.set_defaults(withsound=False)
     parser.set_defaults(serveronly=False)
+    parser.set_defaults(sharedlayout=False)
+    parser.set_defaults(jsoncells=False)
     args = parser.parse_args()
 
     if args.debug:
@@ -108,26 +161,65 @@ def main():
             port = args.port
 
         srv = Server(host, int(port))
-        bout = game.Bout(
-            max_players=3,
-            minefield_size=(args.width, args.height),
-            player_constructor=srv.create_player)
+        if args.workers == 1:
+            runner = make_lobby(args, srv)
+        else:
+            runner = Supervisor(
+                srv,
+                functools.partial(make_lobby, args),
+                workers=args.workers or None,
+                kind_options=kind_options(args))
 
         try:
             print("Running server on interface '{}' port '{}'".format(host,
                                                                       port))
             print("Press Ctrl-C to exit")
-            while True:
-                bout.add_player()
-                if len(bout.players) >= bout.max_players:
-                    time.sleep(0.3)
+            runner.serve()
         except KeyboardInterrupt:
+            runner.close()
+            logging.info('Final stats: {}'.format(runner.stats()))
             return
 
     # Run our terminal client
     print(curses.wrapper(dotheui, args))
 
 
+def kind_options(args):
+    '''
+    Function kind_options returns the default and largest size of the boards
+    of a dedicated server, configured by the command line arguments `args`.
+    '''
+    default_size = (args.width or 16, args.height or 16)
+    return {
+        'default_size': default_size,
+        'max_size': tuple(map(max, MAX_SIZE, default_size)),
+    }
+
+
+def make_lobby(args, srv):
+    '''
+    Function make_lobby returns the Lobby of a dedicated server, accepting
+    players on `srv` (or None, for a worker of a Supervisor), configured by
+    the command line arguments `args`.
+    '''
+    constructor = game.MINEFIELD_ENGINES[args.engine]
+    generator = None
+    if args.noguess > 0:
+        generator = NoGuessGenerator(budget=args.noguess)
+    return Lobby(
+        srv,
+        max_bouts=args.maxbouts,
+        **kind_options(args),
+        bout_options={
+            'minefield_constructor': constructor,
+            'board_factory': BoardFactory(constructor, args.poolsize),
+            'layout_generator': generator,
+            'shared_layout': args.sharedlayout,
+            'max_difficulty_spread': args.maxspread,
+            'tick_rate': args.tickrate,
+        })
+
+
 def dotheui(stdscr, args):
     '''
     Here we springboard into the various bits of user interface.
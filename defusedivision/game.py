@@ -1,12 +1,38 @@
+import threading
 import logging
 import random
 import curses
 import queue
+import time
 
+from . import net
+from .concurrency import concurrent
+from .minesweeper import minefield
 from .minesweeper.minefield import MineField
+from .minesweeper.arrayfield import ArrayMineField
+from .minesweeper.chunkfield import ChunkedMineField
+from .minesweeper.sharedfield import MineLayout, OverlayMineField
 from .minesweeper.contents import Contents
 
 
+# How many state-delta messages a Bout sends between full keyframes
+KEYFRAME_INTERVAL = 50
+
+# The most inputs a Bout applies in one batch
+MAX_BATCH = 256
+
+# How many times a Bout rebuilds a minefield which is too easy or too hard
+# compared to the others, before settling for the closest it found
+DIFFICULTY_RETRIES = 20
+
+# The storage engines a Bout may use for its minefields, by name
+MINEFIELD_ENGINES = {
+    'cells': MineField,
+    'array': ArrayMineField,
+    'chunked': ChunkedMineField,
+}
+
+
 class Conveyor(object):
     """
     Abstract class Conveyor describes the basic contract for communicating about games of Minesweeper.
@@ -18,6 +44,13 @@ class Conveyor(object):
     def send_input(self, inpt):
         raise NotImplementedError
 
+    def joined(self):
+        '''
+        Method joined is called once this player has been added to its Bout,
+        after which it may start sending inputs and receiving states.
+        '''
+        pass
+
 
 class Keys:
     UP = 'UP'
@@ -65,31 +98,44 @@ def create_foothold(field):
     Function create_foothold will remove mines from around the currently
     selected cell, ensuring that the current cell cannot have a mine, and that
     probing that cell will open up some amount of space.
+
+    If the field has a layout_generator, it's asked for a layout which can be
+    solved without guessing from this cell, and the mines are moved there.
+    Otherwise, or if it can't find such a layout in time, only the mines in
+    the way of the foothold are moved.
+
+    Minefields whose mines are fixed in place are left as they are.
     """
+    if field.mines_fixed:
+        return
     x, y = field.selected
-    cell = field.board[x][y]
+    if field.layout_generator is not None:
+        layout = field.layout_generator.layout(
+            field.width, field.height, field.mine_count, (x, y))
+        if layout is not None:
+            field.load_layout(layout)
+            return
+    _clear_foothold(field)
+
 
-    moved_count = 0
+def _clear_foothold(field):
+    '''
+    Function _clear_foothold moves the mines out of the selected cell and its
+    neighbors, to random cells outside of them.
+    '''
+    x, y = field.selected
+    cell = field.board[x][y]
 
     safe_cells = [v for _, v in cell.neighbors.items() if v]
     safe_cells += [cell]
+    safe = set((c.x, c.y) for c in safe_cells)
 
-    for neighbor in safe_cells:
-        if neighbor.contents == Contents.mine:
-            neighbor.contents = Contents.empty
-            moved_count += 1
+    removed = [(c.x, c.y) for c in safe_cells if c.contents == Contents.mine]
 
-    # Place a new mine for each of the mines we had to move out of the way
-    while moved_count > 0:
-        rx, ry = random.randint(0, field.width - 1), random.randint(
-            0, field.height - 1)
-        possible_mine = field.board[rx][ry]
-        # Ensure any new location won't be in the desired foothold
-        if not possible_mine in safe_cells:
-            # Only place mines where there aren't existing mines
-            if not possible_mine.contents == Contents.mine:
-                possible_mine.contents = Contents.mine
-                moved_count -= 1
+    # Place a new mine for each of the mines we had to move out of the way,
+    # ensuring no new location is within the desired foothold
+    added = field.empty_positions(len(removed), exclude=safe)
+    field.move_mines(removed, added)
 
 
 def _first_probe(field):
@@ -97,27 +143,28 @@ def _first_probe(field):
     Function _first_probe checks if this is the first probe of any cell in this
     minefield, returning True if it is the first probe, and False if it's not.
     """
-    cells = [c for row in field.board for c in row]
-    for cell in cells:
-        if cell.probed:
-            return False
-    return True
+    return field.probed_count == 0
 
 
-def _probe_selected(field):
+def _probe_selected(field, revealed=None, foothold=True):
     """
     Function _probe_selected probes the currently selected cell. If the
     cell if flagged, ignore probe and return True immediately. If the
     probed cell contains a mine, return False, otherwise, returns True.
+    If a list is passed as `revealed`, the newly revealed cells are added to
+    it. If `foothold` is False, no foothold is made for the first probe, as
+    one has already been made.
     """
     x, y = field.selected
     cell = field.board[x][y]
     if cell.flagged:
         return True
     # Create a foothold for the first probe
-    if _first_probe(field):
+    if foothold and _first_probe(field):
         create_foothold(field)
-    cell.probe()
+    cells = field.probe(x, y)
+    if revealed is not None:
+        revealed.extend(cells)
 
     if cell.contents == Contents.mine:
         return False
@@ -126,23 +173,172 @@ def _probe_selected(field):
 
 def _flag_selected(field):
     x, y = field.selected
-    cell = field.board[x][y]
-    cell.flagged = not cell.flagged
+    field.flag(x, y)
 
 
 def check_win(mfield):
-    flags = 0
-    correct_flags = 0
-    for h in range(mfield.height):
-        for w in range(mfield.width):
-            c = mfield.board[w][h]
-            if c.contents == Contents.mine and c.flagged:
-                correct_flags += 1
-            if c.flagged:
-                flags += 1
-    if correct_flags == mfield.mine_count and flags == correct_flags:
-        return True
-    return False
+    return (mfield.correct_flags == mfield.mine_count
+            and mfield.flag_count == mfield.correct_flags)
+
+
+# How often player_json was answered from a player's cache, for debugging
+PLAYER_CACHE_STATS = {
+    'player_json_hits': 0,
+    'player_json_misses': 0,
+}
+
+
+def cache_stats():
+    '''
+    Function cache_stats returns how often the json of minefields and of
+    players was reused rather than rebuilt, along with the hit rates.
+    '''
+    stats = dict(minefield.CACHE_STATS)
+    stats.update(PLAYER_CACHE_STATS)
+    for name in ('json', 'player_json'):
+        hits, misses = stats[name + '_hits'], stats[name + '_misses']
+        total = hits + misses
+        stats[name + '_hit_rate'] = hits / total if total else 0.0
+    return stats
+
+
+def player_json(player):
+    '''
+    Function player_json returns the json of a Player-like object, reusing
+    the object built last time if neither the player nor its minefield has
+    changed since. The object returned must not be changed.
+    '''
+    field = player.mfield
+    key = (player.name, player.living, player.victory, field, field.version)
+    cached = getattr(player, '_json_cache', None)
+    if cached is not None and cached[0] == key:
+        PLAYER_CACHE_STATS['player_json_hits'] += 1
+        return cached[1]
+    PLAYER_CACHE_STATS['player_json_misses'] += 1
+    rv = {
+        'name': player.name,
+        'living': player.living,
+        'minefield': field.json(),
+        'victory': player.victory,
+    }
+    player._json_cache = (key, rv)
+    return rv
+
+
+def hidden_player_json(player):
+    '''
+    Function hidden_player_json returns the json of a Player-like object as
+    it's shown to the other players of a shared_layout bout before the bout
+    is over: the cells and selected cell of its minefield are left out, so
+    that the safe cells it has found can't be copied, and only how many
+    cells it has probed and flagged are told.
+    '''
+    field = player.mfield
+    return {
+        'name': player.name,
+        'living': player.living,
+        'minefield': {
+            'selected': None,
+            'height': field.height,
+            'width': field.width,
+            'mine_count': field.mine_count,
+            'cells': [],
+            'probed_count': field.probed_count,
+            'flag_count': field.flag_count,
+        },
+        'victory': player.victory,
+    }
+
+
+def apply_delta(state, delta):
+    """
+    Function apply_delta returns the state of a Bout (as built by Bout.json)
+    after the changes of a 'state-delta' message. Returns None if the delta
+    doesn't directly follow `state`, meaning a keyframe must be asked for
+    instead. `state` itself is left untouched.
+    """
+    if state.get('seq') is None or delta['seq'] != state['seq'] + 1:
+        return None
+    players = dict(state['players'])
+    for oldname, newname in delta.get('renamed', {}).items():
+        if oldname in players:
+            player = dict(players.pop(oldname))
+            player['name'] = newname
+            players[newname] = player
+    for name in delta.get('removed', []):
+        players.pop(name, None)
+    for name, changes in delta.get('players', {}).items():
+        if name not in players:
+            return None
+        player = dict(players[name])
+        for key in ('living', 'victory'):
+            if key in changes:
+                player[key] = changes[key]
+        counts = [key for key in ('probed_count', 'flag_count')
+                  if key in changes]
+        if 'selected' in changes or changes.get('cells') or counts:
+            field = dict(player['minefield'])
+            field['selected'] = changes.get('selected', field['selected'])
+            for key in counts:
+                field[key] = changes[key]
+            player['minefield'] = field
+        if changes.get('cells'):
+            cells = list(field['cells'])
+            height = field['height']
+            index = None
+            for cell in changes['cells']:
+                pos = cell['x'] * height + cell['y']
+                # Cells are listed column by column, unless only some of the
+                # cells of the minefield are listed.
+                if pos < len(cells) and (cells[pos]['x'], cells[pos]['y']) == (
+                        cell['x'], cell['y']):
+                    cells[pos] = cell
+                    continue
+                if index is None:
+                    index = {(c['x'], c['y']): i for i, c in enumerate(cells)}
+                if (cell['x'], cell['y']) in index:
+                    cells[index[(cell['x'], cell['y'])]] = cell
+                else:
+                    index[(cell['x'], cell['y'])] = len(cells)
+                    cells.append(cell)
+            field['cells'] = cells
+        players[name] = player
+    return {
+        'players': players,
+        'ready': delta.get('ready', state['ready']),
+        'seq': delta['seq'],
+    }
+
+
+class _Pending(object):
+    """
+    Class _Pending collects the changes made to a Bout since they were last
+    broadcast: the cells changed of each player (a dictionary of player to a
+    dictionary of (x, y) to cell), players renamed and removed, whether a
+    keyframe is needed, which players asked for a keyframe of their own, and
+    how many changes were made.
+    """
+
+    def __init__(self):
+        self.players = dict()
+        self.renamed = dict()
+        self.removed = []
+        self.keyframe = False
+        self.keyframe_for = []
+        self.events = 0
+
+
+class _Foothold(object):
+    """
+    Class _Foothold is the input which lays out the mines of `field` once a
+    layout has been generated for it, in the background, to be solved from
+    the cell at `start`. `positions` is None if no layout was found.
+    """
+
+    def __init__(self, field, start, positions):
+        self.field = field
+        self.start = start
+        self.positions = positions
 
 
 class Player(Conveyor):
@@ -155,8 +351,9 @@ class Player(Conveyor):
         # self._args = args
         self.name = name
         self.bout = bout
-        self.stateq = queue.Queue()
-        self.mfield = MineField(
+        # Nothing is sent anywhere, so the queue isn't bounded
+        self.stateq = net.StateQueue(maxsize=None)
+        self.mfield = bout.new_minefield(
             height=height, width=width, mine_count=mine_count)
         self.living = True
         self.victory = False
@@ -170,12 +367,7 @@ class Player(Conveyor):
         return self.stateq.get()
 
     def json(self):
-        return {
-            'name': self.name,
-            'living': self.living,
-            'minefield': self.mfield.json(),
-            'victory': self.victory,
-        }
+        return player_json(self)
 
 
 class Bout(object):
@@ -186,13 +378,53 @@ class Bout(object):
     `player_constructor` is a callable which accepts the same arguments as
     class `Player`, and returns a `Player`-like object. Allows a Bout to use a
     Player which gets it's input from anywhere.
+
+    `minefield_constructor` is a callable accepting the same arguments as
+    class `MineField` (such as any of the classes in MINEFIELD_ENGINES), and is
+    used to create the minefield of every player in this Bout.
+
+    `board_factory` is an optional boardpool.BoardFactory. If provided,
+    minefields are taken from its pools instead of being created with
+    `minefield_constructor`.
+
+    `layout_generator` is an optional noguess.NoGuessGenerator. If provided,
+    every minefield of this Bout is laid out so that it can be solved without
+    guessing from the first cell probed. Layouts are generated in the
+    background, so a player's first probe is only applied once their layout
+    is ready, and shared layouts are generated before they're asked for. A
+    plain random layout is used where none is found in time.
+
+    If `shared_layout` is True, every player asking for a minefield of the
+    same size and mine count plays the same layout of mines, each on their
+    own sharedfield.OverlayMineField. Those minefields ignore the
+    `minefield_constructor` and `board_factory`, and start with the mine-free
+    start cell of their layout selected.
+
+    If `max_difficulty_spread` is given, minefields whose difficulty (see
+    MineField.difficulty) differs by more than that fraction from those of
+    the other players are rejected, and new ones built in their place. The
+    first probe may move a few mines, so difficulties are only balanced to
+    within a few clicks. Minefields with a `layout_generator` aren't
+    balanced, since their whole layout is replaced on the first probe, nor
+    are those whose difficulty isn't scored, such as chunked minefields.
+
+    If `tick_rate` is given, changes are broadcast to the players at most
+    that many times a second, each broadcast holding every change made since
+    the last. Otherwise every batch of inputs is broadcast as soon as it's
+    applied. A Bout with a tick_rate must be closed with method close.
     """
 
     def __init__(self,
                  max_players=2,
                  minefield_size=(12, 12),
                  mine_count=None,
-                 player_constructor=None):
+                 player_constructor=None,
+                 minefield_constructor=None,
+                 board_factory=None,
+                 layout_generator=None,
+                 shared_layout=False,
+                 max_difficulty_spread=None,
+                 tick_rate=None):
         self.max_players = max_players
         self.minefield_size = minefield_size
         self.mine_count = mine_count
@@ -201,15 +433,402 @@ class Bout(object):
         if player_constructor is None:
             player_constructor = Player
         self.player_constructor = player_constructor
+        if minefield_constructor is None:
+            minefield_constructor = MineField
+        self.minefield_constructor = minefield_constructor
+        self.board_factory = board_factory
+        self.layout_generator = layout_generator
+        self.shared_layout = shared_layout
+        self.max_difficulty_spread = max_difficulty_spread
+        self.difficulty_rejections = 0
+        # Every change to the state of the Bout is numbered, so players can
+        # tell if they've missed one.
+        self.seq = 0
+        self._since_keyframe = 0
+        # Inputs waiting to be applied, and the lock held by the one thread
+        # at a time which changes the state of this Bout.
+        self.inputs = queue.Queue()
+        self._lock = threading.Lock()
+        self._renames = dict()
+        # Players being created by add_player, and the inputs they've sent
+        self._joining = dict()
+        # Changes not yet broadcast to the players
+        self._pending = _Pending()
+        self.tick_rate = tick_rate
+        self.closed = False
+        self.inputs_applied = 0
+        self.batches = 0
+        self.events = 0
+        self.updates = 0
+        self.layouts = dict()
+        # Shared layouts generated ahead of time, and those being generated
+        self._next_layouts = dict()
+        self._preparing = set()
+        self._layouts_lock = threading.Lock()
+        # Minefields whose first probe waits for their layout
+        self._footholds = set()
+        if board_factory is not None:
+            width, height = minefield_size
+            board_factory.prime(width, height, mine_count)
+        if shared_layout and layout_generator is not None:
+            width, height = minefield_size
+            with self._layouts_lock:
+                self._prepare(width, height, mine_count)
+        if tick_rate:
+            self._tick()
+
+    def new_minefield(self, width=None, height=None, mine_count=None,
+                      replacing=None):
+        '''
+        Method new_minefield creates a minefield for a player in this Bout,
+        drawing it from this Bout's board_factory if it has one, or creating
+        it with this Bout's minefield_constructor otherwise. With a
+        shared_layout, `replacing` is passed on to method layout.
+        '''
+        if self.shared_layout:
+            return OverlayMineField(
+                self.layout(width=width, height=height, mine_count=mine_count,
+                            replacing=replacing))
+        field = self._build_minefield(width, height, mine_count)
+        if self.layout_generator is not None:
+            # The layout is replaced on the first probe, so there's nothing
+            # to balance yet
+            field.layout_generator = self.layout_generator
+        elif (self.max_difficulty_spread is not None
+              and field.difficulty_scored):
+            field = self._balance_difficulty(field)
+        return field
+
+    def _build_minefield(self, width, height, mine_count):
+        if self.board_factory is not None:
+            return self.board_factory.get(
+                width=width, height=height, mine_count=mine_count)
+        return self.minefield_constructor(
+            width=width, height=height, mine_count=mine_count)
+
+    def _balance_difficulty(self, field):
+        '''
+        Method _balance_difficulty returns `field` if its 3BV is within
+        max_difficulty_spread of the average 3BV of the minefields of the same
+        kind already being played in this Bout. Otherwise new minefields are
+        built in its place, up to DIFFICULTY_RETRIES times, and the closest
+        to that average is returned.
+        '''
+        kind = (field.width, field.height, field.mine_count)
+        others = [
+            player.mfield.difficulty().bbbv
+            for player in list(self.players.values())
+            if (player.mfield.width, player.mfield.height,
+                player.mfield.mine_count) == kind
+            and player.mfield.difficulty_scored
+        ]
+        if not others:
+            return field
+        target = sum(others) / len(others)
+        allowed = self.max_difficulty_spread * target
+
+        def gap(candidate):
+            return abs(candidate.difficulty().bbbv - target)
+
+        best, best_gap = field, gap(field)
+        for _ in range(DIFFICULTY_RETRIES):
+            if best_gap <= allowed:
+                break
+            self.difficulty_rejections += 1
+            candidate = self._build_minefield(*kind)
+            candidate_gap = gap(candidate)
+            if candidate_gap < best_gap:
+                best, best_gap = candidate, candidate_gap
+        return best
+
+    def layout(self, width=None, height=None, mine_count=None,
+               replacing=None):
+        '''
+        Method layout returns the MineLayout shared by every minefield of the
+        given size and mine count in this Bout, creating it the first time
+        it's asked for. If that's the MineLayout `replacing`, which has
+        already been played, a new one is created in its place, so that a new
+        round is played on new mines. If this Bout has a layout_generator,
+        the layout is the one it generated ahead of time, which can be solved
+        without guessing from its start cell, or a random one if that isn't
+        ready yet; either way the next is generated in the background.
+        '''
+        width = 12 if width is None else width
+        height = 12 if height is None else height
+        key = (width, height, mine_count)
+        with self._layouts_lock:
+            if replacing is not None and self.layouts.get(key) is replacing:
+                del self.layouts[key]
+            if key not in self.layouts:
+                layout = self._next_layouts.pop(key, None)
+                if layout is None:
+                    layout = MineLayout(width, height, mine_count)
+                self.layouts[key] = layout
+                if self.layout_generator is not None:
+                    self._prepare(*key)
+            return self.layouts[key]
+
+    def _prepare(self, width, height, mine_count):
+        # Must be called holding _layouts_lock
+        key = (width, height, mine_count)
+        if key not in self._preparing and key not in self._next_layouts:
+            self._preparing.add(key)
+            self._generate_layout(key)
+
+    @concurrent
+    def _generate_layout(self, key):
+        layout = None
+        try:
+            layout = MineLayout(*key)
+            positions = self.layout_generator.layout(
+                layout.width, layout.height, layout.mine_count, layout.start)
+            if positions is not None:
+                layout = MineLayout(*key, positions=positions,
+                                    start=layout.start)
+        finally:
+            with self._layouts_lock:
+                self._preparing.discard(key)
+                if layout is not None:
+                    self._next_layouts[key] = layout
+
+    def _await_foothold(self, player):
+        '''
+        Method _await_foothold returns True if the first probe of `player`
+        must wait for a layout to be generated for their minefield, starting
+        to generate it if it isn't already. The layout is then applied as a
+        _Foothold input, so generating it never holds up other inputs.
+        '''
+        field = player.mfield
+        if (field.layout_generator is None or field.mines_fixed
+                or not _first_probe(field)):
+            return False
+        x, y = field.selected
+        if field.board[x][y].flagged:
+            return False
+        if field not in self._footholds:
+            self._footholds.add(field)
+            self._generate_foothold(player.name, field, (x, y))
+        return True
+
+    @concurrent
+    def _generate_foothold(self, name, field, start):
+        positions = None
+        try:
+            positions = field.layout_generator.layout(
+                field.width, field.height, field.mine_count, start)
+        finally:
+            self.send_input({
+                'player': name,
+                'input': _Foothold(field, start, positions)
+            })
+
+    def _load_foothold(self, player, foothold):
+        '''
+        Method _load_foothold lays out the mines of a _Foothold, and selects
+        its start cell to be probed. Returns False if the minefield has been
+        replaced or probed since, so the foothold is no longer wanted.
+        '''
+        field = foothold.field
+        self._footholds.discard(field)
+        if player.mfield is not field or not _first_probe(field):
+            return False
+        field.selected = list(foothold.start)
+        if foothold.positions is not None:
+            field.load_layout(foothold.positions)
+        else:
+            _clear_foothold(field)
+        return True
 
     def send_input(self, inpt_event):
         '''
         Method send_input is the final stop for an inpt_event, as those events
         are used here by the Bout to modify the state of the game.
+
+        Inputs may be sent from any thread. They're queued, and applied in
+        batches by one thread at a time; see method process_inputs.
+        '''
+        self.inputs.put(inpt_event)
+        self.process_inputs()
+
+    def process_inputs(self):
+        '''
+        Method process_inputs applies every queued input, unless another
+        thread is already changing this Bout, in which case that thread
+        applies them instead. Only one thread at a time changes the state of
+        a Bout.
+
+        All the inputs queued at once are applied as a batch, and their
+        changes pushed to every player as a single 'state-delta' message; see
+        method _push_delta. Batches which change a whole minefield push a full
+        keyframe instead. A player sending `{'keyframe': True}` is sent a
+        keyframe of their own.
+        '''
+        while not self.inputs.empty():
+            if not self._lock.acquire(blocking=False):
+                return
+            try:
+                batch = []
+                while len(batch) < MAX_BATCH:
+                    try:
+                        batch.append(self.inputs.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch:
+                    self._apply_batch(batch)
+            finally:
+                self._lock.release()
+
+    def _apply_batch(self, batch):
+        pending = self._pending
+        for inpt_event in batch:
+            player = self._input_player(inpt_event['player'])
+            held = self._joining.get(inpt_event['player'])
+            if player is None and held is not None:
+                held.append(inpt_event)
+                continue
+            if player is None:
+                logging.debug('Dropping input from departed player: {}'.format(
+                    inpt_event))
+                continue
+            inpt = inpt_event['input']
+            if isinstance(inpt, dict) and 'keyframe' in inpt:
+                if player not in pending.keyframe_for:
+                    pending.keyframe_for.append(player)
+                continue
+            cells = pending.players.setdefault(player, dict())
+            if self._apply_input(player, inpt, cells, pending.renamed):
+                pending.keyframe = True
+            pending.events += 1
+        self.inputs_applied += len(batch)
+        self.batches += 1
+        if not self.tick_rate:
+            self._flush()
+
+    @concurrent
+    def _tick(self):
+        '''
+        Method _tick broadcasts the pending changes of this Bout tick_rate
+        times a second, until this Bout is closed.
+        '''
+        interval = 1.0 / self.tick_rate
+        deadline = time.monotonic()
+        while not self.closed:
+            deadline += interval
+            # Skip the ticks which have already been missed
+            deadline = max(deadline, time.monotonic())
+            time.sleep(max(0, deadline - time.monotonic()))
+            with self._lock:
+                self._flush()
+            self.process_inputs()
+
+    def _flush(self):
+        '''
+        Method _flush broadcasts every change since the last broadcast as a
+        single update: a keyframe if one is needed, or a 'state-delta'
+        holding the latest state of every player who changed. Must be called
+        while holding this Bout's lock.
+        '''
+        pending, self._pending = self._pending, _Pending()
+        present = [
+            player for player in pending.players
+            if self.players.get(player.name) is player
+        ]
+        sent = True
+        keyframe = pending.keyframe
+        if keyframe:
+            self._push_state()
+        elif present or pending.renamed or pending.removed:
+            delta = {'players': dict()}
+            hidden = dict() if self._fields_hidden() else None
+            for player in present:
+                delta['players'][player.name] = {
+                    'living': player.living,
+                    'victory': player.victory,
+                    'selected': player.mfield.selected,
+                    'cells': [
+                        cell.json() for cell in pending.players[player].values()
+                    ],
+                }
+                if hidden is not None:
+                    hidden[player.name] = {
+                        'living': player.living,
+                        'victory': player.victory,
+                        'probed_count': player.mfield.probed_count,
+                        'flag_count': player.mfield.flag_count,
+                    }
+            if pending.renamed:
+                delta['renamed'] = pending.renamed
+            if pending.removed:
+                delta['removed'] = pending.removed
+            counted = (bool(pending.renamed or pending.removed) or
+                       any(pending.players[player] for player in present))
+            # Players who asked for a keyframe get it instead of the delta
+            keyframe = self._push_delta(
+                delta, counted=counted, skip=pending.keyframe_for,
+                hidden=hidden)
+        else:
+            sent = False
+        for player in pending.keyframe_for:
+            if not keyframe and player.name in self.players:
+                self._push_keyframe(player)
+        if sent:
+            self.updates += 1
+        self.events += pending.events
+
+    def stats(self):
+        '''
+        Method stats returns how many inputs this Bout has applied and in how
+        many batches, how many changes were made and in how many updates they
+        were broadcast, how many of those changes were coalesced into the
+        update of another, and the stats of each player's queue of messages.
+        '''
+        with self._lock:
+            return {
+                'inputs': self.inputs_applied,
+                'batches': self.batches,
+                'events': self.events,
+                'updates': self.updates,
+                'coalesced': max(0, self.events - self.updates),
+                'tick_rate': self.tick_rate,
+                'queues': {
+                    name: player.stateq.stats()
+                    for name, player in self.players.items()
+                    if hasattr(player.stateq, 'stats')
+                },
+            }
+
+    def close(self):
+        '''
+        Method close stops this Bout from broadcasting on its tick.
+        '''
+        self.closed = True
+
+    def _played_layout(self, player):
+        '''
+        Method _played_layout returns the shared MineLayout of `player`'s
+        minefield if they've started playing it, or None.
+        '''
+        field = player.mfield
+        if field.probed_count or not player.living:
+            return getattr(field, 'layout', None)
+        return None
+
+    def _input_player(self, name):
+        # Inputs queued before a rename still carry the player's old name
+        while name not in self.players and name in self._renames:
+            name = self._renames[name]
+        return self.players.get(name)
+
+    def _apply_input(self, player, inpt, cells, renamed):
+        '''
+        Method _apply_input applies a single input of `player`, adding the
+        cells it changes to the dictionary `cells` (of (x, y) to cell), and
+        any change of name to the dictionary `renamed`. Returns True if the
+        input changed more than can be sent as a delta, so a keyframe must be
+        sent.
         '''
-        player = self.players[inpt_event['player']]
         field = player.mfield
-        inpt = inpt_event['input']
+        keyframe = False
 
         if isinstance(inpt, dict):
             # Change the name of a player
@@ -223,70 +842,209 @@ class Bout(object):
                 player.name = newname
                 self.players[newname] = player
                 del self.players[oldname]
+                self._renames[oldname] = newname
+                # Fold renames within a batch into one
+                for first, last in list(renamed.items()):
+                    if last == oldname:
+                        oldname = first
+                        del renamed[first]
+                if oldname != newname:
+                    renamed[oldname] = newname
             if 'new-minefield' in inpt:
                 info = inpt['new-minefield']
                 height = info['height']
                 width = info['width']
                 mine_count = info['mine_count']
-                new_mfield = MineField(
-                    height=height, width=width, mine_count=mine_count)
-                player.mfield = new_mfield
+                try:
+                    new_mfield = self.new_minefield(
+                        height=height, width=width, mine_count=mine_count,
+                        replacing=self._played_layout(player))
+                    player.mfield = new_mfield
+                    keyframe = True
+                except ValueError as e:
+                    logging.warning('Player "{}" requested an impossible '
+                                    'minefield: {}'.format(player.name, e))
 
         if inpt in DIRECTIONKEYS:
             _move_select(inpt, field)
-            self._push_selected(player.name, field.selected)
-            return
+            return keyframe
+
+        foothold = True
+        if isinstance(inpt, _Foothold):
+            if not self._load_foothold(player, inpt):
+                return keyframe
+            inpt, foothold = Keys.PROBE, False
+        elif inpt == Keys.PROBE and self._await_foothold(player):
+            return keyframe
 
+        changed = []
         if inpt == Keys.PROBE:
-            if not _probe_selected(field):
+            # The foothold made by the first probe may move mines anywhere,
+            # as may materializing more of a chunked minefield.
+            if _first_probe(field) and not field.mines_fixed:
+                keyframe = True
+            chunks = getattr(field, 'materialized', None)
+            before = chunks() if chunks else None
+            if not _probe_selected(field, changed, foothold=foothold):
                 player.living = False
+            if chunks and chunks() != before:
+                keyframe = True
 
         if inpt == Keys.FLAG:
             _flag_selected(field)
+            x, y = field.selected
+            changed.append(field.board[x][y])
 
         if check_win(field):
             player.victory = True
+        for cell in changed:
+            cells[(cell.x, cell.y)] = cell
+        if self._show_mines():
+            keyframe = True
+        return keyframe
 
-        self._push_state()
+    def _show_mines(self):
+        '''
+        Method _show_mines shows where the mines are on the minefields of
+        every dead player, and of every player once the bout is over. Returns
+        True if any minefield newly has its mines shown, which changes more
+        cells than a delta can hold.
+
+        Players of a shared_layout all play the same mines, so then mines are
+        only shown once the bout is over.
+        '''
+        over = self.finished()
+        shown = False
+        for player in self.players.values():
+            field = player.mfield
+            dead = not player.living and not self.shared_layout
+            if (over or dead) and not field.mines_shown:
+                field.mines_shown = True
+                shown = True
+        return shown
 
     def _push_state(self):
         '''
-        Method _push_state put's the state of this bout into every Player's
-        stateq.
+        Method _push_state puts a keyframe, the full state of this bout, into
+        every Player's stateq. Must be called while holding this Bout's lock.
         '''
-        for _, v in self.players.items():
-            v.stateq.put(('new-state', self.json()))
+        self.seq += 1
+        self._since_keyframe = 0
+        if self._fields_hidden():
+            for _, v in self.players.items():
+                v.stateq.put(net.Frame(('new-state', self.json(viewer=v))))
+        else:
+            frame = net.Frame(('new-state', self.json()))
+            for _, v in self.players.items():
+                v.stateq.put(frame)
+        logging.debug('JSON cache stats: {}'.format(cache_stats()))
 
-    def _push_selected(self, playername, selected):
+    def _push_keyframe(self, player):
         '''
-        Method _push_selected pushes a state to all Players updating one
-        players selected position.
+        Method _push_keyframe puts the full state of this bout into the stateq
+        of only `player`. Must be called while holding this Bout's lock.
+        '''
+        player.stateq.put(net.Frame(('new-state', self.json(viewer=player))))
+
+    def _push_delta(self, delta, counted=True, skip=(), hidden=None):
+        '''
+        Method _push_delta puts a 'state-delta' message into every Player's
+        stateq, holding only what `delta` says has changed:
+
+            'seq': the number of this change, one more than the last
+            'ready': whether the bout is ready
+            'players': for each player with changes, their 'living',
+                'victory' and 'selected', and a list of the json of their
+                changed 'cells'
+            'renamed': a dictionary of old player names to new names
+            'removed': a list of the names of players who've left
+
+        Every KEYFRAME_INTERVAL changes a full keyframe is sent instead. Deltas
+        which are not `counted` (those only moving the selected cells) don't
+        count towards that interval. Players in `skip` aren't sent the delta.
+        If `hidden` is given, a dictionary of player names to the changes
+        other players may see of them (see hidden_player_json), each player
+        is sent their own changes and only those of everyone else. Returns
+        True if a keyframe was sent instead. Must be called while holding
+        this Bout's lock.
         '''
+        if counted and self._since_keyframe + 1 >= KEYFRAME_INTERVAL:
+            self._push_state()
+            return True
+        self.seq += 1
+        if counted:
+            self._since_keyframe += 1
+        delta['seq'] = self.seq
+        delta['ready'] = self.ready
+        frame = net.Frame(('state-delta', delta))
         for _, v in self.players.items():
-            v.stateq.put(('update-selected', (playername, selected)))
+            if v in skip:
+                continue
+            if hidden is not None:
+                players = {
+                    name: changes if name == v.name else hidden[name]
+                    for name, changes in delta['players'].items()
+                }
+                frame = net.Frame(
+                    ('state-delta', dict(delta, players=players)))
+            v.stateq.put(frame)
+        return False
 
-    def add_player(self):
+    def add_player(self, player_constructor=None):
         '''
         Method add_player creates a new player object for this Bout, and
         returns a reference to that player. If there are already
         self.max_players players set to play in this bout, then returns None.
+        If `player_constructor` is given, it's used to create the player in
+        place of this Bout's own player_constructor.
+
+        The player is created without holding this Bout's lock, since that
+        may take a while (such as waiting for a connection), with their seat
+        reserved meanwhile. Inputs they send before they're added are held
+        back until then.
         '''
-        if self.max_players <= len(self.players):
-            return None
-        pname = "Player{}-{}".format(
-            len(self.players) + 1, random.randint(0, 10000))
-        width, height = self.minefield_size
-        player = self.player_constructor(
-            pname,
-            self,
-            mine_count=self.mine_count,
-            height=height,
-            width=width)
-        self.players[pname] = player
-        logging.info('Adding player: "{}" {}'.format(pname, player))
-        if len(self.players) >= self.max_players:
-            self.ready = True
-        self._push_state()
+        if player_constructor is None:
+            player_constructor = self.player_constructor
+        with self._lock:
+            if self.max_players <= len(self.players) + len(self._joining):
+                return None
+            pname = None
+            while pname is None or pname in self.players or (
+                    pname in self._joining):
+                pname = "Player{}-{}".format(
+                    len(self.players) + len(self._joining) + 1,
+                    random.randint(0, 10000))
+            self._joining[pname] = []
+        try:
+            width, height = self.minefield_size
+            player = player_constructor(
+                pname,
+                self,
+                mine_count=self.mine_count,
+                height=height,
+                width=width)
+        except Exception:
+            with self._lock:
+                held = self._joining.pop(pname)
+            if held:
+                logging.debug('Dropping {} inputs of "{}", who failed to '
+                              'join'.format(len(held), pname))
+            raise
+        with self._lock:
+            held = self._joining.pop(pname)
+            self.players[pname] = player
+            logging.info('Adding player: "{}" {}'.format(pname, player))
+            if len(self.players) >= self.max_players:
+                self.ready = True
+            # New players are sent the state of the bout right away
+            self._pending.keyframe = True
+            self._pending.events += 1
+            self._flush()
+        player.joined()
+        for inpt_event in held:
+            self.inputs.put(inpt_event)
+        # Apply any inputs which were queued while the player was added
+        self.process_inputs()
         return player
 
     def remove_player(self, playername):
@@ -296,12 +1054,46 @@ class Bout(object):
         does nothing.
         '''
         logging.info('Removing player: "{}"'.format(playername))
-        if playername in self.players:
-            del self.players[playername]
-        if len(self.players) < self.max_players:
-            self.ready = False
-        self._push_state()
+        with self._lock:
+            if playername in self.players:
+                del self.players[playername]
+            if len(self.players) < self.max_players:
+                self.ready = False
+            self._pending.removed.append(playername)
+            self._pending.events += 1
+            if not self.tick_rate:
+                self._flush()
+        self.process_inputs()
 
-    def json(self):
-        jplayers = {k: v.json() for k, v in self.players.items()}
-        return {"players": jplayers, 'ready': self.ready}
+    def finished(self):
+        '''
+        Method finished returns True once a player of this Bout has won, or
+        every player has died.
+        '''
+        players = list(self.players.values())
+        if not players:
+            return False
+        return (any(p.victory for p in players)
+                or not any(p.living for p in players))
+
+    def _fields_hidden(self):
+        '''
+        Method _fields_hidden returns True while players must not be shown
+        the minefields of the other players: while a shared_layout bout is
+        being played, where anyone shown another's minefield could copy the
+        safe cells found on it.
+        '''
+        return self.shared_layout and not self.finished()
+
+    def json(self, viewer=None):
+        '''
+        Method json returns the state of this Bout. If `viewer` is given, it's
+        the state as that player is sent it, with the minefields of the other
+        players hidden while _fields_hidden (see hidden_player_json).
+        '''
+        hide = viewer is not None and self._fields_hidden()
+        jplayers = {
+            k: hidden_player_json(v) if hide and v is not viewer else v.json()
+            for k, v in self.players.items()
+        }
+        return {"players": jplayers, 'ready': self.ready, 'seq': self.seq}
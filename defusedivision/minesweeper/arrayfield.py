@@ -0,0 +1,237 @@
+'''
+Module arrayfield implements a MineField whose state lives in flat, compact
+arrays instead of a grid of Cell objects. Each cell is addressed by the flat
+index `x*height + y`, and every per-cell attribute (mine, probed, flagged,
+number of mine contacts) is a single byte in its own bytearray.
+
+Code written against MineField reaches cells through `field.board[x][y]`. To
+keep that working, ArrayMineField exposes a `board` made of light-weight
+views which read and write the underlying arrays, so nothing but the view
+being used at that moment is allocated.
+'''
+
+from .contents import Contents
+from .difficulty import bitboard
+from .minefield import MineField, mine_positions
+from .topology import COMPASS, board_topology
+
+
+class ArrayCell(object):
+    """
+    Class ArrayCell is a view of a single cell of an ArrayMineField. It offers
+    the same attributes and methods as a Cell, but stores nothing itself.
+    """
+
+    __slots__ = ('field', 'idx')
+
+    def __init__(self, field, idx):
+        self.field = field
+        self.idx = idx
+
+    @property
+    def x(self):
+        return self.idx // self.field.height
+
+    @property
+    def y(self):
+        return self.idx % self.field.height
+
+    @property
+    def contents(self):
+        if self.field.mines[self.idx]:
+            return Contents.mine
+        return Contents.empty
+
+    @contents.setter
+    def contents(self, value):
+        position = [(self.x, self.y)]
+        if value == Contents.mine:
+            self.field.move_mines([], position)
+        else:
+            self.field.move_mines(position, [])
+
+    @property
+    def probed(self):
+        return bool(self.field.probed[self.idx])
+
+    @probed.setter
+    def probed(self, value):
+        self.field.probed[self.idx] = bool(value)
+
+    @property
+    def flagged(self):
+        return bool(self.field.flagged[self.idx])
+
+    @flagged.setter
+    def flagged(self, value):
+        self.field.flagged[self.idx] = bool(value)
+
+    @property
+    def neighbors(self):
+        field = self.field
+        rv = dict()
+        for k, nidx in field._compass_neighbors(self.idx).items():
+            rv[k] = None if nidx is None else ArrayCell(field, nidx)
+        return rv
+
+    def mine_contacts(self):
+        return self.field.contacts[self.idx]
+
+    def probe(self):
+        return self.field._reveal(self.idx)
+
+    def json(self):
+        field = self.field
+        probed = self.probed
+        rv = {
+            "x": self.x,
+            "y": self.y,
+            "probed": probed,
+            "flagged": self.flagged,
+        }
+        if probed or field.mines_shown:
+            rv["contents"] = self.contents
+        if probed:
+            rv["contacts"] = field.contacts[self.idx]
+        return rv
+
+    def __eq__(self, other):
+        return (isinstance(other, ArrayCell) and self.field is other.field
+                and self.idx == other.idx)
+
+    def __hash__(self):
+        return hash((id(self.field), self.idx))
+
+    def __repr__(self):
+        return "ArrayCell({}, {})".format(self.x, self.y)
+
+
+class _ArrayColumn(object):
+    """
+    Class _ArrayColumn is a single column of an ArrayBoard, such that
+    `board[x][y]` returns the ArrayCell at that position.
+    """
+
+    __slots__ = ('field', 'x')
+
+    def __init__(self, field, x):
+        self.field = field
+        self.x = x
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.field.height:
+            raise IndexError(y)
+        return ArrayCell(self.field, self.x * self.field.height + y)
+
+    def __len__(self):
+        return self.field.height
+
+    def __iter__(self):
+        return (self[y] for y in range(self.field.height))
+
+
+class ArrayBoard(object):
+    """
+    Class ArrayBoard mimics the list-of-columns `board` of a MineField.
+    """
+
+    __slots__ = ('field', )
+
+    def __init__(self, field):
+        self.field = field
+
+    def __getitem__(self, x):
+        if not 0 <= x < self.field.width:
+            raise IndexError(x)
+        return _ArrayColumn(self.field, x)
+
+    def __len__(self):
+        return self.field.width
+
+    def __iter__(self):
+        return (self[x] for x in range(self.field.width))
+
+
+class ArrayMineField(MineField):
+    """
+    Class ArrayMineField is a drop-in replacement for MineField which stores
+    the state of every cell in flat bytearrays indexed by `x*height + y`.
+    """
+
+    def _build_board(self):
+        self.topology = board_topology(self.width, self.height)
+        size = self.width * self.height
+        self.mines = bytearray(size)
+        self.probed = bytearray(size)
+        self.flagged = bytearray(size)
+        self.contacts = bytearray(size)
+        self.board = ArrayBoard(self)
+
+    def _populate_mines(self):
+        """
+        Method _populate_mines places this minefields mines and counts the
+        mine contacts of every cell.
+        """
+        for x, y in mine_positions(self.width, self.height, self.mine_count):
+            self._set_mine(x * self.height + y, True)
+
+    def _mine_bitboard(self):
+        return bitboard(self.mines)
+
+    def _cell(self, idx):
+        return ArrayCell(self, idx)
+
+    def _is_mine(self, idx):
+        return self.mines[idx]
+
+    def _is_zero(self, idx):
+        return not (self.mines[idx] or self.contacts[idx])
+
+    def _compass_neighbors(self, idx):
+        """
+        Method _compass_neighbors returns a dictionary of compass directions
+        to the flat index of the neighboring cell in that direction, or None
+        if that neighbor would be off the board.
+        """
+        return dict(zip(COMPASS, self.topology.compass_neighbors(idx)))
+
+    def _set_mine(self, idx, is_mine):
+        is_mine = bool(is_mine)
+        if bool(self.mines[idx]) == is_mine:
+            return False
+        self.mines[idx] = is_mine
+        delta = 1 if is_mine else -1
+        for nidx in self._neighbors(idx):
+            self.contacts[nidx] += delta
+        return True
+
+    def _reveal(self, idx):
+        return [ArrayCell(self, ridx) for ridx in self._probe(idx)]
+
+    def _probe(self, idx):
+        """
+        Method _probe marks the cell at `idx` as probed. If that cell touches
+        no mines, every cell around it is probed as well, spreading outward
+        until cells which touch mines are reached. Returns a list of the
+        indices of the cells which were newly probed.
+        """
+        probed, contacts = self.probed, self.contacts
+        shapes, offsets = self.topology.shapes, self.topology.offsets
+        revealed = []
+        if not probed[idx]:
+            probed[idx] = 1
+            revealed.append(idx)
+        if contacts[idx]:
+            return revealed
+        stack = [idx]
+        while stack:
+            cur = stack.pop()
+            for off in offsets[shapes[cur]]:
+                nidx = cur + off
+                if probed[nidx]:
+                    continue
+                probed[nidx] = 1
+                revealed.append(nidx)
+                if not contacts[nidx]:
+                    stack.append(nidx)
+        return revealed
@@ -5,21 +5,51 @@ class Cell(object):
     """
     Class Cell represents a single cell on a field of cells in a game of
     minesweeper.
+
+    A Cell belonging to a MineField (`field`) looks its neighbors up in the
+    minefields shared tables when they're asked for, rather than each Cell
+    holding its own. A Cell without a field only has the neighbors it is
+    explicitly given.
     """
 
-    def __init__(self, x, y):
+    __slots__ = ('x', 'y', 'contents', 'probed', 'flagged', 'contacts',
+                 'field', '_neighbors')
+
+    def __init__(self, x, y, field=None):
         self.x = x
         self.y = y
         self.contents = Contents.empty
         self.probed = False
         self.flagged = False
-        self.neighbors = dict()
+        self.field = field
+        self._neighbors = None
+        # Number of mines touching this cell, cached by the owning MineField
+        self.contacts = None
+
+    @property
+    def neighbors(self):
+        """
+        A dictionary of strings representing compass directions to the Cell
+        in that direction from this one, or None if there is no Cell there.
+        """
+        if self._neighbors is not None:
+            return self._neighbors
+        if self.field is None:
+            return dict()
+        return self.field._compass_cells(self.x * self.field.height + self.y)
+
+    @neighbors.setter
+    def neighbors(self, neighbors):
+        self._neighbors = neighbors
 
     def mine_contacts(self):
         """
         Method mine_contacts returns the number of mines in the neighboring
-        cells.
+        cells. If the count has been cached in this Cells 'contacts' field,
+        the cached count is returned.
         """
+        if self.contacts is not None:
+            return self.contacts
         if not len(self.neighbors):
             raise ValueError("{} has unset number of neighbors.".format(
                 repr(self)))
@@ -32,33 +62,44 @@ class Cell(object):
     def probe(self):
         """
         Method probe marks this cells 'probe' field as true. Additionally, if
-        this Cells mine_contacts is 0, then this probe will also recursively
-        probe all neighbor cells.
+        this Cells mine_contacts is 0, then this probe will also probe all
+        neighbor cells, spreading outward until cells touching mines are
+        reached. Returns a list of the cells which were newly probed.
         """
-        self.probed = True
-        if not self.mine_contacts():
-            for _, cell in self.neighbors.items():
-                if cell and not cell.probed:
-                    cell.probe()
+        revealed = []
+        if not self.probed:
+            self.probed = True
+            revealed.append(self)
+        if self.mine_contacts():
+            return revealed
+        stack = [self]
+        while stack:
+            cell = stack.pop()
+            for _, neighbor in cell.neighbors.items():
+                if neighbor and not neighbor.probed:
+                    neighbor.probed = True
+                    revealed.append(neighbor)
+                    if not neighbor.mine_contacts():
+                        stack.append(neighbor)
+        return revealed
 
     def json(self):
         """
         Method json returns a json-serializable representation of this Cell
-        object.
+        object. Only probed cells have their contents and mine contacts
+        listed, unless this Cell's field has its mines shown.
         """
         rv = {
             "x": self.x,
             "y": self.y,
-            "contents": self.contents,
             "probed": self.probed,
             "flagged": self.flagged,
-            "neighbors": {
-                k: v.contents == Contents.mine if v else None
-                for k, v in self.neighbors.items()
-            },
         }
+        if self.probed or self.field is None or self.field.mines_shown:
+            rv["contents"] = self.contents
+        if self.probed:
+            rv["contacts"] = self.mine_contacts()
         return rv
-        raise NotImplementedError
 
     def __repr__(self):
         return "Cell({}, {})".format(self.x, self.y)
@@ -0,0 +1,309 @@
+'''
+Module chunkfield implements a minefield for boards far too large to hold in
+memory, such as 10,000 by 10,000 cells. The board is split into square
+chunks, and nothing about a chunk is stored until it's first touched.
+
+Where the mines of a chunk lie is derived from the minefields seed and the
+coordinates of the chunk, so a chunk's mines can be worked out at any time
+without storing them. Every chunk holds an exact share of the minefields
+mines, so the total number of mines is known up front. Once a chunk is
+touched its cells are "materialized": its mines, probes, flags and mine
+contacts are kept in bytearrays like those of an ArrayMineField.
+'''
+
+import random
+
+from .arrayfield import ArrayMineField, ArrayCell, ArrayBoard
+from .topology import COMPASS
+
+
+class _Chunk(object):
+    """
+    Class _Chunk holds the state of every cell of one materialized chunk.
+    Cells within a chunk are indexed by `lx*height + ly`.
+    """
+
+    __slots__ = ('width', 'height', 'mines', 'probed', 'flagged', 'contacts')
+
+    def __init__(self, width, height, mines):
+        size = width * height
+        self.width = width
+        self.height = height
+        self.mines = mines
+        self.probed = bytearray(size)
+        self.flagged = bytearray(size)
+        self.contacts = bytearray(size)
+
+
+class _ChunkedArray(object):
+    """
+    Class _ChunkedArray presents one attribute of every cell of a
+    ChunkedMineField as if it were a single flat array indexed by
+    `x*height + y`, so that ArrayCell views work on a ChunkedMineField.
+    """
+
+    __slots__ = ('field', 'name')
+
+    def __init__(self, field, name):
+        self.field = field
+        self.name = name
+
+    def _locate(self, idx):
+        key, local = self.field._locate(idx)
+        if self.name == 'mines':
+            return self.field._layout(key), local
+        return getattr(self.field._chunk(key), self.name), local
+
+    def __getitem__(self, idx):
+        arr, local = self._locate(idx)
+        return arr[local]
+
+    def __setitem__(self, idx, value):
+        arr, local = self._locate(idx)
+        arr[local] = value
+
+
+class ChunkedMineField(ArrayMineField):
+    """
+    Class ChunkedMineField is a MineField whose chunks of `chunk_size` by
+    `chunk_size` cells are only materialized once touched. Minefields with
+    the same size, mine_count, seed and chunk_size have the same layout.
+
+    Only materialized chunks are included in the json() of a
+    ChunkedMineField, so its size on the wire also follows the explored
+    area rather than the size of the board.
+
+    Scoring the difficulty of a ChunkedMineField would lay out every chunk,
+    so it isn't scored at all.
+    """
+
+    difficulty_scored = False
+
+    def __init__(self, width=12, height=12, mine_count=None, seed=None,
+                 chunk_size=64):
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.chunk_size = chunk_size
+        super().__init__(width=width, height=height, mine_count=mine_count)
+
+    def _build_board(self):
+        self._layouts = dict()
+        self._chunks = dict()
+        self.mines = _ChunkedArray(self, 'mines')
+        self.probed = _ChunkedArray(self, 'probed')
+        self.flagged = _ChunkedArray(self, 'flagged')
+        self.contacts = _ChunkedArray(self, 'contacts')
+        self.board = ArrayBoard(self)
+
+    def _populate_mines(self):
+        # Mines are placed chunk by chunk as chunks are touched
+        pass
+
+    def _index_regions(self):
+        return None
+
+    def difficulty(self):
+        raise ValueError('The difficulty of a chunked minefield is not scored')
+
+    def _chunk_dims(self, key):
+        cx, cy = key
+        size = self.chunk_size
+        return (min(size, self.width - cx * size),
+                min(size, self.height - cy * size))
+
+    def _locate(self, idx):
+        """
+        Method _locate returns the key of the chunk containing the cell at
+        `idx`, and that cells index within the chunk.
+        """
+        x, y = divmod(idx, self.height)
+        size = self.chunk_size
+        key = (x // size, y // size)
+        _, cheight = self._chunk_dims(key)
+        return key, (x % size) * cheight + (y % size)
+
+    def _quota(self, key):
+        """
+        Method _quota returns how many mines the chunk `key` holds. Chunks get
+        the share of mine_count matching their share of the cells, rounded
+        such that the shares of all chunks add up to exactly mine_count.
+        """
+        cwidth, cheight = self._chunk_dims(key)
+        x0, y0 = key[0] * self.chunk_size, key[1] * self.chunk_size
+        # Cells of every chunk ordered before this one
+        before = x0 * self.height + cwidth * y0
+        total = self.width * self.height
+        after = before + cwidth * cheight
+        return (self.mine_count * after // total -
+                self.mine_count * before // total)
+
+    def _layout(self, key):
+        """
+        Method _layout returns the bytearray of mines of the chunk `key`,
+        deriving it from the seed the first time it's needed.
+        """
+        layout = self._layouts.get(key)
+        if layout is None:
+            cwidth, cheight = self._chunk_dims(key)
+            rng = random.Random('{}:{}:{}'.format(self.seed, *key))
+            layout = bytearray(cwidth * cheight)
+            for local in rng.sample(range(len(layout)), self._quota(key)):
+                layout[local] = 1
+            self._layouts[key] = layout
+        return layout
+
+    def _chunk(self, key):
+        """
+        Method _chunk returns the chunk `key`, materializing it if this is the
+        first time it's been touched.
+        """
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            return chunk
+        cwidth, cheight = self._chunk_dims(key)
+        chunk = _Chunk(cwidth, cheight, self._layout(key))
+        x0, y0 = key[0] * self.chunk_size, key[1] * self.chunk_size
+
+        # Count the mines of this chunk, and those just outside of it, into
+        # the contacts of the cells of this chunk they touch.
+        ring = [(x, y) for x in range(x0 - 1, x0 + cwidth + 1)
+                for y in (y0 - 1, y0 + cheight)]
+        ring += [(x, y) for x in (x0 - 1, x0 + cwidth)
+                 for y in range(y0, y0 + cheight)]
+        mines = [(x0 + local // cheight, y0 + local % cheight)
+                 for local, is_mine in enumerate(chunk.mines) if is_mine]
+        mines += [(x, y) for x, y in ring
+                  if 0 <= x < self.width and 0 <= y < self.height
+                  and self.mines[x * self.height + y]]
+        for mx, my in mines:
+            for dx, dy in COMPASS.values():
+                lx, ly = mx + dx - x0, my + dy - y0
+                if 0 <= lx < cwidth and 0 <= ly < cheight:
+                    chunk.contacts[lx * cheight + ly] += 1
+        self._chunks[key] = chunk
+        return chunk
+
+    def _neighbors(self, idx):
+        height = self.height
+        x, y = divmod(idx, height)
+        rv = []
+        for dx, dy in COMPASS.values():
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < height:
+                rv.append(nx * height + ny)
+        return rv
+
+    def _compass_neighbors(self, idx):
+        height = self.height
+        x, y = divmod(idx, height)
+        rv = dict()
+        for k, (dx, dy) in COMPASS.items():
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < height:
+                rv[k] = nx * height + ny
+            else:
+                rv[k] = None
+        return rv
+
+    def _set_mine(self, idx, is_mine):
+        is_mine = bool(is_mine)
+        if bool(self.mines[idx]) == is_mine:
+            return False
+        self.mines[idx] = is_mine
+        # Chunks which aren't materialized yet will count the change once
+        # they are, so only materialized chunks are updated.
+        delta = 1 if is_mine else -1
+        for nidx in self._neighbors(idx):
+            key, local = self._locate(nidx)
+            if key in self._chunks:
+                self._chunks[key].contacts[local] += delta
+        return True
+
+    def _probe(self, idx):
+        probed, contacts = self.probed, self.contacts
+        revealed = []
+        if not probed[idx]:
+            probed[idx] = 1
+            revealed.append(idx)
+        if contacts[idx]:
+            return revealed
+        stack = [idx]
+        while stack:
+            for nidx in self._neighbors(stack.pop()):
+                if probed[nidx]:
+                    continue
+                probed[nidx] = 1
+                revealed.append(nidx)
+                if not contacts[nidx]:
+                    stack.append(nidx)
+        return revealed
+
+    def _chunk_indices(self, key):
+        """
+        Method _chunk_indices returns the flat indices of the cells of the
+        chunk `key`, in the order they're stored within the chunk.
+        """
+        cwidth, cheight = self._chunk_dims(key)
+        x0, y0 = key[0] * self.chunk_size, key[1] * self.chunk_size
+        return [(x0 + lx) * self.height + y0 + ly
+                for lx in range(cwidth) for ly in range(cheight)]
+
+    def empty_positions(self, count, exclude=()):
+        """
+        Method empty_positions returns `count` randomly chosen (x, y)
+        positions of cells without mines, none of which are in `exclude`.
+        Positions are only chosen from chunks which have already been laid
+        out, so no new area of the board is touched.
+        """
+        exclude = set(x * self.height + y for x, y in exclude)
+        free = []
+        for key, layout in list(self._layouts.items()):
+            for idx, is_mine in zip(self._chunk_indices(key), layout):
+                if not is_mine and idx not in exclude:
+                    free.append(idx)
+        if count > len(free):
+            raise ValueError(
+                "Cannot find {} empty cells on {}; only {} are free".format(
+                    count, repr(self), len(free)))
+        return [divmod(idx, self.height) for idx in random.sample(free, count)]
+
+    def check_counters(self):
+        counts = {
+            'probed_count': 0,
+            'flag_count': 0,
+            'correct_flags': 0,
+            'safe_remaining': self.width * self.height - self.mine_count,
+        }
+        for chunk in self._chunks.values():
+            for is_mine, probed, flagged in zip(chunk.mines, chunk.probed,
+                                                chunk.flagged):
+                counts['probed_count'] += probed
+                counts['flag_count'] += flagged
+                counts['correct_flags'] += flagged and is_mine
+                counts['safe_remaining'] -= probed and not is_mine
+        for name, count in counts.items():
+            if getattr(self, name) != count:
+                raise AssertionError("{} of {} is {}, but counted {}".format(
+                    name, repr(self), getattr(self, name), count))
+
+    def materialized(self):
+        """
+        Method materialized returns the number of materialized chunks.
+        """
+        return len(self._chunks)
+
+    def _json(self):
+        # Only the cells of materialized chunks are listed
+        cells = []
+        for key in sorted(self._chunks):
+            for idx in self._chunk_indices(key):
+                cells.append(ArrayCell(self, idx).json())
+        rv = {
+            "selected": self.selected,
+            "height": self.height,
+            "width": self.width,
+            "mine_count": self.mine_count,
+            "cells": cells,
+        }
+        return rv
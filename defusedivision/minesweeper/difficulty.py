@@ -0,0 +1,120 @@
+'''
+Module difficulty scores how hard a layout of mines is to clear, by the
+measures players of minesweeper use to compare boards:
+
+    - openings: connected groups of cells which neither hold nor touch a
+      mine, each of which is revealed by a single click
+    - isolated numbers: safe cells touching a mine which no opening reveals,
+      each needing a click of its own
+    - 3BV (the "Bechtel's Board Benchmark Value"): the fewest clicks needed to
+      clear the board, which is the number of openings plus the number of
+      isolated numbers
+
+The analysis treats the whole board as a bitboard, a single int holding one
+bit per cell at the cell's flat index `x*height + y`, so that a whole board is
+dilated, masked and counted with a handful of integer operations instead of
+cell by cell.
+'''
+
+import functools
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(n):
+        return bin(n).count('1')
+
+# Maps each byte of 0 or 1 to the ASCII digit '0' or '1'
+_DIGITS = bytes(b'01'[min(b, 1)] for b in range(256))
+
+
+def bitboard(mines):
+    """
+    Function bitboard returns the bitboard of a bytes-like object holding one
+    byte per cell, which is non-zero where a cell holds a mine.
+    """
+    if not mines:
+        return 0
+    return int(bytes(mines).translate(_DIGITS)[::-1], 2)
+
+
+class Difficulty(object):
+    """
+    Class Difficulty holds the scores of a layout of mines: its `bbbv` (3BV),
+    the number of `openings`, a list of the number of cells revealed by each
+    opening (`opening_sizes`), and the number of `isolated` numbers.
+    """
+
+    def __init__(self, openings, opening_sizes, isolated):
+        self.openings = openings
+        self.opening_sizes = opening_sizes
+        self.isolated = isolated
+        self.bbbv = openings + isolated
+
+    def json(self):
+        return {
+            "bbbv": self.bbbv,
+            "openings": self.openings,
+            "opening_sizes": self.opening_sizes,
+            "isolated": self.isolated,
+        }
+
+    def __repr__(self):
+        return "Difficulty(bbbv={}, openings={}, isolated={})".format(
+            self.bbbv, self.openings, self.isolated)
+
+
+class _Board(object):
+    """
+    Class _Board holds the masks needed to move a bitboard of a given size
+    one cell in any direction without wrapping around an edge.
+    """
+
+    def __init__(self, width, height):
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        column_top = (1 << height) - 2
+        column_bottom = (1 << (height - 1)) - 1
+        self.not_top, self.not_bottom = 0, 0
+        for x in range(width):
+            self.not_top |= column_top << (x * height)
+            self.not_bottom |= column_bottom << (x * height)
+
+    def dilate(self, cells):
+        """
+        Method dilate returns the bitboard of `cells` and every cell
+        touching them.
+        """
+        cells |= (cells << 1 & self.not_top) | (cells >> 1 & self.not_bottom)
+        cells |= (cells << self.height) | (cells >> self.height)
+        return cells & self.full
+
+
+@functools.lru_cache(maxsize=64)
+def _board(width, height):
+    return _Board(width, height)
+
+
+def analyze(width, height, mines):
+    """
+    Function analyze returns the Difficulty of a board of the given size with
+    mines at the set bits of the bitboard `mines`.
+    """
+    board = _board(width, height)
+    touched = board.dilate(mines)
+    zero = board.full & ~touched
+    numbers = touched & ~mines
+    isolated = _popcount(numbers & ~board.dilate(zero))
+
+    # Grow each opening from its lowest cell until it stops growing
+    sizes = []
+    while zero:
+        opening = zero & -zero
+        while True:
+            grown = board.dilate(opening) & zero
+            if grown == opening:
+                break
+            opening = grown
+        zero &= ~opening
+        sizes.append(_popcount(board.dilate(opening)))
+    return Difficulty(len(sizes), sizes, isolated)
@@ -3,6 +3,16 @@ import json
 
 from .contents import Contents
 from .cell import Cell
+from .difficulty import analyze, bitboard
+from .regions import ZeroRegions
+from .topology import COMPASS, board_topology
+
+
+# How often MineField.json was answered from its cache, for debugging
+CACHE_STATS = {
+    'json_hits': 0,
+    'json_misses': 0,
+}
 
 
 def json_dump(indata):
@@ -22,28 +32,93 @@ def cell_neighbors(mfield, x, y):
     given x, y coordinate. Returns a dictionary of strings representing compass
     directions to their neighbor cell.
     """
-    deltas = {
-        "N": (0, -1),
-        "NE": (1, -1),
-        "E": (1, 0),
-        "SE": (1, 1),
-        "S": (0, 1),
-        "SW": (-1, 1),
-        "W": (-1, 0),
-        "NW": (-1, -1),
-    }
+    height = mfield.height
+    row = board_topology(mfield.width, height).compass_neighbors(
+        x * height + y)
     rv = dict()
-    for k in deltas.keys():
-        delt = deltas[k]
-        nx, ny = map(lambda a, b: a + b, (x, y), delt)
-        if nx in range(mfield.width) and ny in range(mfield.height):
-            rv[k] = mfield.board[nx][ny]
-        else:
+    for k, nidx in zip(COMPASS, row):
+        if nidx is None:
             rv[k] = None
+        else:
+            rv[k] = mfield.board[nidx // height][nidx % height]
     return rv
 
 
+def mine_positions(width, height, count, exclude=()):
+    """
+    Function mine_positions returns a list of `count` distinct (x, y)
+    positions on a board of the given size at which to place mines, none of
+    which are among the flat indices in `exclude`. Applies a random selection
+    of simple constraints to where mines may be placed, though about half of
+    the mines are purely randomly placed.
+
+    Positions are sampled from the cells which are eligible, so this takes
+    the same time however dense the board is. Raises a ValueError if there
+    are fewer than `count` eligible cells.
+    """
+    exclude = set(exclude)
+    available = width * height - len(exclude)
+    if count < 0 or count > available:
+        raise ValueError(
+            "Cannot place {} mines on a {}x{} minefield with {} free "
+            "cells".format(count, width, height, available))
+    selectionfuncs = [
+        lambda y: not (y % 2),
+        lambda y: bool(y % 2),
+        lambda y: not (y % 3),
+    ]
+    yconstraint, xconstraint = random.sample(selectionfuncs * 2, 2)
+    xs = [x for x in range(width) if not xconstraint(x)]
+    ys = [y for y in range(height) if not yconstraint(y)]
+    constrained = [x * height + y for x in xs for y in ys]
+    constrained = [idx for idx in constrained if idx not in exclude]
+
+    # Each mine has even odds of being placed under the constraints
+    coins = random.getrandbits(count) if count else 0
+    constrained_count = bin(coins).count('1')
+    constrained_count = min(constrained_count, len(constrained))
+    placed = set(random.sample(constrained, constrained_count))
+    exclude.update(placed)
+    rest = [idx for idx in range(width * height) if idx not in exclude]
+    placed.update(random.sample(rest, count - constrained_count))
+    return [divmod(idx, height) for idx in placed]
+
+
 class MineField(object):
+    """
+    Class MineField is a board of Cells, some of which contain mines.
+
+    Besides the cells themselves, a MineField keeps running counts of its
+    progress (cells probed, flags placed, flags placed on mines, and safe
+    cells still unprobed), so the state of a game can be checked without
+    looking at every cell. These counts only stay correct if cells are probed
+    and flagged through the methods of the MineField. Setting `self_check` to
+    True recounts everything after every change and raises an AssertionError
+    if the running counts have drifted, which is useful in tests.
+
+    Every change made through the methods of a MineField, or by setting
+    `selected` or `mines_shown`, increases its `version`. The json() of a
+    MineField is cached until its version changes.
+
+    The json of a cell only says what its player may know: whether it's
+    flagged, and for probed cells, their contents and mine contacts. Where
+    the other mines are is only included once `mines_shown` is set, such as
+    when the player has died.
+
+    `layout_generator` may be set to a noguess.NoGuessGenerator, in which
+    case the mines are laid out anew by it when the first cell is probed.
+    Minefields whose mines can't be moved at all have `mines_fixed` set, and
+    get no foothold on the first probe. Minefields too large to score have
+    `difficulty_scored` unset, and raise a ValueError from method difficulty.
+    """
+
+    self_check = False
+    layout_generator = None
+    mines_fixed = False
+    difficulty_scored = True
+    _mines_shown = False
+    _json_cache = None
+
     def __init__(self, width=12, height=12, mine_count=None):
         if width is None:
             self.width = 12
@@ -53,86 +128,309 @@ class MineField(object):
             self.height = 12
         else:
             self.height = height
+        self.version = 0
         self.mine_count = mine_count
-        self.board = [
-            [Cell(w, h) for h in range(0, self.height)] for w in range(0, self.width)
-        ]
+        if self.mine_count is None:
+            self.mine_count = int(0.15 * (self.height * self.width))
+        self._check_mine_count()
+        self._build_board()
         self._populate_mines()
-        self._set_neighbors()
+        self.regions = self._index_regions()
+        self._reset_counters()
 
         self.selected = [0, 0]
 
+    def _build_board(self):
+        self.topology = board_topology(self.width, self.height)
+        self.board = [
+            [Cell(w, h, self) for h in range(0, self.height)]
+            for w in range(0, self.width)
+        ]
+
     def _populate_mines(self):
         """
         Method _populate_mines populates the cells of this minefield with
-        mines. Applies a random selection of simple constraints to where mines
-        may be placed, though about half of the mines are purely randomly
-        placed.
+        mines. See function mine_positions for how positions are chosen.
         """
-        if self.mine_count is None:
-            self.mine_count = int(0.15 * (self.height * self.width))
-        count = self.mine_count
-        selectionfuncs = [
-            lambda y: not (y % 2),
-            lambda y: bool(y % 2),
-            lambda y: not (y % 3),
+        for x, y in mine_positions(self.width, self.height, self.mine_count):
+            self.board[x][y].contents = Contents.mine
+        self._set_contacts()
+
+    def difficulty(self):
+        """
+        Method difficulty returns a difficulty.Difficulty scoring the current
+        layout of this minefields mines.
+        """
+        return analyze(self.width, self.height, self._mine_bitboard())
+
+    def _mine_bitboard(self):
+        """
+        Method _mine_bitboard returns an int with the bit at each flat index
+        set if that cell holds a mine.
+        """
+        return bitboard(
+            [self._is_mine(idx) for idx in range(self.width * self.height)])
+
+    def _check_mine_count(self):
+        """
+        Method _check_mine_count raises a ValueError if this minefield cannot
+        hold its mines while leaving room for the foothold made around the
+        first probe.
+        """
+        cells = self.width * self.height
+        most = cells - min(cells, 9)
+        if not 0 <= self.mine_count <= most:
+            raise ValueError(
+                "Cannot place {} mines on a {}x{} minefield; between 0 and {} "
+                "mines leave room for the first probe".format(
+                    self.mine_count, self.width, self.height, most))
+
+    def _index_regions(self):
+        """
+        Method _index_regions returns the index of this minefields openings,
+        or None if openings aren't indexed ahead of time.
+        """
+        return ZeroRegions(self)
+
+    def _set_contacts(self):
+        """
+        Method _set_contacts counts the mines touching each Cell, caching the
+        count in that Cells 'contacts' field.
+        """
+        cells = [cell for row in self.board for cell in row]
+        for idx, cell in enumerate(cells):
+            cell.contacts = sum(
+                1 for nidx in self._neighbors(idx)
+                if cells[nidx].contents == Contents.mine)
+
+    def _cell(self, idx):
+        return self.board[idx // self.height][idx % self.height]
+
+    def _neighbors(self, idx):
+        return self.topology.neighbors(idx)
+
+    def _compass_cells(self, idx):
+        """
+        Method _compass_cells returns a dictionary of compass directions to
+        the Cell neighboring the cell at `idx` in that direction, or None if
+        that neighbor would be off the board.
+        """
+        rv = dict()
+        for k, nidx in zip(COMPASS, self.topology.compass_neighbors(idx)):
+            rv[k] = None if nidx is None else self._cell(nidx)
+        return rv
+
+    def _is_mine(self, idx):
+        return self._cell(idx).contents == Contents.mine
+
+    def _is_zero(self, idx):
+        cell = self._cell(idx)
+        return cell.contents != Contents.mine and not cell.mine_contacts()
+
+    def _set_mine(self, idx, is_mine):
+        """
+        Method _set_mine adds or removes the mine at `idx`, adjusting the mine
+        contacts of the neighboring cells. Returns False if the cell already
+        was as requested, True otherwise.
+        """
+        cell = self._cell(idx)
+        contents = Contents.mine if is_mine else Contents.empty
+        if cell.contents == contents:
+            return False
+        cell.contents = contents
+        delta = 1 if is_mine else -1
+        for nidx in self._neighbors(idx):
+            self._cell(nidx).contacts += delta
+        return True
+
+    def _reveal(self, idx):
+        """
+        Method _reveal probes the cell at `idx`, spreading out from it if it
+        touches no mines. Returns the list of newly probed cells.
+        """
+        shapes, offsets = self.topology.shapes, self.topology.offsets
+        cell = self._cell(idx)
+        revealed = []
+        if not cell.probed:
+            cell.probed = True
+            revealed.append(cell)
+        if cell.contacts:
+            return revealed
+        stack = [idx]
+        while stack:
+            cur = stack.pop()
+            for off in offsets[shapes[cur]]:
+                nidx = cur + off
+                neighbor = self._cell(nidx)
+                if neighbor.probed:
+                    continue
+                neighbor.probed = True
+                revealed.append(neighbor)
+                if not neighbor.contacts:
+                    stack.append(nidx)
+        return revealed
+
+    def empty_positions(self, count, exclude=()):
+        """
+        Method empty_positions returns `count` randomly chosen (x, y)
+        positions of cells without mines, none of which are in `exclude`.
+        Raises a ValueError if there aren't enough such cells.
+        """
+        exclude = set(x * self.height + y for x, y in exclude)
+        free = [
+            idx for idx in range(self.width * self.height)
+            if idx not in exclude and not self._is_mine(idx)
         ]
-        yconstraint, xconstraint = random.sample(selectionfuncs * 2, 2)
-        for x in range(count):
-            while True:
-                rx, ry = random.randint(0, self.width - 1), random.randint(
-                    0, self.height - 1)
-
-                if random.randint(0, 1):
-                    if yconstraint(ry):
-                        continue
-                    if xconstraint(rx):
-                        continue
-                c = self.board[rx][ry]
-                if c.contents == Contents.empty:
-                    c.contents = Contents.mine
-                    break
-
-    def _set_neighbors(self):
-        """
-        Method _set_neighbors populates each Cells 'neighbors' field with a
-        dictionary of neighboring cells. The keys to the dictionary are strings
-        representing the compass direction where that Cell sits relative to the
-        current cell. If there is not a Cell at the compass position, then that
-        key has a value of None in the dictionary.
-        """
-        for h in range(self.height):
-            for w in range(self.width):
-                c = self.board[w][h]
-                c.neighbors = cell_neighbors(self, w, h)
+        if count > len(free):
+            raise ValueError(
+                "Cannot find {} empty cells on {}; only {} are free".format(
+                    count, repr(self), len(free)))
+        return [divmod(idx, self.height) for idx in random.sample(free, count)]
 
-    def selected(self):
-        raise NotImplementedError
-        # return [self.board[w][h]
-        #         for h in range(self.height) for w in range(self.width)
-        #         if self.board[w][h].selected]
+    def _reset_counters(self):
+        self.probed_count = 0
+        self.flag_count = 0
+        self.correct_flags = 0
+        self.safe_remaining = self.width * self.height - self.mine_count
+
+    def check_counters(self):
+        """
+        Method check_counters recounts the progress of this minefield from
+        every cell, raising an AssertionError if the result differs from the
+        running counts.
+        """
+        counts = {
+            'probed_count': 0,
+            'flag_count': 0,
+            'correct_flags': 0,
+            'safe_remaining': 0,
+        }
+        for row in self.board:
+            for cell in row:
+                is_mine = cell.contents == Contents.mine
+                counts['probed_count'] += cell.probed
+                counts['flag_count'] += cell.flagged
+                counts['correct_flags'] += cell.flagged and is_mine
+                counts['safe_remaining'] += not (cell.probed or is_mine)
+        for name, count in counts.items():
+            if getattr(self, name) != count:
+                raise AssertionError("{} of {} is {}, but counted {}".format(
+                    name, repr(self), getattr(self, name), count))
+
+    def move_mines(self, removed, added):
+        """
+        Method move_mines removes the mines at the (x, y) positions in
+        `removed` and places new mines at the positions in `added`. Mines must
+        be moved through this method once the minefield has been created, so
+        that the cached mine contacts, the index of openings and the progress
+        counts are kept up to date.
+        """
+        changed = []
+        for positions, is_mine in [(removed, False), (added, True)]:
+            delta = 1 if is_mine else -1
+            for x, y in positions:
+                idx = x * self.height + y
+                if not self._set_mine(idx, is_mine):
+                    continue
+                changed.append(idx)
+                cell = self._cell(idx)
+                if cell.flagged:
+                    self.correct_flags += delta
+                if not cell.probed:
+                    self.safe_remaining -= delta
+        if self.regions is not None:
+            self.regions.update(changed)
+        self.version += 1
+        if self.self_check:
+            self.check_counters()
+
+    def load_layout(self, positions):
+        """
+        Method load_layout moves the mines of this minefield so that they lie
+        exactly at the (x, y) positions in `positions`. Raises a ValueError if
+        that's not the same number of mines as this minefield has.
+        """
+        target = set(x * self.height + y for x, y in positions)
+        if len(target) != self.mine_count:
+            raise ValueError("Layout of {} mines does not fit {}".format(
+                len(target), repr(self)))
+        current = set(idx for idx in range(self.width * self.height)
+                      if self._is_mine(idx))
+        self.move_mines([divmod(idx, self.height) for idx in current - target],
+                        [divmod(idx, self.height) for idx in target - current])
+
+    def probe(self, x, y):
+        """
+        Method probe probes the cell at (x, y), returning a list of every
+        cell which was newly revealed as a result. Probing a cell of an
+        opening reveals the whole opening at once.
+        """
+        idx = x * self.height + y
+        if self.regions is not None and self.regions.zero[idx]:
+            revealed = []
+            for cell in map(self._cell, self.regions.opening(idx)):
+                if not cell.probed:
+                    cell.probed = True
+                    revealed.append(cell)
+        else:
+            revealed = self._reveal(idx)
+        self.probed_count += len(revealed)
+        for cell in revealed:
+            if cell.contents != Contents.mine:
+                self.safe_remaining -= 1
+        self.version += 1
+        if self.self_check:
+            self.check_counters()
+        return revealed
 
-    def create_foothold(self):
+    def flag(self, x, y):
         """
-        generally called when the user makes first selection. Clear out any
-        mines within 2 spaces of the existing selection and move them elsewhere
-        onto the board. This prevents losing on the first probe and (usually)
-        enables a corridor to open up on which the user may begin working
+        Method flag toggles whether the cell at (x, y) is flagged.
         """
-        sel = self.selected()
-        cell = sel[0]
+        cell = self.board[x][y]
+        cell.flagged = not cell.flagged
+        delta = 1 if cell.flagged else -1
+        self.flag_count += delta
         if cell.contents == Contents.mine:
-            cell.contents = Contents.empty
-        for adj in cell.get_adjacent():
-            if adj.contents == Contents.mine:
-                adj.contents = Contents.empty
-        self.set_mine_contacts()
+            self.correct_flags += delta
+        self.version += 1
+        if self.self_check:
+            self.check_counters()
+
+    @property
+    def selected(self):
+        return self._selected
+
+    @selected.setter
+    def selected(self, value):
+        self._selected = value
+        self.version += 1
+
+    @property
+    def mines_shown(self):
+        return self._mines_shown
+
+    @mines_shown.setter
+    def mines_shown(self, value):
+        self._mines_shown = value
+        self.version += 1
 
     def json(self):
         """
         Method json returns a json serializable object representing this
-        minefield.
+        minefield. The object is reused for as long as the minefield's version
+        stays the same, so it must not be changed.
         """
+        cached = self._json_cache
+        if cached is not None and cached[0] == self.version:
+            CACHE_STATS['json_hits'] += 1
+            return cached[1]
+        CACHE_STATS['json_misses'] += 1
+        rv = self._json()
+        self._json_cache = (self.version, rv)
+        return rv
+
+    def _json(self):
         rv = {
             "selected": self.selected,
             "height": self.height,
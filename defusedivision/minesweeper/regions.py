@@ -0,0 +1,134 @@
+'''
+Module regions indexes the "openings" of a minefield: connected groups of
+cells which neither contain nor touch a mine. Probing any cell of an opening
+reveals the whole opening plus the numbered cells bordering it, so knowing
+the openings ahead of time lets a probe reveal them in one step instead of
+discovering them cell by cell.
+'''
+
+from array import array
+
+
+class ZeroRegions(object):
+    """
+    Class ZeroRegions groups the zero-contact cells of a minefield into
+    regions using a union-find (disjoint set) structure over flat cell
+    indices.
+
+    The minefield given must provide `width`, `height`, a method
+    `_neighbors(idx)` returning the flat indices adjacent to `idx` and a
+    method `_is_zero(idx)` returning whether the cell at `idx` is free of
+    mines and touches no mines.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        size = field.width * field.height
+        self.parent = array('l', range(size))
+        self.zero = bytearray(size)
+        # Maps the root index of each region to a list of its members
+        self.members = dict()
+        # Lazily computed borders of regions, also keyed by root index
+        self._borders = dict()
+        for idx in range(size):
+            if field._is_zero(idx):
+                self.zero[idx] = 1
+                self.members[idx] = [idx]
+        for idx in range(size):
+            if self.zero[idx]:
+                self._join(idx)
+
+    def find(self, idx):
+        """
+        Method find returns the root index of the region containing `idx`.
+        """
+        parent = self.parent
+        while parent[idx] != idx:
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    def _union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        # Attach the smaller region beneath the larger one
+        if len(self.members[ra]) < len(self.members[rb]):
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.members[ra].extend(self.members.pop(rb))
+        self._borders.pop(ra, None)
+        self._borders.pop(rb, None)
+        return ra
+
+    def _join(self, idx):
+        """
+        Method _join merges the zero cell at `idx` with every region of its
+        zero neighbors.
+        """
+        zero = self.zero
+        for nidx in self.field._neighbors(idx):
+            if zero[nidx]:
+                self._union(idx, nidx)
+
+    def border(self, root):
+        """
+        Method border returns the non-zero cells touching the region with the
+        given root.
+        """
+        if root not in self._borders:
+            zero, neighbors = self.zero, self.field._neighbors
+            border = set()
+            for idx in self.members[root]:
+                for nidx in neighbors(idx):
+                    if not zero[nidx]:
+                        border.add(nidx)
+            self._borders[root] = list(border)
+        return self._borders[root]
+
+    def opening(self, idx):
+        """
+        Method opening returns every cell revealed by probing the zero cell at
+        `idx`: all members of its region followed by the region's border.
+        """
+        root = self.find(idx)
+        return self.members[root] + self.border(root)
+
+    def update(self, changed):
+        """
+        Method update brings the index up to date after mines have been added
+        or removed at the flat indices in `changed`. Only the regions around
+        those cells are rebuilt; the rest of the index is left untouched.
+        """
+        field, zero, parent = self.field, self.zero, self.parent
+        affected = set(changed)
+        for idx in changed:
+            affected.update(field._neighbors(idx))
+
+        # Regions which lost a cell may have been split in two, so they're
+        # taken apart and their remaining cells re-joined from scratch.
+        rejoin = set()
+        for idx in affected:
+            is_zero = field._is_zero(idx)
+            if zero[idx] and not is_zero:
+                root = self.find(idx)
+                if root in self.members:
+                    rejoin.update(self.members.pop(root))
+                    self._borders.pop(root, None)
+            elif is_zero and not zero[idx]:
+                rejoin.add(idx)
+        for idx in affected:
+            zero[idx] = field._is_zero(idx)
+        for idx in rejoin:
+            parent[idx] = idx
+            if zero[idx]:
+                self.members[idx] = [idx]
+        for idx in rejoin:
+            if zero[idx]:
+                self._join(idx)
+
+        # A cell moving in or out of a border changes that region's border
+        for idx in affected:
+            for nidx in field._neighbors(idx):
+                if zero[nidx]:
+                    self._borders.pop(self.find(nidx), None)
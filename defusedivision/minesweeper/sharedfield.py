@@ -0,0 +1,124 @@
+'''
+Module sharedfield lets every player of a Bout play the same board. The
+board's mines are laid out once in an immutable MineLayout, which holds
+everything that follows from where the mines are: their contacts and the
+index of openings. Each player gets an OverlayMineField which reads the
+layout, and only stores which cells that player has probed and flagged, one
+bit each.
+
+Since the mines of a shared layout can't be moved, there's no foothold made
+around the first probe. Instead, every layout is made with a `start` cell
+whose neighborhood is free of mines, and every player starts with that cell
+selected.
+'''
+
+from .arrayfield import ArrayMineField, ArrayBoard
+from .minefield import mine_positions
+from .regions import ZeroRegions
+from .topology import board_topology
+
+
+class _BitArray(object):
+    """
+    Class _BitArray is a fixed size array of bits, indexed like a bytearray.
+    """
+
+    __slots__ = ('bits', )
+
+    def __init__(self, size):
+        self.bits = bytearray((size + 7) // 8)
+
+    def __getitem__(self, idx):
+        return self.bits[idx >> 3] >> (idx & 7) & 1
+
+    def __setitem__(self, idx, value):
+        if value:
+            self.bits[idx >> 3] |= 1 << (idx & 7)
+        else:
+            self.bits[idx >> 3] &= ~(1 << (idx & 7)) & 0xff
+
+
+class MineLayout(object):
+    """
+    Class MineLayout is an immutable layout of mines, along with the mine
+    contacts of every cell and the index of the layout's openings. The
+    mines are placed at the (x, y) positions in `positions` if given, or
+    randomly otherwise, keeping `start` and its neighbors free of mines.
+    """
+
+    def __init__(self, width=12, height=12, mine_count=None, positions=None,
+                 start=None):
+        self.width = 12 if width is None else width
+        self.height = 12 if height is None else height
+        if mine_count is None:
+            mine_count = int(0.15 * (self.height * self.width))
+        self.mine_count = mine_count
+        if start is None:
+            start = (self.width // 2, self.height // 2)
+        self.start = tuple(start)
+        self.topology = board_topology(self.width, self.height)
+
+        if positions is None:
+            sidx = self.start[0] * self.height + self.start[1]
+            exclude = (sidx, ) + self.topology.neighbors(sidx)
+            positions = mine_positions(
+                self.width, self.height, mine_count, exclude=exclude)
+        mines = bytearray(self.width * self.height)
+        contacts = bytearray(self.width * self.height)
+        for x, y in positions:
+            idx = x * self.height + y
+            mines[idx] = 1
+            for nidx in self.topology.neighbors(idx):
+                contacts[nidx] += 1
+        if sum(mines) != mine_count:
+            raise ValueError("Layout of {} mines does not fit {}".format(
+                sum(mines), repr(self)))
+        self.mines = bytes(mines)
+        self.contacts = bytes(contacts)
+        self.regions = ZeroRegions(self)
+
+    def _neighbors(self, idx):
+        return self.topology.neighbors(idx)
+
+    def _is_zero(self, idx):
+        return not (self.mines[idx] or self.contacts[idx])
+
+    def __repr__(self):
+        return "MineLayout({}, {}, {})".format(self.width, self.height,
+                                               self.mine_count)
+
+
+class OverlayMineField(ArrayMineField):
+    """
+    Class OverlayMineField is one player's view of a MineLayout shared with
+    other players, storing only the cells this player has probed or flagged.
+    """
+
+    mines_fixed = True
+
+    def __init__(self, layout):
+        self.layout = layout
+        super().__init__(width=layout.width, height=layout.height,
+                         mine_count=layout.mine_count)
+        self.selected = list(layout.start)
+
+    def _build_board(self):
+        layout = self.layout
+        size = self.width * self.height
+        self.topology = layout.topology
+        self.mines = layout.mines
+        self.contacts = layout.contacts
+        self.probed = _BitArray(size)
+        self.flagged = _BitArray(size)
+        self.board = ArrayBoard(self)
+
+    def _populate_mines(self):
+        # The mines are those of the layout
+        pass
+
+    def _index_regions(self):
+        return self.layout.regions
+
+    def _set_mine(self, idx, is_mine):
+        raise ValueError("Cannot move the mines of {}, as its layout is "
+                         "shared".format(repr(self)))
@@ -0,0 +1,395 @@
+'''
+Module solver works out what a player can know about a minefield from what
+they can see of it: which unprobed cells are certainly safe, which certainly
+hold mines, and how likely every other unprobed cell is to hold a mine.
+
+Only the "frontier" (unprobed cells touching a probed cell) is reasoned
+about cell by cell. Each probed cell gives a constraint: the number of mines
+among its unprobed neighbors. Constraints are held as bitsets over the
+frontier cells (plain ints), and are first simplified by propagation:
+
+    - a constraint with no mines left makes all its cells safe
+    - a constraint with as many mines as cells makes all its cells mines
+    - a constraint whose cells are a subset of anothers is subtracted from it
+
+Whatever is left undecided is split into independent components, and each
+component small enough is solved by enumerating its consistent mine
+arrangements. If the total number of mines is known, components and the
+cells off the frontier are weighted against each other by how many ways the
+remaining mines could be spread over the cells off the frontier.
+'''
+
+import math
+
+from .contents import Contents
+from .topology import board_topology
+
+try:
+    _popcount = int.bit_count
+except AttributeError:
+    def _popcount(n):
+        return bin(n).count('1')
+
+
+class _Budget(Exception):
+    pass
+
+
+class Solution(object):
+    """
+    Class Solution holds what the solver found. `safe` and `mines` are sets
+    of (x, y) positions known to be safe or to hold mines. `probabilities`
+    maps each undecided frontier position to its chance of holding a mine,
+    and `default_probability` is the chance for every other unprobed cell
+    (None if the number of mines on the board wasn't given).
+    """
+
+    def __init__(self, safe, mines, probabilities, default_probability):
+        self.safe = safe
+        self.mines = mines
+        self.probabilities = probabilities
+        self.default_probability = default_probability
+
+    def probability(self, x, y):
+        """
+        Method probability returns the chance that the unprobed cell at
+        (x, y) holds a mine.
+        """
+        if (x, y) in self.safe:
+            return 0.0
+        if (x, y) in self.mines:
+            return 1.0
+        return self.probabilities.get((x, y), self.default_probability)
+
+
+def visible_state(field):
+    """
+    Function visible_state returns what a player can see of a MineField: a
+    dictionary of the flat index of each probed, mine-free cell to its number
+    of mine contacts, and a set of the flat indices of flagged cells.
+    """
+    revealed = dict()
+    flagged = set()
+    height = field.height
+    if isinstance(getattr(field, 'probed', None), bytearray):
+        # An ArrayMineField can be read straight from its arrays
+        mines, contacts = field.mines, field.contacts
+        for idx, probed in enumerate(field.probed):
+            if probed and not mines[idx]:
+                revealed[idx] = contacts[idx]
+        flagged.update(i for i, f in enumerate(field.flagged) if f)
+        return revealed, flagged
+    for row in field.board:
+        for cell in row:
+            idx = cell.x * height + cell.y
+            if cell.flagged:
+                flagged.add(idx)
+            if cell.probed and cell.contents != Contents.mine:
+                revealed[idx] = cell.mine_contacts()
+    return revealed, flagged
+
+
+def _propagate(constraints, safe, mines):
+    """
+    Function _propagate simplifies the dictionary `constraints` (of bitmask
+    to mine count) in place until no more cells can be decided. Returns the
+    updated bitmasks of safe cells and of mines.
+    """
+    changed = True
+    while changed:
+        changed = False
+        reduced = dict()
+        for mask, count in constraints.items():
+            count -= _popcount(mask & mines)
+            mask &= ~(safe | mines)
+            if not mask:
+                continue
+            if count <= 0:
+                safe |= mask
+                changed = True
+            elif count == _popcount(mask):
+                mines |= mask
+                changed = True
+            else:
+                reduced[mask] = count
+        constraints.clear()
+        constraints.update(reduced)
+        if changed:
+            continue
+        # Subtract constraints from those they're subsets of. Any superset
+        # of a constraint shares its lowest cell, so only those are checked.
+        by_cell = dict()
+        for mask in constraints:
+            for bit in _bits(mask):
+                by_cell.setdefault(bit, []).append(mask)
+        for small in list(constraints):
+            low = (small & -small).bit_length() - 1
+            for big in by_cell[low]:
+                if small & big == small and small != big:
+                    rest = big & ~small
+                    if rest not in constraints:
+                        constraints[rest] = (constraints[big] -
+                                             constraints[small])
+                        changed = True
+    return safe, mines
+
+
+def _components(constraints):
+    """
+    Function _components groups constraints whose cells overlap, returning a
+    list of (cells bitmask, list of constraints) pairs.
+    """
+    groups = []
+    for mask, count in constraints.items():
+        merged_mask, merged = mask, [(mask, count)]
+        rest = []
+        for gmask, group in groups:
+            if gmask & merged_mask:
+                merged_mask |= gmask
+                merged += group
+            else:
+                rest.append((gmask, group))
+        rest.append((merged_mask, merged))
+        groups = rest
+    return groups
+
+
+def _bits(mask):
+    rv = []
+    while mask:
+        low = mask & -mask
+        rv.append(low.bit_length() - 1)
+        mask ^= low
+    return rv
+
+
+def _enumerate(constraints, max_mines, budget):
+    """
+    Function _enumerate counts every arrangement of mines over the cells of
+    `constraints` which satisfies them all. Returns the list of cell bits,
+    and a dictionary of number of mines to (arrangements, list of how many of
+    those arrangements place a mine on each cell). Raises _Budget after visiting
+    more than `budget` partial arrangements.
+    """
+    # Order cells so that each constraint is completed as early as possible
+    order = []
+    seen = 0
+    for cmask, _ in sorted(constraints, key=lambda c: _popcount(c[0])):
+        for bit in _bits(cmask & ~seen):
+            order.append(bit)
+        seen |= cmask
+    bits = [1 << b for b in order]
+    size = len(bits)
+    prefix = [0]
+    for bit in bits:
+        prefix.append(prefix[-1] | bit)
+    checks = [[c for c in constraints if c[0] & bit] for bit in bits]
+    tally = dict()
+    visited = [0]
+
+    def search(i, placed, count):
+        visited[0] += 1
+        if visited[0] > budget:
+            raise _Budget()
+        if i == size:
+            if count not in tally:
+                tally[count] = [0, [0] * size]
+            entry = tally[count]
+            entry[0] += 1
+            per_cell = entry[1]
+            for j in range(size):
+                if placed & bits[j]:
+                    per_cell[j] += 1
+            return
+        done = prefix[i + 1]
+        for mine in (0, 1):
+            if mine and count >= max_mines:
+                continue
+            trial = placed | bits[i] if mine else placed
+            for cmask, ccount in checks[i]:
+                have = _popcount(cmask & trial)
+                if have > ccount or have + _popcount(cmask & ~done) < ccount:
+                    break
+            else:
+                search(i + 1, trial, count + mine)
+
+    search(0, 0, 0)
+    return order, tally
+
+
+def _log_comb(n, k):
+    if k < 0 or k > n:
+        return None
+    return math.lgamma(n + 1) - math.lgamma(k + 1) - math.lgamma(n - k + 1)
+
+
+def _convolve(a, b):
+    rv = dict()
+    for ka, wa in a.items():
+        for kb, wb in b.items():
+            rv[ka + kb] = rv.get(ka + kb, 0) + wa * wb
+    return rv
+
+
+def solve(width, height, revealed, flagged=(), mine_count=None,
+          trust_flags=False, max_component=40, budget=200000):
+    """
+    Function solve returns a Solution for a board of the given size, where
+    `revealed` maps the flat index (`x*height + y`) of each probed cell to
+    its number of mine contacts, and `flagged` holds the flat indices of
+    flagged cells. Flags are only treated as mines if `trust_flags` is True.
+
+    Components of more than `max_component` cells, or which take more than
+    `budget` steps to enumerate, are only solved by propagation, and their
+    cells are given an estimated probability.
+    """
+    # Number every unprobed cell touching a probed cell
+    var_of = dict()
+    cells = []
+    raw = dict()
+    known_mines = set(flagged) if trust_flags else set()
+    topology = board_topology(width, height)
+    shapes, offsets = topology.shapes, topology.offsets
+    for idx, contacts in revealed.items():
+        mask = 0
+        for off in offsets[shapes[idx]]:
+            nidx = idx + off
+            if nidx in revealed:
+                continue
+            if nidx in known_mines:
+                contacts -= 1
+                continue
+            if nidx not in var_of:
+                var_of[nidx] = len(cells)
+                cells.append(nidx)
+            mask |= 1 << var_of[nidx]
+        if mask:
+            raw[mask] = contacts
+    constraints = dict(raw)
+    safe, mines = _propagate(constraints, 0, 0)
+
+    # Work out what's left, component by component
+    undecided = dict()
+    weights = []
+    for cmask, group in _components(constraints):
+        size = _popcount(cmask)
+        try:
+            if size > max_component:
+                raise _Budget()
+            limit = size if mine_count is None else mine_count
+            order, tally = _enumerate(group, limit, budget)
+        except _Budget:
+            for bit in _bits(cmask):
+                shares = [c / _popcount(m) for m, c in group if m >> bit & 1]
+                undecided[bit] = sum(shares) / len(shares)
+            continue
+        weights.append((order, tally))
+
+    unknown = width * height - len(revealed) - len(known_mines)
+    others = unknown - len(cells)
+    default = None
+    remaining = None
+    if mine_count is not None:
+        remaining = (mine_count - len(known_mines) - _popcount(mines) -
+                     int(round(sum(undecided.values()))))
+
+    # Weigh each component's arrangements against those of all the others
+    dists = [{k: entry[0] for k, entry in tally.items()}
+             for _, tally in weights]
+    prefix = [{0: 1}]
+    suffix = [{0: 1}]
+    if remaining is not None:
+        for dist in dists:
+            prefix.append(_convolve(prefix[-1], dist))
+        for dist in reversed(dists):
+            suffix.append(_convolve(suffix[-1], dist))
+        suffix.reverse()
+        # Weigh `k` mines on the frontier by the number of ways to place the
+        # rest off of it, scaled by the largest weight to keep them in range.
+        logs = [_log_comb(others, remaining - k)
+                for k in range(max(prefix[-1]) + 1)]
+        top = max([lc for lc in logs if lc is not None] or [0.0])
+        scale = [0.0 if lc is None else math.exp(lc - top) for lc in logs]
+    else:
+        # Without a mine count, every component is weighed on its own
+        scale = [1.0] * (len(cells) + 1)
+
+    for i, (order, tally) in enumerate(weights):
+        if remaining is None:
+            rest = {0: 1}
+        else:
+            rest = _convolve(prefix[i], suffix[i + 1])
+        total = 0.0
+        per_cell = [0.0] * len(order)
+        certain_safe = [True] * len(order)
+        certain_mine = [True] * len(order)
+        for k, (count, cell_counts) in tally.items():
+            weight = 0.0
+            for krest, wrest in rest.items():
+                weight += wrest * scale[k + krest]
+            if not weight:
+                continue
+            total += weight * count
+            for j, cell_count in enumerate(cell_counts):
+                per_cell[j] += weight * cell_count
+                certain_safe[j] = certain_safe[j] and cell_count == 0
+                certain_mine[j] = certain_mine[j] and cell_count == count
+        for j, bit in enumerate(order):
+            if not total:
+                undecided[bit] = 0.5
+            elif certain_safe[j]:
+                safe |= 1 << bit
+            elif certain_mine[j]:
+                mines |= 1 << bit
+            else:
+                undecided[bit] = per_cell[j] / total
+
+    other_cells = set()
+    if remaining is not None and others > 0:
+        total = 0.0
+        expected = 0.0
+        always_safe, always_mine = True, True
+        for k, count in prefix[-1].items():
+            weight = count * scale[k]
+            if not weight:
+                continue
+            total += weight
+            expected += weight * (remaining - k) / others
+            always_safe = always_safe and remaining - k == 0
+            always_mine = always_mine and remaining - k == others
+        if total:
+            default = expected / total
+            if always_safe or always_mine:
+                seen = set(revealed) | set(cells) | known_mines
+                other_cells = set(range(width * height)) - seen
+        if always_safe and total:
+            safe_others, mine_others = other_cells, set()
+        elif always_mine and total:
+            safe_others, mine_others = set(), other_cells
+        else:
+            safe_others, mine_others = set(), set()
+    else:
+        safe_others, mine_others = set(), set()
+
+    def position(idx):
+        return divmod(idx, height)
+
+    return Solution(
+        safe=set(position(cells[b]) for b in _bits(safe)) |
+        set(map(position, safe_others)),
+        mines=set(position(cells[b]) for b in _bits(mines)) |
+        set(map(position, mine_others)) | set(map(position, known_mines)),
+        probabilities={
+            position(cells[b]): p for b, p in undecided.items()
+        },
+        default_probability=default)
+
+
+def solve_field(field, **kwargs):
+    """
+    Function solve_field returns a Solution for what can be seen of a
+    MineField, knowing how many mines it holds.
+    """
+    revealed, flagged = visible_state(field)
+    kwargs.setdefault('mine_count', field.mine_count)
+    return solve(field.width, field.height, revealed, flagged, **kwargs)
@@ -0,0 +1,57 @@
+import unittest
+
+from .arrayfield import ArrayMineField
+from .contents import Contents
+from .minefield import MineField
+
+
+def cell_field_like(afield):
+    """
+    Returns a Cell based MineField with the same mine layout as `afield`.
+    """
+    field = MineField(afield.width, afield.height, afield.mine_count)
+    removed, added = [], []
+    for row in field.board:
+        for cell in row:
+            want = afield.board[cell.x][cell.y].contents
+            if cell.contents == Contents.mine and want != Contents.mine:
+                removed.append((cell.x, cell.y))
+            elif cell.contents != Contents.mine and want == Contents.mine:
+                added.append((cell.x, cell.y))
+    field.move_mines(removed, added)
+    return field
+
+
+class TestArrayMineField(unittest.TestCase):
+    def test_json_matches_cells(self):
+        afield = ArrayMineField(9, 7)
+        field = cell_field_like(afield)
+        self.assertEqual(afield.json(), field.json())
+
+    def test_mine_count(self):
+        afield = ArrayMineField(10, 10, 30)
+        self.assertEqual(sum(afield.mines), 30)
+
+    def test_contents_updates_contacts(self):
+        afield = ArrayMineField(3, 3, 0)
+        afield.board[0][0].contents = Contents.mine
+        self.assertEqual(afield.board[1][1].mine_contacts(), 1)
+        afield.board[2][2].contents = Contents.mine
+        self.assertEqual(afield.board[1][1].mine_contacts(), 2)
+        afield.board[0][0].contents = Contents.empty
+        self.assertEqual(afield.board[1][1].mine_contacts(), 1)
+
+    def test_probe_matches_cells(self):
+        afield = ArrayMineField(20, 15, 25)
+        field = cell_field_like(afield)
+        for x in range(afield.width):
+            for y in range(afield.height):
+                if afield.board[x][y].contents != Contents.mine:
+                    afield.probe(x, y)
+                    field.probe(x, y)
+                    break
+        self.assertEqual(afield.json(), field.json())
+
+
+if __name__ == '__main__':
+    unittest.main()
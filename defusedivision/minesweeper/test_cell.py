@@ -72,3 +72,24 @@ class TestCell(unittest.TestCase):
         # Check that all the hopefully unprobed cells are in fact unprobed
         self.assertEqual([field.board[x][y].probed for x, y in untouched], [False]*4)
 
+
+    def test_probe_returns_revealed(self):
+        """
+        Test that probe returns exactly the cells it newly revealed.
+        """
+        field = build_test_field(3, 3)
+        field.board[0][0].contents = Contents.mine
+        revealed = field.board[2][2].probe()
+        self.assertEqual(len(revealed), 8)
+        self.assertTrue(all(c.probed for c in revealed))
+        # Probing again reveals nothing new
+        self.assertEqual(field.board[2][2].probe(), [])
+
+    def test_probe_no_recursion_limit(self):
+        """
+        Test that probing an empty minefield larger than the interpreters
+        recursion limit reveals every cell.
+        """
+        field = build_test_field(120, 120)
+        revealed = field.board[0][0].probe()
+        self.assertEqual(len(revealed), 120 * 120)
@@ -0,0 +1,57 @@
+import unittest
+import random
+
+from .chunkfield import ChunkedMineField
+from .topology import COMPASS
+
+
+def counted_contacts(field, x, y):
+    rv = 0
+    for dx, dy in COMPASS.values():
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < field.width and 0 <= ny < field.height:
+            rv += field.mines[nx * field.height + ny]
+    return rv
+
+
+class TestChunkedMineField(unittest.TestCase):
+    def test_exact_mine_count(self):
+        field = ChunkedMineField(70, 45, 500, chunk_size=16)
+        total = sum(field.mines[idx] for idx in range(70 * 45))
+        self.assertEqual(total, 500)
+
+    def test_same_seed_same_layout(self):
+        a = ChunkedMineField(200, 200, seed=7, chunk_size=32)
+        b = ChunkedMineField(200, 200, seed=7, chunk_size=32)
+        cells = random.sample(range(200 * 200), 500)
+        self.assertEqual([a.mines[i] for i in cells],
+                         [b.mines[i] for i in cells])
+
+    def test_contacts_across_chunks(self):
+        field = ChunkedMineField(40, 30, 200, chunk_size=8)
+        field.self_check = True
+        cells = [(x, y) for x in range(40) for y in range(30)]
+        mines = [p for p in cells if field.mines[p[0] * 30 + p[1]]]
+        empty = [p for p in cells if not field.mines[p[0] * 30 + p[1]]]
+        # Materialize about half of the chunks before moving any mines
+        for x, y in cells[:600]:
+            field.contacts[x * 30 + y]
+        field.move_mines(random.sample(mines, 10), random.sample(empty, 10))
+        for x, y in cells:
+            self.assertEqual(field.contacts[x * 30 + y],
+                             counted_contacts(field, x, y))
+
+    def test_huge_board_stays_small(self):
+        field = ChunkedMineField(10000, 10000, chunk_size=64)
+        field.self_check = True
+        field.selected = [5000, 5000]
+        field.flag(5000, 5001)
+        field.probe(5000, 5000)
+        self.assertLess(field.materialized(), 50)
+        cells = field.json()['cells']
+        self.assertEqual(len(cells), sum(
+            c.width * c.height for c in field._chunks.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
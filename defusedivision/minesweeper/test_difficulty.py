@@ -0,0 +1,88 @@
+import unittest
+
+from .arrayfield import ArrayMineField
+from .chunkfield import ChunkedMineField
+from .difficulty import analyze, bitboard
+from .test_arrayfield import cell_field_like
+from .. import game
+from ..noguess import NoGuessGenerator
+
+
+class TestDifficulty(unittest.TestCase):
+    def test_known_board(self):
+        # One mine in the corner of a 3x3 board leaves a single opening of
+        # eight cells, and no isolated numbers:
+        #   [*][1][ ]
+        #   [1][1][ ]
+        #   [ ][ ][ ]
+        diff = analyze(3, 3, 1)
+        self.assertEqual((diff.bbbv, diff.openings, diff.isolated), (1, 1, 0))
+        self.assertEqual(diff.opening_sizes, [8])
+
+    def test_isolated_numbers(self):
+        # A row of mines down the middle of a 3x3 board leaves two isolated
+        # columns of numbers:
+        #   [2][*][2]
+        #   [3][*][3]
+        #   [2][*][2]
+        mines = bitboard(bytearray([0, 0, 0, 1, 1, 1, 0, 0, 0]))
+        diff = analyze(3, 3, mines)
+        self.assertEqual((diff.bbbv, diff.openings, diff.isolated), (6, 0, 6))
+
+    def test_openings_match_regions(self):
+        for _ in range(10):
+            field = ArrayMineField(30, 16, 99)
+            regions = field.regions
+            sizes = [len(regions.opening(root)) for root in regions.members]
+            self.assertEqual(sorted(field.difficulty().opening_sizes),
+                             sorted(sizes))
+
+    def test_cells_match_arrays(self):
+        afield = ArrayMineField(16, 16, 40)
+        field = cell_field_like(afield)
+        self.assertEqual(afield.difficulty().json(), field.difficulty().json())
+
+    def test_bout_balances_difficulty(self):
+        bout = game.Bout(
+            max_players=4,
+            minefield_size=(16, 16),
+            mine_count=40,
+            minefield_constructor=ArrayMineField,
+            max_difficulty_spread=0.1)
+        while bout.add_player():
+            pass
+        scores = [p.mfield.difficulty().bbbv for p in bout.players.values()]
+        first = scores[0]
+        for score in scores[1:]:
+            self.assertLessEqual(abs(score - first), 0.25 * first)
+
+    def test_generated_layouts_not_balanced(self):
+        # Their layout is replaced on the first probe, so balancing them
+        # beforehand would only waste time
+        bout = game.Bout(
+            max_players=4,
+            minefield_size=(16, 16),
+            mine_count=40,
+            minefield_constructor=ArrayMineField,
+            layout_generator=NoGuessGenerator(budget=0),
+            max_difficulty_spread=0.0)
+        while bout.add_player():
+            pass
+        self.assertEqual(bout.difficulty_rejections, 0)
+
+    def test_chunked_minefields_not_balanced(self):
+        # Scoring one would lay out every chunk of a huge board
+        bout = game.Bout(
+            max_players=2,
+            minefield_size=(5000, 5000),
+            minefield_constructor=ChunkedMineField,
+            max_difficulty_spread=0.0)
+        first, second = bout.add_player(), bout.add_player()
+        self.assertEqual(bout.difficulty_rejections, 0)
+        self.assertEqual(second.mfield.materialized(), 0)
+        with self.assertRaises(ValueError):
+            first.mfield.difficulty()
+
+
+if __name__ == '__main__':
+    unittest.main()
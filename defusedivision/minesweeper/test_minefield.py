@@ -0,0 +1,92 @@
+import unittest
+import random
+
+from .contents import Contents
+from .minefield import MineField, mine_positions
+from .arrayfield import ArrayMineField
+
+
+def counted_contacts(cell):
+    return sum(1 for _, n in cell.neighbors.items()
+               if n and n.contents == Contents.mine)
+
+
+class TestMineField(unittest.TestCase):
+    def test_move_mines_updates_contacts(self):
+        field = MineField(15, 10, 30)
+        cells = [c for row in field.board for c in row]
+        mines = [(c.x, c.y) for c in cells if c.contents == Contents.mine]
+        empty = [(c.x, c.y) for c in cells if c.contents != Contents.mine]
+        field.move_mines(random.sample(mines, 5), random.sample(empty, 5))
+        for cell in cells:
+            self.assertEqual(cell.contacts, counted_contacts(cell))
+
+    def test_counters_self_check(self):
+        """
+        Test that the progress counters stay correct through random flags,
+        probes and mine moves on both kinds of minefield.
+        """
+        for constructor in (MineField, ArrayMineField):
+            field = constructor(12, 9, 20)
+            field.self_check = True
+            field.check_counters()
+            for _ in range(60):
+                x = random.randrange(field.width)
+                y = random.randrange(field.height)
+                random.choice([field.probe, field.flag])(x, y)
+            cells = [c for row in field.board for c in row]
+            mines = [(c.x, c.y) for c in cells if c.contents == Contents.mine]
+            empty = [(c.x, c.y) for c in cells if c.contents != Contents.mine]
+            field.move_mines(random.sample(mines, 4), random.sample(empty, 4))
+
+    def test_counters_detect_drift(self):
+        field = MineField(5, 5, 3)
+        field.board[0][0].flagged = True
+        with self.assertRaises(AssertionError):
+            field.check_counters()
+
+    def test_dense_placement(self):
+        field = MineField(20, 20, 391)
+        mines = [c for row in field.board for c in row
+                 if c.contents == Contents.mine]
+        self.assertEqual(len(mines), 391)
+
+    def test_impossible_mine_count(self):
+        with self.assertRaises(ValueError):
+            MineField(5, 5, 17)
+        with self.assertRaises(ValueError):
+            mine_positions(3, 3, 10)
+
+    def test_mine_positions_exclude(self):
+        exclude = set(range(0, 100, 2))
+        positions = mine_positions(10, 10, 50, exclude)
+        self.assertEqual(len(set(positions)), 50)
+        for x, y in positions:
+            self.assertNotIn(x * 10 + y, exclude)
+
+    def test_json_cached_per_version(self):
+        """
+        Test that json() is reused until a probe, flag, move of the selection
+        or of mines changes the minefield.
+        """
+        for constructor in (MineField, ArrayMineField):
+            field = constructor(8, 8, 10)
+            first = field.json()
+            self.assertIs(field.json(), first)
+            changes = [
+                lambda: field.flag(1, 1),
+                lambda: field.probe(2, 2),
+                lambda: setattr(field, 'selected', [3, 3]),
+                lambda: field.move_mines([], field.empty_positions(1)),
+            ]
+            for change in changes:
+                before = field.json()
+                version = field.version
+                change()
+                self.assertGreater(field.version, version)
+                self.assertIsNot(field.json(), before)
+            self.assertEqual(field.json()['selected'], [3, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
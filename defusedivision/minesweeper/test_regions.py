@@ -0,0 +1,47 @@
+import unittest
+import random
+
+from .arrayfield import ArrayMineField
+from .regions import ZeroRegions
+
+
+def region_sets(regions):
+    return sorted(sorted(m) for m in regions.members.values())
+
+
+class TestZeroRegions(unittest.TestCase):
+    def test_opening_matches_flood(self):
+        """
+        Test that revealing an opening from the index reveals the same cells
+        as spreading out from the probed cell.
+        """
+        field = ArrayMineField(30, 20, 60)
+        flooded = ArrayMineField(30, 20, 0)
+        flooded.move_mines([], [(c.x, c.y) for row in field.board
+                                for c in row if field.mines[c.idx]])
+        for idx in range(len(field.mines)):
+            if field.regions.zero[idx] and not field.probed[idx]:
+                x, y = divmod(idx, field.height)
+                expect = sorted(c.idx for c in flooded.board[x][y].probe())
+                got = sorted(c.idx for c in field.probe(x, y))
+                self.assertEqual(got, expect)
+
+    def test_update_matches_rebuild(self):
+        """
+        Test that updating the index after moving mines gives the same
+        regions as building the index from scratch.
+        """
+        field = ArrayMineField(25, 25, 80)
+        for _ in range(20):
+            mines = [i for i in range(len(field.mines)) if field.mines[i]]
+            empty = [i for i in range(len(field.mines)) if not field.mines[i]]
+            removed = random.sample(mines, 3)
+            added = random.sample(empty, 3)
+            field.move_mines([divmod(i, field.height) for i in removed],
+                             [divmod(i, field.height) for i in added])
+            self.assertEqual(
+                region_sets(field.regions), region_sets(ZeroRegions(field)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+from .arrayfield import ArrayMineField
+from .sharedfield import MineLayout, OverlayMineField
+from .. import game
+
+
+def array_field_like(layout):
+    """
+    Returns an ArrayMineField with the same mine layout as `layout`.
+    """
+    field = ArrayMineField(layout.width, layout.height, 0)
+    field.mine_count = layout.mine_count
+    field.move_mines([], [divmod(idx, layout.height)
+                          for idx, mine in enumerate(layout.mines) if mine])
+    return field
+
+
+class TestSharedField(unittest.TestCase):
+    def test_start_is_opening(self):
+        layout = MineLayout(16, 16, 40)
+        field = OverlayMineField(layout)
+        x, y = field.selected
+        self.assertGreaterEqual(len(field.probe(x, y)), 9)
+
+    def test_matches_array_field(self):
+        layout = MineLayout(20, 15, 40)
+        overlay = OverlayMineField(layout)
+        overlay.self_check = True
+        field = array_field_like(layout)
+        for x, y in [layout.start, (0, 0), (19, 14), (7, 3)]:
+            if not field.mines[x * 15 + y]:
+                self.assertEqual(len(overlay.probe(x, y)),
+                                 len(field.probe(x, y)))
+        overlay.flag(5, 5)
+        field.flag(5, 5)
+        self.assertEqual(overlay.json()['cells'], field.json()['cells'])
+
+    def test_players_are_independent(self):
+        layout = MineLayout(10, 10, 10)
+        first, second = OverlayMineField(layout), OverlayMineField(layout)
+        first.probe(*layout.start)
+        first.flag(0, 0)
+        self.assertEqual(second.probed_count, 0)
+        self.assertEqual(second.flag_count, 0)
+        self.assertFalse(second.board[0][0].flagged)
+
+    def test_mines_cannot_move(self):
+        field = OverlayMineField(MineLayout(8, 8, 10))
+        mine = next(divmod(idx, 8) for idx, m in enumerate(field.mines) if m)
+        with self.assertRaises(ValueError):
+            field.move_mines([mine], [])
+
+    def test_bout_shares_layout(self):
+        bout = game.Bout(minefield_size=(9, 9), shared_layout=True)
+        first, second = bout.add_player(), bout.add_player()
+        self.assertIs(first.mfield.layout, second.mfield.layout)
+        self.assertTrue(game._probe_selected(first.mfield))
+        self.assertEqual(second.mfield.probed_count, 0)
+
+    def test_new_round_new_layout(self):
+        bout = game.Bout(minefield_size=(9, 9), shared_layout=True)
+        first, second = bout.add_player(), bout.add_player()
+        size = {'new-minefield': {'width': 9, 'height': 9, 'mine_count': None}}
+        # Asking again before playing keeps the layout being shared
+        second.send_input(size)
+        self.assertIs(first.mfield.layout, second.mfield.layout)
+        first.send_input('PROBE')
+        played = first.mfield.layout
+        first.send_input(size)
+        self.assertIsNot(first.mfield.layout, played)
+        # Players who haven't played yet join the new round
+        second.send_input(size)
+        self.assertIs(first.mfield.layout, second.mfield.layout)
+
+
+if __name__ == '__main__':
+    unittest.main()
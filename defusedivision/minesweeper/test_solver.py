@@ -0,0 +1,78 @@
+import itertools
+import unittest
+
+from .arrayfield import ArrayMineField
+from .solver import solve, solve_field, visible_state
+from .test_arrayfield import cell_field_like
+from .topology import board_topology
+
+
+def brute_force(width, height, revealed, mine_count):
+    """
+    Returns the chance of a mine on each unprobed cell, found by checking
+    every possible layout of the mines.
+    """
+    unknown = [idx for idx in range(width * height) if idx not in revealed]
+    topology = board_topology(width, height)
+    layouts = 0
+    hits = dict.fromkeys(unknown, 0)
+    for mines in itertools.combinations(unknown, mine_count):
+        mines = set(mines)
+        if all(sum(n in mines for n in topology.neighbors(idx)) == contacts
+               for idx, contacts in revealed.items()):
+            layouts += 1
+            for idx in mines:
+                hits[idx] += 1
+    return {divmod(idx, height): hits[idx] / layouts for idx in unknown}
+
+
+class TestSolver(unittest.TestCase):
+    def test_propagation(self):
+        # A 1 in the corner of a 3x1 strip next to a 0 leaves one choice:
+        #   [0][1][?]
+        solution = solve(3, 1, {0: 0, 1: 1})
+        self.assertEqual(solution.mines, {(2, 0)})
+        self.assertEqual(solution.safe, set())
+
+    def test_subset_rule(self):
+        #   [1][2][1]
+        #   [a][b][c]
+        # One of a, b and two of a, b, c make c a mine; then one of b, c
+        # makes b safe and a a mine.
+        solution = solve(3, 2, {0: 1, 2: 2, 4: 1})
+        self.assertEqual(solution.mines, {(0, 1), (2, 1)})
+        self.assertEqual(solution.safe, {(1, 1)})
+
+    def test_matches_brute_force(self):
+        for attempt in range(20):
+            field = ArrayMineField(5, 4, 5)
+            safe = [idx for idx in range(20) if not field.mines[idx]]
+            for idx in safe[attempt % 4::5]:
+                field.probe(*divmod(idx, 4))
+            revealed, _ = visible_state(field)
+            expected = brute_force(5, 4, revealed, 5)
+            solution = solve_field(field)
+            for (x, y), chance in expected.items():
+                self.assertAlmostEqual(solution.probability(x, y), chance)
+
+    def test_flags(self):
+        # Flags are ignored unless trusted
+        solution = solve(3, 1, {0: 0, 1: 1}, flagged={2})
+        self.assertEqual(solution.mines, {(2, 0)})
+        solution = solve(4, 1, {1: 1}, flagged={0}, trust_flags=True)
+        self.assertEqual(solution.safe, {(2, 0)})
+
+    def test_cells_and_arrays_agree(self):
+        afield = ArrayMineField(8, 8, 10)
+        field = cell_field_like(afield)
+        for x in range(8):
+            for y in range(8):
+                if not afield.mines[x * 8 + y]:
+                    afield.probe(x, y)
+                    field.probe(x, y)
+                    break
+        self.assertEqual(visible_state(afield), visible_state(field))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+
+from .topology import COMPASS, board_topology
+
+
+def brute_compass(width, height, idx):
+    x, y = divmod(idx, height)
+    rv = []
+    for dx, dy in COMPASS.values():
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < width and 0 <= ny < height:
+            rv.append(nx * height + ny)
+        else:
+            rv.append(None)
+    return tuple(rv)
+
+
+class TestTopology(unittest.TestCase):
+    def test_matches_coordinates(self):
+        for width, height in [(1, 1), (1, 6), (5, 1), (2, 2), (7, 4)]:
+            topo = board_topology(width, height)
+            for idx in range(width * height):
+                expect = brute_compass(width, height, idx)
+                self.assertEqual(topo.compass_neighbors(idx), expect)
+                self.assertEqual(
+                    topo.neighbors(idx),
+                    tuple(n for n in expect if n is not None))
+
+    def test_shared(self):
+        self.assertIs(board_topology(9, 9), board_topology(9, 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
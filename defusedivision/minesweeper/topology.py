@@ -0,0 +1,99 @@
+'''
+Module topology describes which cells of a minefield are adjacent to which.
+Cells are referred to by their flat index, `x*height + y`, so the neighbor in
+a given direction is always a fixed offset away. Only whether a cell sits on
+an edge (and which) changes which of those offsets apply, which lets a whole
+board be described by one byte per cell naming its "shape", plus a handful of
+offset tuples shared by every cell of that shape.
+
+Adjacency only depends on the size of a board, so a Topology is cached and
+shared by every minefield of the same width and height.
+'''
+
+import functools
+
+# Offsets of each compass direction from a cell
+COMPASS = {
+    "N": (0, -1),
+    "NE": (1, -1),
+    "E": (1, 0),
+    "SE": (1, 1),
+    "S": (0, 1),
+    "SW": (-1, 1),
+    "W": (-1, 0),
+    "NW": (-1, -1),
+}
+
+# Bits describing which edges of the board a coordinate lies on
+_LOW, _HIGH = 1, 2
+
+
+def _edges(pos, length):
+    return (_LOW if pos == 0 else 0) | (_HIGH if pos == length - 1 else 0)
+
+
+def _allowed(delta, edges):
+    return not ((delta < 0 and edges & _LOW) or (delta > 0 and edges & _HIGH))
+
+
+class Topology(object):
+    """
+    Class Topology holds the adjacency of every cell on a board of a given
+    size.
+
+    `shapes` holds one byte per cell. `offsets[shape]` is a tuple of the
+    offsets from a cell of that shape to each of its neighbors, and
+    `compass[shape]` is a tuple of the offset in each direction of COMPASS
+    (in that order), or None where the neighbor would be off the board.
+    """
+
+    __slots__ = ('width', 'height', 'shapes', 'offsets', 'compass')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # A shape packs the edges of the x coordinate into the upper two bits
+        # and the edges of the y coordinate into the lower two.
+        self.offsets = []
+        self.compass = []
+        for shape in range(16):
+            xedges, yedges = shape >> 2, shape & 3
+            directions = []
+            for dx, dy in COMPASS.values():
+                if _allowed(dx, xedges) and _allowed(dy, yedges):
+                    directions.append(dx * height + dy)
+                else:
+                    directions.append(None)
+            self.compass.append(tuple(directions))
+            self.offsets.append(
+                tuple(off for off in directions if off is not None))
+        column = bytes(_edges(y, height) for y in range(height))
+        self.shapes = bytearray()
+        for x in range(width):
+            xbits = _edges(x, width) << 2
+            self.shapes += bytes(xbits | b for b in column)
+
+    def neighbors(self, idx):
+        """
+        Method neighbors returns a tuple of the flat indices of all cells
+        adjacent to the cell at `idx`.
+        """
+        return tuple(idx + off for off in self.offsets[self.shapes[idx]])
+
+    def compass_neighbors(self, idx):
+        """
+        Method compass_neighbors returns a tuple of the flat index of the
+        neighbor of `idx` in each direction of COMPASS, or None where that
+        neighbor would be off the board.
+        """
+        return tuple(None if off is None else idx + off
+                     for off in self.compass[self.shapes[idx]])
+
+
+@functools.lru_cache(maxsize=64)
+def board_topology(width, height):
+    """
+    Function board_topology returns the shared Topology of a board of the
+    given size.
+    """
+    return Topology(width, height)
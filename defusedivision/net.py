@@ -1,10 +1,17 @@
 
+import collections
+import threading
 import logging
 import socket
+import struct
+import base64
 import gzip
 import json
+import zlib
+import time
 
 from .concurrency import concurrent
+from .minesweeper.contents import Contents
 
 def json_dump(indata):
     """Creates prettified json representation of passed in object."""
@@ -14,62 +21,749 @@ def json_dump(indata):
 
 SEP = b'\x00\x01\x00'
 
-@concurrent
-def msg_recv(conn, sendfunc, closefunc):
+# Frames of a zlib stream start with ZLIB, and length-prefixed gzip frames
+# start with LENGTH, followed in both cases by their length as _LENGTH
+ZLIB = b'Z'
+LENGTH = b'L'
+_LENGTH = struct.Struct('>I')
+
+# The latest version of the protocol. Version 1 frames gzip messages with
+# SEP, version 2 with their length (see class Codec)
+VERSION = 2
+
+# Each cell packed by pack_cells is one byte: its mine contacts in the low
+# bits, or CELL_CONTACTS if they're unknown, and these bits of its state.
+# Cells whose contents are unknown are CELL_HIDDEN.
+CELL_CONTACTS = 0x0f
+CELL_PROBED = 0x10
+CELL_FLAGGED = 0x20
+CELL_MINE = 0x40
+CELL_HIDDEN = 0x80
+
+# Packed cells start with GRID, then the width and height of the minefield,
+# or with LIST, then how many cells are listed, each headed by its x and y
+GRID = b'G'
+_GRID = struct.Struct('>HH')
+LIST = b'C'
+_LIST = struct.Struct('>I')
+_LISTED = struct.Struct('>HHB')
+
+# The largest width, height and coordinate of packed cells. The cells of
+# larger minefields are left as json.
+MAX_PACKED = 0xffff
+
+# What this side of a connection supports, offered to the other side in the
+# first message sent (see class Codec)
+PROTOCOL = {
+    'version': VERSION,
+    'compression': ['zlib'],
+    'cells': ['binary', 'json'],
+}
+
+# How many bytes are read from a socket at once, the largest frame which
+# may be received, and the most a received message may decompress to
+RECV_SIZE = 65536
+MAX_FRAME = 64 << 20
+MAX_MESSAGE = 64 << 20
+
+# The largest frame, and the most it may decompress to, which a player may
+# send to a server; players only send inputs and names
+MAX_PLAYER_MESSAGE = 1 << 20
+
+# How many messages may wait to be sent to a player before the player is
+# considered too far behind to catch up
+MAX_QUEUED = 256
+
+# Counts of the work done by this module, such as how many messages have been
+# encoded, for checking that broadcasts are only encoded once.
+COUNTERS = {
+    'encodes': 0,
+    'compressions': 0,
+    'sends': 0,
+}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        COUNTERS[name] += 1
+
+
+def serialize(obj):
     '''
-    Function msg_recv reads null-delimited series of bytes from `conn`, which
-    is a socket. Each series of bytes is then de-serialized into a json object,
-    and `sendfunc` is called with that json object.
-    `closefunc` is called if/when the socket `conn` is closed.
+    Function serialize returns the json of `obj`, encoded as utf-8.
+    '''
+    _count('encodes')
+    return json_dump(obj).encode('utf-8')
+
+
+def encode(obj):
+    '''
+    Function encode returns the bytes sent over a socket for `obj`: its json,
+    gzip compressed, followed by SEP.
+    '''
+    return _gzip(serialize(obj)) + SEP
+
+
+def _gzip(payload):
+    _count('compressions')
+    return gzip.compress(payload)
+
+
+def decode(data):
+    '''
+    Function decode returns the object sent as the bytes `data`, the bytes of
+    a single message without its SEP.
+    '''
+    return json.loads(_gunzip(data).decode('utf-8'))
+
+
+def _gunzip(data, limit=MAX_MESSAGE):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    rv = _decompress(decompressor, data, limit)
+    if not decompressor.eof:
+        raise ValueError('Truncated gzip message')
+    return rv
+
+
+def _decompress(decompressor, data, limit):
+    '''
+    Function _decompress returns `data` decompressed by `decompressor`.
+    Raises a ConnectionError if that's more than `limit` bytes, as a message
+    that large can only have been sent to exhaust our memory.
+    '''
+    rv = decompressor.decompress(data, limit + 1)
+    if len(rv) > limit:
+        raise ConnectionError(
+            'Message decompresses to more than {} bytes'.format(limit))
+    return rv
+
+
+def pack_cells(cells, width=None, height=None):
+    '''
+    Function pack_cells returns the cells in the list `cells`, each a
+    dictionary as built by Cell.json, packed into bytes and base64 encoded.
+    Each cell is one byte of CELL_* bits. If `cells` lists every cell of a
+    `width` by `height` minefield in order, the bytes are headed by GRID
+    and the cells' coordinates are implied by their position. Otherwise
+    they're headed by LIST and each cell is preceded by its x and y.
+    '''
+    states = [_cell_state(cell) for cell in cells]
+    count = len(cells)
+    if (width is not None and height is not None and count == width * height
+            and max(width, height) <= MAX_PACKED):
+        if all(cell['x'] * height + cell['y'] == pos
+               for pos, cell in enumerate(cells)):
+            data = GRID + _GRID.pack(width, height) + bytes(states)
+            return base64.b64encode(data).decode('ascii')
+    data = bytearray(LIST + _LIST.pack(count))
+    for cell, state in zip(cells, states):
+        data += _LISTED.pack(cell['x'], cell['y'], state)
+    return base64.b64encode(data).decode('ascii')
+
+
+def _cell_state(cell):
+    state = cell.get('contacts')
+    if state is None or not 0 <= state < CELL_CONTACTS:
+        state = CELL_CONTACTS
+    if cell['probed']:
+        state |= CELL_PROBED
+    if cell['flagged']:
+        state |= CELL_FLAGGED
+    contents = cell.get('contents')
+    if contents is None:
+        state |= CELL_HIDDEN
+    elif contents == Contents.mine:
+        state |= CELL_MINE
+    return state
+
+
+def unpack_cells(packed):
+    '''
+    Function unpack_cells returns the list of cells packed by pack_cells,
+    each a dictionary like those built by Cell.json.
+    '''
+    data = base64.b64decode(packed)
+    if data[:1] == GRID:
+        width, height = _GRID.unpack_from(data, 1)
+        states = data[1 + _GRID.size:]
+        return [
+            _unpacked(pos // height, pos % height, state)
+            for pos, state in enumerate(states)
+        ]
+    if data[:1] == LIST:
+        count, = _LIST.unpack_from(data, 1)
+        return [
+            _unpacked(x, y, state)
+            for x, y, state in _LISTED.iter_unpack(data[1 + _LIST.size:])
+        ][:count]
+    raise ValueError('Unknown packing of cells: {}'.format(data[:1]))
+
+
+def _unpacked(x, y, state):
+    rv = {
+        'x': x,
+        'y': y,
+        'probed': bool(state & CELL_PROBED),
+        'flagged': bool(state & CELL_FLAGGED),
+    }
+    if not state & CELL_HIDDEN:
+        rv['contents'] = Contents.mine if state & CELL_MINE else Contents.empty
+    contacts = state & CELL_CONTACTS
+    if contacts != CELL_CONTACTS:
+        rv['contacts'] = contacts
+    return rv
+
+
+def pack_message(msg):
+    '''
+    Function pack_message returns the message `msg` with the cells of every
+    minefield in it packed by pack_cells, as 'packed' in place of 'cells'.
+    Messages which hold no cells, and `msg` itself, are left untouched, as
+    are cells beyond MAX_PACKED.
+    '''
+    if not isinstance(msg, (tuple, list)) or len(msg) != 2:
+        return msg
+    kind, body = msg
+    if kind == 'new-state':
+        players = dict()
+        for name, player in body['players'].items():
+            field = dict(player['minefield'])
+            # Its largest coordinates are one less than its width and height
+            if max(field['width'], field['height']) - 1 > MAX_PACKED:
+                players[name] = player
+                continue
+            field['packed'] = pack_cells(
+                field.pop('cells'), field['width'], field['height'])
+            players[name] = dict(player, minefield=field)
+        return [kind, dict(body, players=players)]
+    if kind == 'state-delta' and 'players' in body:
+        players = dict()
+        for name, changes in body['players'].items():
+            if 'cells' in changes and all(
+                    cell['x'] <= MAX_PACKED and cell['y'] <= MAX_PACKED
+                    for cell in changes['cells']):
+                changes = dict(changes)
+                changes['packed'] = pack_cells(changes.pop('cells'))
+            players[name] = changes
+        return [kind, dict(body, players=players)]
+    return msg
+
+
+def unpack_message(msg):
+    '''
+    Function unpack_message undoes pack_message, changing the received
+    message `msg` in place and returning it.
+    '''
+    if not isinstance(msg, list) or len(msg) != 2:
+        return msg
+    kind, body = msg
+    if kind not in ('new-state', 'state-delta'):
+        return msg
+    for player in body.get('players', {}).values():
+        if kind == 'new-state':
+            player = player['minefield']
+        if 'packed' in player:
+            player['cells'] = unpack_cells(player.pop('packed'))
+    return msg
+
+
+# The ways cells may be sent, each the function which changes a message into
+# that form before it's serialized (see class Codec). Cells sent as json are
+# easier to debug.
+CELL_FORMATS = {
+    'json': None,
+    'binary': pack_message,
+}
+
+
+def recv_msg(conn, timeout=None, limit=None):
+    '''
+    Function recv_msg reads a single message from the socket `conn`, waiting
+    at most `timeout` seconds for all of it. Returns the message and any
+    bytes read past its end, or None and every byte read if no message
+    arrived in time. Raises a ConnectionError if `conn` is closed first, and
+    a ValueError if more than `limit` bytes arrive without a whole message.
     '''
     buf = bytes()
-    while True:
-        try:
+    deadline = None if timeout is None else time.monotonic() + timeout
+    try:
+        while SEP not in buf:
+            if limit is not None and len(buf) > limit:
+                raise ValueError('No message in {} bytes'.format(len(buf)))
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout()
+                conn.settimeout(remaining)
             data = conn.recv(8192)
-
-            # No data means the connection is closed
             if not data:
-                closefunc()
+                raise ConnectionError('Connection closed')
+            buf += data
+    except socket.timeout:
+        return None, buf
+    finally:
+        conn.settimeout(None)
+    msg, _, rest = buf.partition(SEP)
+    return decode(msg), rest
+
+
+class Frame(tuple):
+    '''
+    Class Frame is a message broadcast to many players, such as
+    `Frame(('new-state', state))`. It behaves exactly like the tuple it
+    holds, but is only encoded once however many sockets it's sent on, so
+    the same Frame should be put in the queue of every player it's for. The
+    message must not be changed once it's in a Frame.
+
+    Connections which compress with a zlib stream of their own (see class
+    Codec) share the frame's json, but compress it themselves.
+    '''
+
+    _lock = threading.Lock()
+
+    def _cached(self, name, make):
+        with self._lock:
+            data = self.__dict__.get(name)
+        if data is None:
+            data = make()
+            with self._lock:
+                data = self.__dict__.setdefault(name, data)
+        return data
+
+    def payload(self, cells='json'):
+        """
+        Method payload returns the json of this frame as utf-8, with its
+        cells in the format `cells` of CELL_FORMATS, serializing it the first
+        time it's needed.
+        """
+        return self._cached('_payload_' + cells,
+                            lambda: serialize(_formatted(self, cells)))
+
+    def compressed(self, cells='json'):
+        """
+        Method compressed returns the payload of this frame, gzip
+        compressed, compressing it the first time it's needed.
+        """
+        return self._cached('_compressed_' + cells,
+                            lambda: _gzip(self.payload(cells)))
+
+    def encoded(self):
+        """
+        Method encoded returns the bytes sent over a socket for this frame
+        when framed with SEP, encoding it the first time it's needed.
+        """
+        return self._cached('_data', lambda: self.compressed() + SEP)
+
+
+def _formatted(msg, cells):
+    convert = CELL_FORMATS[cells]
+    return msg if convert is None else convert(msg)
+
+
+class Codec(object):
+    '''
+    Class Codec holds the state of one connection's framing and compression,
+    in both directions.
+
+    Until the other side agrees to something better (see method agree),
+    messages are sent as in version 1 of the protocol: gzip compressed one
+    by one and followed by SEP. Since version 2, they're sent as LENGTH, the
+    message's length as _LENGTH, and the gzip compressed message, so that
+    nothing needs to be searched for SEP, which compressed bytes could
+    contain. Once method start_stream is called, messages are sent as a
+    single zlib stream shared by every message, so each message is
+    compressed with the help of all those before it: each frame is ZLIB,
+    the frame's length, and the message compressed and flushed with
+    Z_SYNC_FLUSH. Frames of every kind are understood when received.
+
+    Cells are sent as json until the other side agrees to another of
+    CELL_FORMATS. Packed cells are unpacked as they're received, so they
+    always arrive as json would.
+
+    A peer says what it can read by including PROTOCOL in the first message
+    it sends; the other side answers with what it accepts of that (see
+    function answer). Each side only changes what it sends once it knows the
+    other can read it.
+
+    Received bytes are kept in a single buffer which is reused for every
+    message, and which socket reads go straight into (see method receive).
+    Messages are decoded from where they lie in the buffer, so a large
+    message is never put back together from the pieces it arrived in. The
+    buffer only grows as bytes arrive, and shrinks again once a large
+    message has been read. A frame of more than `max_frame` bytes, or a
+    message which decompresses to more than `max_message` bytes, closes the
+    connection.
+    '''
+
+    max_frame = MAX_FRAME
+    max_message = MAX_MESSAGE
+
+    def __init__(self):
+        self.version = 1
+        self.stream = False
+        self.cells = 'json'
+        self._compressor = None
+        self._decompressor = None
+        self._send_lock = threading.Lock()
+        self._inbuf = bytearray(RECV_SIZE)
+        # The first unread byte of _inbuf, the end of the bytes read into
+        # it, and where to resume looking for a SEP
+        self._start = 0
+        self._end = 0
+        self._scanned = 0
+
+    def start_stream(self):
+        """
+        Method start_stream makes every later message sent with this Codec
+        part of a zlib stream.
+        """
+        with self._send_lock:
+            if not self.stream:
+                self._compressor = zlib.compressobj()
+                self.stream = True
+
+    def agree(self, protocol):
+        """
+        Method agree changes how messages are sent to what the other side
+        accepted, given as the dictionary `protocol` they answered with.
+        """
+        if not isinstance(protocol, dict):
+            return
+        version = protocol.get('version', 1)
+        cells = protocol.get('cells', 'json')
+        with self._send_lock:
+            if isinstance(version, int):
+                self.version = max(1, min(version, VERSION))
+            if cells in CELL_FORMATS:
+                self.cells = cells
+        if protocol.get('compression') == 'zlib':
+            self.start_stream()
+
+    def encode(self, obj):
+        """
+        Method encode returns the bytes to send for `obj`. When sending a
+        stream, the bytes must be sent before those of any later message, so
+        use method send unless only one thread sends.
+        """
+        cells = self.cells
+        if not self.stream:
+            if isinstance(obj, Frame):
+                if self.version < 2 and cells == 'json':
+                    return obj.encoded()
+                data = obj.compressed(cells)
+            else:
+                data = _gzip(serialize(_formatted(obj, cells)))
+            if self.version < 2:
+                return data + SEP
+            return LENGTH + _LENGTH.pack(len(data)) + data
+        if isinstance(obj, Frame):
+            payload = obj.payload(cells)
+        else:
+            payload = serialize(_formatted(obj, cells))
+        _count('compressions')
+        compressor = self._compressor
+        data = compressor.compress(payload)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        return ZLIB + _LENGTH.pack(len(data)) + data
+
+    def send(self, conn, obj):
+        """
+        Method send sends `obj` on the socket `conn`.
+        """
+        with self._send_lock:
+            data = self.encode(obj)
+            _count('sends')
+            conn.sendall(data)
+
+    def receive(self, conn):
+        """
+        Method receive reads from the socket `conn` once, returning a list of
+        every message completed by what was read. Raises a ConnectionError
+        if `conn` is closed.
+        """
+        self._make_room(1)
+        with memoryview(self._inbuf) as view:
+            count = conn.recv_into(view[self._end:])
+        if not count:
+            raise ConnectionError('Connection closed')
+        self._end += count
+        return self._decode_buffered()
+
+    def feed(self, data):
+        """
+        Method feed takes bytes received on the connection some other way,
+        returning a list of every message they complete.
+        """
+        self._make_room(len(data))
+        self._inbuf[self._end:self._end + len(data)] = data
+        self._end += len(data)
+        return self._decode_buffered()
+
+    def _make_room(self, count):
+        '''
+        Makes room for at least `count` more bytes at the end of _inbuf,
+        first by moving what's unread to its start, and only then by growing
+        it.
+        '''
+        free = len(self._inbuf) - self._end
+        if free >= count:
+            return
+        unread = self._end - self._start
+        if self._start:
+            buf = self._inbuf
+            buf[:unread] = buf[self._start:self._end]
+            self._scanned -= self._start
+            self._start, self._end = 0, unread
+            if len(buf) - unread >= count:
+                return
+        size = len(self._inbuf)
+        while size - unread < count:
+            size *= 2
+        self._inbuf.extend(bytes(size - len(self._inbuf)))
+
+    def _decode_buffered(self):
+        '''
+        Decodes every complete message in _inbuf, returning them.
+        '''
+        rv = []
+        buf = self._inbuf
+        header = 1 + _LENGTH.size
+        with memoryview(buf) as view:
+            while self._start < self._end:
+                start, end = self._start, self._end
+                kind = buf[start]
+                if kind == ZLIB[0] or kind == LENGTH[0]:
+                    if end - start < header:
+                        break
+                    size = _LENGTH.unpack_from(buf, start + 1)[0]
+                    if size > self.max_frame:
+                        raise ConnectionError(
+                            'Frame of {} bytes is too large'.format(size))
+                    if end - start - header < size:
+                        break
+                    body = view[start + header:start + header + size]
+                    self._start = self._scanned = start + header + size
+                else:
+                    found = buf.find(SEP, max(self._scanned, start), end)
+                    if found < 0:
+                        if end - start > self.max_frame:
+                            raise ConnectionError(
+                                'No message in {} bytes'.format(end - start))
+                        # A SEP may begin in the last bytes of the buffer
+                        self._scanned = max(start, end - len(SEP) + 1)
+                        break
+                    body = view[start:found]
+                    self._start = self._scanned = found + len(SEP)
+                try:
+                    rv.append(self._decode_frame(kind, body))
+                except ConnectionError:
+                    raise
+                except Exception as e:
+                    logging.exception(e)
+                finally:
+                    body.release()
+        if self._start == self._end:
+            self._start = self._end = self._scanned = 0
+        unread = self._end - self._start
+        if len(buf) > RECV_SIZE and unread <= RECV_SIZE // 2:
+            # Let go of the room a large message needed, once it's been read
+            self._inbuf = bytearray(RECV_SIZE)
+            self._inbuf[:unread] = buf[self._start:self._end]
+            self._scanned -= self._start
+            self._start, self._end = 0, unread
+        return rv
+
+    def _decode_frame(self, kind, body):
+        if kind == ZLIB[0]:
+            if self._decompressor is None:
+                self._decompressor = zlib.decompressobj()
+            data = _decompress(self._decompressor, body, self.max_message)
+        else:
+            data = _gunzip(body, self.max_message)
+        return unpack_message(json.loads(data.decode('utf-8')))
+
+
+def answer(offered, version=VERSION, compress=True, cells='binary'):
+    '''
+    Function answer returns the protocol to answer with when the other side
+    of a connection offers the protocol `offered` (their PROTOCOL), using at
+    most version `version` of the framing, a zlib stream only if `compress`,
+    and cells in the format `cells` if it's offered. Returns None if there's
+    nothing better to agree on.
+    '''
+    if not isinstance(offered, dict):
+        return None
+    protocol = dict()
+    theirs = offered.get('version', 1)
+    if isinstance(theirs, int) and min(theirs, version) > 1:
+        protocol['version'] = min(theirs, version, VERSION)
+    if compress and 'zlib' in offered.get('compression', []):
+        protocol['compression'] = 'zlib'
+    if cells != 'json' and cells in offered.get('cells', []):
+        protocol['cells'] = cells
+    return protocol or None
+
+
+class StateQueue(object):
+    '''
+    Class StateQueue holds the messages waiting to be sent to one player,
+    dropping those made stale by newer ones:
+
+        - a 'new-state' keyframe replaces every earlier keyframe,
+          'state-delta' and 'update-selected', as it holds all they did
+        - an 'update-selected' replaces the earlier 'update-selected' of the
+          same player
+
+    Other messages are kept, in order. If more than `maxsize` messages are
+    waiting (None for no limit), the player is too far behind: every later
+    message is dropped, and `on_overflow` is called once so the player can
+    be disconnected. Anything which isn't a message (a 2-tuple), such as the
+    "die" used to stop a sender, is always queued.
+    '''
+
+    def __init__(self, maxsize=MAX_QUEUED, on_overflow=None):
+        self.maxsize = maxsize
+        self.on_overflow = on_overflow
+        self.overflowed = False
+        self.superseded = 0
+        self.dropped = 0
+        self.max_depth = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        overflowed = False
+        with self._cond:
+            kind = _kind(item)
+            if kind is None:
+                self._items.append(item)
+            elif self.overflowed:
+                self.dropped += 1
                 return
+            else:
+                if kind == 'new-state':
+                    self._remove(lambda k, _: k in _SUPERSEDED)
+                elif kind == 'update-selected':
+                    name = item[1][0]
+                    self._remove(lambda k, i: k == kind and i[1][0] == name)
+                full = self.maxsize is not None and (
+                    len(self._items) >= self.maxsize)
+                if full:
+                    self.overflowed = overflowed = True
+                    self.dropped += 1
+                else:
+                    self._items.append(item)
+            self.max_depth = max(self.max_depth, len(self._items))
+            self._cond.notify()
+        if overflowed:
+            logging.warning('State queue overflowed: {}'.format(self.stats()))
+            if self.on_overflow is not None:
+                self.on_overflow()
 
-            inbuf = buf + data
-            if SEP in inbuf:
-                parts = inbuf.split(SEP)
-                # logging.debug("Length of parts: {}".format(len(parts)))
-                tosend = [parts[0]]
-                for p in parts[1:-1]:
-                    tosend.append(p)
-                buf = parts[-1]
-                for msg in tosend:
-                    m = gzip.decompress(msg)
-                    m = m.decode('utf-8')
-                    logging.debug("Msg: {}".format(m[:150]+'...' if len(m) > 150 else m))
-                    obj = json.loads(m)
-                    sendfunc(obj)
+    def _remove(self, stale):
+        kept = collections.deque()
+        for queued in self._items:
+            if stale(_kind(queued), queued):
+                self.superseded += 1
             else:
-                buf += data
-        except Exception as e:
-            logging.exception(e)
+                kept.append(queued)
+        self._items = kept
+
+    def get(self):
+        with self._cond:
+            while not self._items:
+                self._cond.wait()
+            return self._items.popleft()
+
+    def empty(self):
+        with self._cond:
+            return not self._items
+
+    def qsize(self):
+        with self._cond:
+            return len(self._items)
+
+    def stats(self):
+        """
+        Method stats returns how many messages are waiting, the most that
+        have waited at once, and how many were superseded or dropped.
+        """
+        with self._cond:
+            return {
+                'depth': len(self._items),
+                'max_depth': self.max_depth,
+                'superseded': self.superseded,
+                'dropped': self.dropped,
+                'overflowed': self.overflowed,
+            }
+
+
+# The kinds of message a 'new-state' keyframe makes stale
+_SUPERSEDED = ('new-state', 'state-delta', 'update-selected')
+
+
+def _kind(item):
+    if isinstance(item, tuple) and len(item) == 2:
+        return item[0]
+    return None
+
+
+@concurrent
+def msg_recv(conn, sendfunc, closefunc, buf=bytes(), codec=None):
+    '''
+    Function msg_recv reads messages from `conn`, which is a socket, and
+    calls `sendfunc` with each of them, de-serialized from json.
+    `closefunc` is called if/when the socket `conn` is closed.
+    `buf` holds any bytes already read from `conn`, and `codec` is the Codec
+    of `conn`, if it has one.
+    '''
+    if codec is None:
+        codec = Codec()
+    data = buf
+    while True:
+        try:
+            msgs = codec.feed(data) if data else codec.receive(conn)
+        except OSError as e:
+            # The socket's broken or closed, so it's as good as closed
+            logging.debug('Connection lost: {}'.format(e))
+            closefunc()
+            return
+        data = bytes()
+        for obj in msgs:
+            logging.debug("Msg: {}".format(str(obj)[:150]))
+            try:
+                sendfunc(obj)
+            except Exception as e:
+                logging.exception(e)
+
+
 @concurrent
-def msg_send(conn, sourcefunc):
+def msg_send(conn, sourcefunc, codec=None):
     '''
     Function msg_send continuously sends the result of `sourcefunc` on the
-    socket `conn`. This is done by calling `sourcefunc`, serializing what's
-    returned by sourcefunc into json, then calling `conn.sendall()` with the
-    json-serialized string encoded via utf-8 into bytes.
+    socket `conn`, using the Codec `codec` if it's given.
     '''
     while True:
         msg = sourcefunc()
         try:
-            send(conn, msg)
+            if codec is None:
+                send(conn, msg)
+            else:
+                codec.send(conn, msg)
         except OSError:
             # The socket's closed, return from this function
             return
 
+
 def send(conn, obj):
-    msg = json_dump(obj)
-    msg = msg.encode('utf-8')
-    msg = gzip.compress(msg)
-    msg += SEP
+    '''
+    Function send sends `obj` on the socket `conn`. Frames are sent as they
+    were already encoded.
+    '''
+    if isinstance(obj, Frame):
+        msg = obj.encoded()
+    else:
+        msg = encode(obj)
+    _count('sends')
     conn.sendall(msg)
-
@@ -0,0 +1,193 @@
+'''
+Module noguess generates "no-guess" minefields: layouts of mines where every
+safe cell can be found by reasoning alone, starting from the opening made by
+the first probe. Few random layouts qualify and checking one means playing it
+through with the solver, so candidates are generated and checked on a pool
+of worker processes.
+
+The opening only exists once a player makes their first probe, so a layout is
+generated for the cell being probed at that moment, in the background (see
+game.Bout). If no layout is found in time, the minefield keeps its plain
+random layout.
+'''
+
+import concurrent.futures
+import multiprocessing
+import threading
+import logging
+import time
+import os
+
+from .concurrency import START_METHOD
+from .minesweeper.arrayfield import ArrayMineField
+from .minesweeper.contents import Contents
+from .minesweeper.minefield import mine_positions
+from .minesweeper.solver import solve_field
+from .minesweeper.topology import board_topology
+
+# How long, in seconds, a worker searches before reporting back
+SLICE = 0.05
+
+
+def foothold(width, height, x, y):
+    '''
+    Function foothold returns the set of (x, y) positions kept free of mines
+    when the cell at (x, y) is probed first: that cell and its neighbors.
+    '''
+    idx = x * height + y
+    cells = (idx, ) + board_topology(width, height).neighbors(idx)
+    return set(divmod(i, height) for i in cells)
+
+
+def solvable(width, height, layout, start):
+    '''
+    Function solvable returns True if every safe cell of a minefield with
+    mines at the (x, y) positions of `layout` can be probed without guessing,
+    starting by probing the cell at `start`.
+    '''
+    field = ArrayMineField(width, height, 0)
+    field.mine_count = len(layout)
+    field.move_mines([], layout)
+    if field.probe(*start)[0].contents == Contents.mine:
+        return False
+    while field.safe_remaining:
+        safe = [(x, y) for x, y in solve_field(field).safe
+                if not field.probed[x * height + y]]
+        if not safe:
+            return False
+        for x, y in safe:
+            field.probe(x, y)
+    return True
+
+
+def _search(width, height, mine_count, start, duration):
+    '''
+    Function _search runs in a worker process, trying random layouts for
+    `duration` seconds or until one is solvable from `start`. Returns the
+    solvable layout (or None), how many layouts were tried, and the CPU time
+    spent.
+    '''
+    began = time.process_time()
+    exclude = [x * height + y for x, y in foothold(width, height, *start)]
+    tried = 0
+    while True:
+        tried += 1
+        layout = mine_positions(width, height, mine_count, exclude=exclude)
+        if solvable(width, height, layout, start):
+            return layout, tried, time.process_time() - began
+        if time.process_time() - began > duration:
+            return None, tried, time.process_time() - began
+
+
+class NoGuessGenerator(object):
+    """
+    Class NoGuessGenerator searches for no-guess layouts on a pool of
+    `workers` processes (one per core by default), giving up after `budget`
+    seconds. Boards of more than `max_cells` cells are never searched, as
+    almost none of them are solvable without guessing.
+    """
+
+    def __init__(self, workers=None, budget=1.0, max_cells=30 * 30):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.budget = budget
+        self.max_cells = max_cells
+        self.requests = 0
+        self.solved = 0
+        self.fallbacks = 0
+        self.candidates = 0
+        self.cpu_seconds = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(START_METHOD))
+            return self._executor
+
+    def _record(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, tried, spent = future.result()
+        with self._lock:
+            self.candidates += tried
+            self.cpu_seconds += spent
+
+    def layout(self, width, height, mine_count, start):
+        '''
+        Method layout returns a list of the (x, y) positions of `mine_count`
+        mines, solvable without guessing by first probing the cell at
+        `start`. Returns None if no such layout was found within the budget.
+        '''
+        with self._lock:
+            self.requests += 1
+        found = None
+        if width * height <= self.max_cells and self.budget > 0:
+            found = self._find(width, height, mine_count, tuple(start))
+        with self._lock:
+            if found is None:
+                self.fallbacks += 1
+            else:
+                self.solved += 1
+        logging.debug('No-guess generator stats: {}'.format(self.stats()))
+        return found
+
+    def _find(self, width, height, mine_count, start):
+        pool = self._pool()
+        deadline = time.time() + self.budget
+        args = (width, height, mine_count, start, min(SLICE, self.budget))
+        pending = set()
+        try:
+            while True:
+                # Keep every worker busy until a layout is found
+                while len(pending) < self.workers and time.time() < deadline:
+                    future = pool.submit(_search, *args)
+                    future.add_done_callback(self._record)
+                    pending.add(future)
+                if not pending:
+                    return None
+                done, pending = concurrent.futures.wait(
+                    pending,
+                    timeout=max(0, deadline - time.time()),
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    layout = future.result()[0]
+                    if layout is not None:
+                        return layout
+                if not done:
+                    return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def stats(self):
+        '''
+        Method stats returns how many layouts were asked for, how many were
+        found or fell back to random placement, and how many candidate boards
+        each core checks per second.
+        '''
+        with self._lock:
+            rate = 0.0
+            if self.cpu_seconds:
+                rate = self.candidates / self.cpu_seconds
+            return {
+                'requests': self.requests,
+                'solved': self.solved,
+                'fallbacks': self.fallbacks,
+                'candidates': self.candidates,
+                'workers': self.workers,
+                'boards_per_core_sec': rate,
+            }
+
+    def close(self):
+        '''
+        Method close shuts down the worker processes.
+        '''
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,335 @@
+'''
+Module lobby lets one server host many bouts at once. The Lobby accepts
+connections for as long as it runs, and places each player into a bout of
+the kind they ask for, by sending `{"join": {...}}` as their very first
+message:
+
+    {
+        "join": {
+            "width": 16,
+            "height": 16,
+            "mine_count": null, # Or any number of mines
+            "players": 2 # How many players the bout is for
+        }
+    }
+
+Players joining the same kind of bout are put together until it's full,
+after which a new bout of that kind is opened for the next player. Clients
+which don't ask for anything are placed in a bout of the lobby's default
+kind once JOIN_TIMEOUT has passed.
+
+Bouts which are empty, either because their players left or because they
+finished, are torn down.
+'''
+
+import threading
+import logging
+import socket
+import time
+
+from .. import game, net
+from ..concurrency import concurrent
+from .server import PlayerServer
+
+# How long, in seconds, the lobby waits for a client to say what bout it
+# wants to join before placing it in a default bout
+JOIN_TIMEOUT = 0.5
+
+# How often, in seconds, the lobby looks for bouts to tear down
+REAP_INTERVAL = 1.0
+
+# The largest board, and most mines, a player may ask for by default
+MAX_SIZE = (100, 100)
+MAX_MINE_COUNT = 2000
+
+# The most bytes a client may send before asking to join a bout
+MAX_JOIN = 16384
+
+
+def read_join(conn):
+    '''
+    Function read_join waits up to JOIN_TIMEOUT in all for the player
+    connected on `conn` to ask to join a bout. Returns the dictionary they sent (empty if
+    they didn't ask), and the bytes read from `conn` which are yet to be
+    handled. Raises a ValueError if they send more than MAX_JOIN bytes
+    without finishing a message.
+    '''
+    request, buffered = net.recv_msg(conn, JOIN_TIMEOUT, MAX_JOIN)
+    if isinstance(request, dict) and isinstance(request.get('join'), dict):
+        return request['join'], buffered
+    if request is not None:
+        # Not a request to join, so it's handled as any other input
+        buffered = net.encode(request) + buffered
+    return dict(), buffered
+
+
+def bout_kind(join,
+              default_size=(16, 16),
+              default_players=3,
+              max_players=8,
+              max_size=MAX_SIZE,
+              max_mine_count=MAX_MINE_COUNT):
+    '''
+    Function bout_kind returns the (width, height, mine_count, players) of
+    the bout asked for by the dictionary `join`, filling in what isn't asked
+    for from the defaults. Raises a ValueError if that's outside the limits
+    given (see class Lobby).
+    '''
+    width = join.get('width') or default_size[0]
+    height = join.get('height') or default_size[1]
+    mine_count = join.get('mine_count')
+    players = join.get('players') or default_players
+    for value in (width, height, players):
+        if not isinstance(value, int) or value < 1:
+            raise ValueError('Invalid bout requested: {}'.format(join))
+    if players > max_players:
+        raise ValueError('Bouts are for at most {} players'.format(
+            max_players))
+    if width > max_size[0] or height > max_size[1]:
+        raise ValueError('Boards are at most {}x{}'.format(*max_size))
+    if mine_count is not None:
+        if not isinstance(mine_count, int) or mine_count < 0:
+            raise ValueError('Invalid bout requested: {}'.format(join))
+        if mine_count > max_mine_count:
+            raise ValueError('Boards have at most {} mines'.format(
+                max_mine_count))
+    return (width, height, mine_count, players)
+
+
+class Lobby(object):
+    """
+    Class Lobby accepts players on the socket of `server` (a server.Server,
+    or None if connections are handed to it some other way, as in
+    supervisor) and matches them into bouts, running at most `max_bouts` bouts and
+    `max_connections` players at a time. Players turned away are sent
+    `{"error": REASON}` before being disconnected.
+
+    Bouts are for `default_players` players on a board of `default_size`
+    unless a player asks otherwise, and for at most `max_players` players on
+    a board of at most `max_size` with at most `max_mine_count` mines.
+    Every other argument of the bouts created, such as `board_factory` or
+    `tick_rate`, is taken from the dictionary `bout_options`.
+    """
+
+    def __init__(self,
+                 server,
+                 max_bouts=200,
+                 max_connections=1000,
+                 default_size=(16, 16),
+                 default_players=3,
+                 max_players=8,
+                 max_size=MAX_SIZE,
+                 max_mine_count=MAX_MINE_COUNT,
+                 bout_options=None):
+        self.server = server
+        self.max_bouts = max_bouts
+        self.max_connections = max_connections
+        self.default_size = default_size
+        self.default_players = default_players
+        self.max_players = max_players
+        self.max_size = max_size
+        self.max_mine_count = max_mine_count
+        self.bout_options = dict(bout_options or {})
+        # Every bout being played, and the bout of each kind waiting for
+        # more players.
+        self.bouts = dict()
+        self.waiting = dict()
+        # The seats taken in each bout, including those of players still
+        # being added, and how many players are being added to each bout
+        self.seats = dict()
+        self.joining = dict()
+        self.created = 0
+        self.torn_down = 0
+        self.rejected = 0
+        self.closed = False
+        self._lock = threading.Lock()
+        if server is not None:
+            # Players arrive far more often than at a server with one bout
+            server.srvsock.listen(128)
+
+    def serve(self, accept=None):
+        '''
+        Method serve accepts connections until the lobby is closed, admitting
+        each one in the background. Connections are accepted on the socket of
+        this lobby's server, or by calling `accept` if it's given, which must
+        return the arguments of method admit: at least a (socket, address)
+        pair like `socket.accept`.
+        '''
+        if accept is None:
+            accept = self.server.srvsock.accept
+        self._reap_loop()
+        while not self.closed:
+            try:
+                accepted = accept()
+            except OSError:
+                if self.closed:
+                    return
+                raise
+            self.admit(*accepted)
+
+    @concurrent
+    def admit(self, conn, addr, joining=None):
+        '''
+        Method admit places the player connected on `conn` in a bout, in the
+        background, once they've said what bout they want to join. If that's
+        already been read with read_join, its result is given as `joining`.
+        '''
+        if joining is None:
+            try:
+                joining = read_join(conn)
+            except (ConnectionError, OSError, ValueError) as e:
+                logging.info('Dropping connection from {}: {}'.format(addr, e))
+                conn.close()
+                return
+        join, buffered = joining
+        try:
+            self.place(conn, addr, join, buffered)
+        except ValueError as e:
+            logging.info('Turning away {}: {}'.format(addr, e))
+            with self._lock:
+                self.rejected += 1
+            try:
+                net.send(conn, {'error': str(e)})
+            except OSError:
+                pass
+            conn.close()
+
+    def _kind(self, join):
+        '''
+        Method _kind returns the (width, height, mine_count, players) of the
+        bout asked for by the dictionary `join`. Raises a ValueError if that
+        isn't a kind of bout this lobby hosts.
+        '''
+        return bout_kind(join, self.default_size, self.default_players,
+                         self.max_players, self.max_size, self.max_mine_count)
+
+    def place(self, conn, addr, join, buffered=bytes()):
+        '''
+        Method place adds the player connected on `conn` to a bout of the kind
+        asked for by the dictionary `join`, opening a new bout if none is
+        waiting for players. Returns the bout. Raises a ValueError if the
+        player can't be placed.
+
+        The player's seat is taken holding the lobby's lock, but they're
+        added to the bout without it, as that waits on their connection.
+        '''
+        kind = self._kind(join)
+        width, height, mine_count, players = kind
+
+        def constructor(name, bout, **kwargs):
+            return PlayerServer(conn, addr, name, bout, buffered=buffered,
+                                **kwargs)
+
+        with self._lock:
+            connected = sum(len(b.players) for b in self.bouts.values())
+            connected += sum(self.joining.values())
+            if connected >= self.max_connections:
+                raise ValueError('Server is full')
+            bout = self.waiting.get(kind)
+            if bout is None:
+                if len(self.bouts) >= self.max_bouts:
+                    raise ValueError('Server is hosting too many bouts')
+                bout = game.Bout(
+                    max_players=players,
+                    minefield_size=(width, height),
+                    mine_count=mine_count,
+                    **self.bout_options)
+                self.created += 1
+                self.bouts[self.created] = bout
+                self.waiting[kind] = bout
+                self.seats[bout] = 0
+            self.seats[bout] += 1
+            if self.seats[bout] >= bout.max_players:
+                # Full bouts aren't joined again, even if a player leaves
+                del self.waiting[kind]
+            self.joining[bout] = self.joining.get(bout, 0) + 1
+        added = None
+        try:
+            added = bout.add_player(constructor)
+        finally:
+            with self._lock:
+                self.joining[bout] -= 1
+                if not self.joining[bout]:
+                    del self.joining[bout]
+                if added is None and bout in self.seats:
+                    self._free_seat(kind, bout)
+        if added is None:
+            raise ValueError('Bout is full')
+        logging.info('Placed {} in bout of {}'.format(addr, kind))
+        return bout
+
+    def _free_seat(self, kind, bout):
+        # A player couldn't be added after all, so their seat is taken again
+        # by the next player asking for this kind of bout
+        self.seats[bout] -= 1
+        if kind not in self.waiting and not bout.finished():
+            self.waiting[kind] = bout
+
+    @concurrent
+    def _reap_loop(self):
+        while not self.closed:
+            time.sleep(REAP_INTERVAL)
+            if self.reap():
+                logging.info('Lobby: {}'.format(self.stats(per_bout=False)))
+
+    def reap(self):
+        '''
+        Method reap tears down every bout which is empty, and stops finished
+        bouts from taking new players. Returns how many bouts were torn down.
+        '''
+        reaped = 0
+        with self._lock:
+            for key, bout in list(self.bouts.items()):
+                if bout.finished():
+                    self._stop_waiting(bout)
+                if not bout.players and bout not in self.joining:
+                    self._stop_waiting(bout)
+                    bout.close()
+                    del self.bouts[key]
+                    del self.seats[bout]
+                    reaped += 1
+            self.torn_down += reaped
+        return reaped
+
+    def _stop_waiting(self, bout):
+        for kind, waiting in list(self.waiting.items()):
+            if waiting is bout:
+                del self.waiting[kind]
+
+    def stats(self, per_bout=True):
+        '''
+        Method stats returns how many bouts and players the lobby is
+        hosting, how many bouts it has created and torn down, how many
+        players it turned away, and unless `per_bout` is False, the stats of
+        every bout.
+        '''
+        with self._lock:
+            bouts = dict(self.bouts)
+            waiting = len(self.waiting)
+        rv = {
+            'bouts': len(bouts),
+            'waiting': waiting,
+            'players': sum(len(b.players) for b in bouts.values()),
+            'created': self.created,
+            'torn_down': self.torn_down,
+            'rejected': self.rejected,
+        }
+        if per_bout:
+            rv['bout_stats'] = {key: b.stats() for key, b in bouts.items()}
+        return rv
+
+    def close(self):
+        '''
+        Method close stops accepting players and closes every bout.
+        '''
+        self.closed = True
+        if self.server is not None:
+            try:
+                # Shutting the socket down wakes up the accept in method serve
+                self.server.srvsock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.server.srvsock.close()
+        with self._lock:
+            for bout in self.bouts.values():
+                bout.close()
@@ -1,12 +1,10 @@
 import logging
 import atexit
 import socket
-import queue
 import json
 
 from .. import game, net
 from ..concurrency import concurrent
-from ..minesweeper.minefield import MineField
 
 
 def local_address(fallback):
@@ -68,7 +66,13 @@ class PlayerServer(game.Conveyor):
     in a Bout is allocated a PlayerServer which keeps track of that players
     minefied, the various states of the player (whether the player's alive,
     whether they're victorious, etc), and the socket connection to the
-    remote player.
+    remote player. `buffered` holds any bytes already read from `conn`.
+
+    The player is offered net.PROTOCOL along with their information, and
+    messages are framed and compressed as they accept (see net.Codec).
+    Nothing is sent or received until the player has been added to the bout
+    (see method joined), so a player who leaves while being added is still
+    removed from it.
     '''
 
     def __init__(self,
@@ -78,24 +82,41 @@ class PlayerServer(game.Conveyor):
                  bout,
                  mine_count=None,
                  height=None,
-                 width=None):
+                 width=None,
+                 buffered=bytes()):
         self.conn = conn
         self.addr = addr
         self.name = name
         self.bout = bout
-        self.stateq = queue.Queue()
-        self.mfield = MineField(
+        self.stateq = net.StateQueue(on_overflow=self._disconnect)
+        self.codec = net.Codec()
+        self.codec.max_frame = net.MAX_PLAYER_MESSAGE
+        self.codec.max_message = net.MAX_PLAYER_MESSAGE
+        self.mfield = bout.new_minefield(
             height=height, width=width, mine_count=mine_count)
         self.living = True
         self.victory = False
+        self._buffered = buffered
 
-        net.msg_recv(self.conn, self.send_input, self._remove_self)
-        net.msg_send(conn, self.get_state)
+    def joined(self):
         # Send the player information as the very first thing
-        # self.conn.sendall(net.json_dump(self.json()).encode('utf-8')+net.SEP)
-        net.send(self.conn, self.json())
+        try:
+            self.codec.send(self.conn,
+                            dict(self.json(), protocol=net.PROTOCOL))
+        except OSError as e:
+            logging.info('Player "{}" left while joining: {}'.format(
+                self.name, e))
+            self._remove_self()
+            return
+        net.msg_send(self.conn, self.get_state, self.codec)
+        net.msg_recv(self.conn, self.send_input, self._remove_self,
+                     self._buffered, self.codec)
 
     def send_input(self, inpt):
+        if isinstance(inpt, dict) and 'protocol' in inpt:
+            # Answers what we offered, so it's not meant for the bout
+            self._negotiate(inpt['protocol'])
+            return
         # Just pass the input to the parent bout, but with info saying that
         # this input comes from this player
         logging.debug(inpt)
@@ -104,10 +125,32 @@ class PlayerServer(game.Conveyor):
     def get_state(self):
         return self.stateq.get()
 
+    def _negotiate(self, protocol):
+        '''
+        Frames and compresses messages as the player asked.
+        '''
+        logging.info('Player "{}" accepted protocol {}'.format(
+            self.name, protocol))
+        self.codec.agree(protocol)
+
+    def _disconnect(self):
+        '''
+        Disconnects a player too far behind to catch up. Shutting the socket
+        down stops msg_recv, which then removes us from the bout.
+        '''
+        logging.warning('Disconnecting player "{}" at {}, who is too far '
+                        'behind'.format(self.name, self.addr))
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
     def _remove_self(self):
         '''
         Removes ourself from the bout and close all associated sockets.
         '''
+        logging.info('State queue of player "{}": {}'.format(
+            self.name, self.stateq.stats()))
         self.conn.close()
         # Causes the concurrently running msg_send to try to send 'die' over
         # the closed socket, causing that thread to throw an exception and die.
@@ -115,12 +158,7 @@ class PlayerServer(game.Conveyor):
         self.bout.remove_player(self.name)
 
     def json(self):
-        return {
-            'name': self.name,
-            'living': self.living,
-            'minefield': self.mfield.json(),
-            'victory': self.victory,
-        }
+        return game.player_json(self)
 
 
 class Server(object):
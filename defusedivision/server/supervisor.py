@@ -0,0 +1,254 @@
+'''
+Module supervisor spreads the bouts of a dedicated server over several
+processes, so that the work of encoding and sending states isn't limited to
+the one core a single Python interpreter can use.
+
+The Supervisor accepts every connection itself and reads what bout the
+player wants to join (see lobby.read_join). It then hands the connection to
+one of its worker processes by passing the connection's file descriptor over
+a Unix socket. Players are sent to the same worker as the others waiting for
+the same kind of bout, so they're matched together, and otherwise to the
+least loaded worker. Each worker runs a lobby.Lobby of its own, and reports
+its load back over the same Unix socket every LOAD_INTERVAL seconds.
+'''
+
+import multiprocessing
+import threading
+import logging
+import socket
+import json
+import time
+import os
+
+from .. import net
+from ..concurrency import concurrent, START_METHOD
+from .lobby import read_join, bout_kind
+
+# How often, in seconds, each worker reports its load
+LOAD_INTERVAL = 0.5
+
+# How often, in seconds, the supervisor logs the load of its workers
+LOG_INTERVAL = 10.0
+
+# The largest message handing a connection to a worker may be, in bytes
+MAX_HANDOFF = 65536
+
+
+def _worker_main(channel, make_lobby):
+    '''
+    Function _worker_main runs in each worker process, serving the players
+    whose connections arrive on `channel` in a lobby made by calling
+    `make_lobby(None)`.
+    '''
+    lobby = make_lobby(None)
+    parent = os.getppid()
+
+    def accept():
+        msg, fds, _, _ = socket.recv_fds(channel, MAX_HANDOFF, 1)
+        if not fds:
+            # Anything but a connection means it's time to stop
+            lobby.close()
+            raise OSError('Supervisor stopped this worker')
+        header, _, buffered = msg.partition(b'\n')
+        info = json.loads(header.decode('utf-8'))
+        conn = socket.socket(fileno=fds[0])
+        return conn, tuple(info['addr']), (info['join'], buffered)
+
+    @concurrent
+    def report():
+        began = time.time()
+        while not lobby.closed:
+            if os.getppid() != parent:
+                # The supervisor is gone, and with it every new player
+                logging.error('Supervisor exited, stopping worker')
+                os._exit(1)
+            load = lobby.stats(per_bout=False)
+            load['pid'] = os.getpid()
+            load['cpu'] = time.process_time() / max(time.time() - began, 1e-9)
+            try:
+                channel.send(json.dumps(load).encode('utf-8'))
+            except OSError:
+                return
+            time.sleep(LOAD_INTERVAL)
+
+    report()
+    try:
+        lobby.serve(accept)
+    except KeyboardInterrupt:
+        lobby.close()
+
+
+class Supervisor(object):
+    """
+    Class Supervisor accepts players on the socket of `server` (a
+    server.Server), handing each to one of `workers` worker processes (one
+    per core by default). `make_lobby` is a picklable callable which each
+    worker calls with None to make its lobby.Lobby. `kind_options` must hold
+    the arguments of lobby.bout_kind which the lobbies are made with, such as
+    `default_size`, so that players asking for the same kind of bout are
+    matched together however they ask for it.
+    """
+
+    def __init__(self, server, make_lobby, workers=None, kind_options=None):
+        if not hasattr(socket, 'send_fds'):
+            raise ValueError('Running more than one worker needs Python 3.9 '
+                             'or later on a Unix-like system')
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.server = server
+        self.make_lobby = make_lobby
+        self.kind_options = dict(kind_options or {})
+        # The worker each kind of bout is being filled on, and how many more
+        # players that bout needs
+        self.filling = dict()
+        self.closed = False
+        self.handed = 0
+        self.channels = []
+        self.processes = []
+        # The latest load reported by each worker, plus the players handed
+        # to it since then
+        self.loads = []
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            self._start_worker()
+        server.srvsock.listen(128)
+
+    def _start_worker(self):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        context = multiprocessing.get_context(START_METHOD)
+        process = context.Process(
+            target=_worker_main, args=(theirs, self.make_lobby))
+        process.start()
+        theirs.close()
+        index = len(self.processes)
+        self.channels.append(ours)
+        self.processes.append(process)
+        self.loads.append({'pid': process.pid, 'players': 0, 'handed': 0})
+        self._read_loads(index)
+
+    @concurrent
+    def _read_loads(self, index):
+        channel = self.channels[index]
+        while not self.closed:
+            try:
+                load = json.loads(channel.recv(65536).decode('utf-8'))
+            except OSError:
+                return
+            with self._lock:
+                load['handed'] = self.loads[index]['handed']
+                self.loads[index] = load
+
+    def serve(self):
+        '''
+        Method serve accepts connections until the supervisor is closed,
+        handing each one to a worker in the background.
+        '''
+        self._log_loads()
+        while not self.closed:
+            try:
+                conn, addr = self.server.srvsock.accept()
+            except OSError:
+                if self.closed:
+                    return
+                raise
+            self._admit(conn, addr)
+
+    @concurrent
+    def _admit(self, conn, addr):
+        try:
+            join, buffered = read_join(conn)
+            self.hand_off(conn, addr, join, buffered)
+        except ValueError as e:
+            logging.info('Turning away {}: {}'.format(addr, e))
+            try:
+                net.send(conn, {'error': str(e)})
+            except OSError:
+                pass
+        except (ConnectionError, OSError) as e:
+            logging.info('Dropping connection from {}: {}'.format(addr, e))
+        finally:
+            conn.close()
+
+    def hand_off(self, conn, addr, join, buffered=bytes()):
+        '''
+        Method hand_off passes the connection `conn` of a player asking to
+        join the bout described by the dictionary `join` to a worker, along
+        with the bytes `buffered` already read from it. Returns the index of
+        that worker, or None if every worker has died. Raises a ValueError if
+        that's more than fits in a message to a worker.
+
+        Players asking for a kind of bout the lobbies don't host are handed
+        to the least loaded worker, whose lobby turns them away.
+        '''
+        header = json.dumps({'addr': list(addr), 'join': join})
+        msg = header.encode('utf-8') + b'\n' + buffered
+        if len(msg) > MAX_HANDOFF:
+            raise ValueError('Too much sent before joining: {} bytes'.format(
+                len(buffered)))
+        try:
+            kind = bout_kind(join, **self.kind_options)
+        except ValueError:
+            kind = None
+        with self._lock:
+            alive = [i for i, p in enumerate(self.processes) if p.is_alive()]
+            if not alive:
+                logging.error('Every worker has died, dropping {}'.format(
+                    addr))
+                return None
+            index = min(alive, key=lambda i: self.loads[i]['players'])
+            if kind is not None:
+                filling = self.filling.get(kind)
+                if filling is None or filling[0] not in alive:
+                    filling = self.filling[kind] = [index, kind[-1]]
+                index = filling[0]
+                filling[1] -= 1
+                if filling[1] <= 0:
+                    del self.filling[kind]
+            # Count the player now, rather than waiting for the worker's
+            # next report, so a burst of players is spread out too.
+            self.loads[index]['players'] += 1
+            self.loads[index]['handed'] += 1
+            self.handed += 1
+        socket.send_fds(self.channels[index], [msg], [conn.fileno()])
+        return index
+
+    @concurrent
+    def _log_loads(self):
+        while not self.closed:
+            time.sleep(LOG_INTERVAL)
+            logging.info('Worker loads: {}'.format(self.stats()))
+
+    def stats(self):
+        '''
+        Method stats returns how many players have been handed to workers,
+        and the latest load of each worker: its pid, bouts, players, how many
+        players it was handed, and the fraction of a core it has used.
+        '''
+        with self._lock:
+            return {
+                'handed': self.handed,
+                'workers': [dict(load) for load in self.loads],
+            }
+
+    def close(self):
+        '''
+        Method close stops accepting players and stops every worker.
+        '''
+        self.closed = True
+        try:
+            # Shutting the socket down wakes up the accept in method serve
+            self.server.srvsock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.srvsock.close()
+        for channel in self.channels:
+            try:
+                channel.send(b'stop')
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        for channel in self.channels:
+            channel.close()
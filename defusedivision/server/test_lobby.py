@@ -0,0 +1,156 @@
+import threading
+import unittest
+import random
+import socket
+import time
+
+from . import lobby, server
+from ..client.client import PlayerClient
+from ..minesweeper.minefield import MineField
+
+
+class TestLobby(unittest.TestCase):
+    def setUp(self):
+        self.port = random.randint(20000, 40000)
+        srv = server.Server('127.0.0.1', self.port)
+        self.lobby = lobby.Lobby(srv, max_bouts=3)
+        threading.Thread(target=self.lobby.serve, daemon=True).start()
+        self.addCleanup(self.lobby.close)
+
+    def join(self, **kwargs):
+        return PlayerClient('127.0.0.1', self.port, join=kwargs)
+
+    def settle(self, players):
+        # Clients are told their name just before they're added to a bout
+        for _ in range(100):
+            if self.lobby.stats()['players'] == players:
+                return
+            time.sleep(0.01)
+
+    def test_matchmaking(self):
+        first = self.join(width=8, height=8, players=2)
+        second = self.join(width=8, height=8, players=2)
+        other = self.join(width=10, height=8, players=2)
+        third = self.join(width=8, height=8, players=2)
+        self.settle(4)
+        bouts = list(self.lobby.bouts.values())
+        self.assertEqual(len(bouts), 3)
+        self.assertEqual(sorted(bouts[0].players), sorted(
+            [first.name, second.name]))
+        self.assertEqual(list(bouts[1].players), [other.name])
+        self.assertEqual(list(bouts[2].players), [third.name])
+        with self.assertRaises(ConnectionError):
+            self.join(width=12, height=12)
+
+    def test_default_bout(self):
+        client = PlayerClient('127.0.0.1', self.port)
+        self.settle(1)
+        bout, = self.lobby.bouts.values()
+        self.assertEqual(bout.max_players, 3)
+        self.assertEqual(bout.players[client.name].mfield.width, 16)
+
+    def test_empty_bouts_torn_down(self):
+        client = self.join(width=8, height=8, players=2)
+        self.settle(1)
+        self.assertEqual(self.lobby.reap(), 0)
+        client.clientsock.shutdown(socket.SHUT_RDWR)
+        for _ in range(50):
+            if self.lobby.reap():
+                break
+            time.sleep(0.02)
+        stats = self.lobby.stats()
+        self.assertEqual((stats['bouts'], stats['torn_down']), (0, 1))
+
+    def test_limits(self):
+        for join in ({'width': 101}, {'height': 101}, {'mine_count': -1},
+                     {'mine_count': 2001}):
+            with self.assertRaises(ValueError):
+                self.lobby._kind(join)
+        self.assertEqual(self.lobby._kind({'width': 100, 'mine_count': 2000}),
+                         (100, 16, 2000, 3))
+
+    def test_join_too_long(self):
+        conn, client = socket.socketpair()
+        self.addCleanup(conn.close)
+        self.addCleanup(client.close)
+        client.sendall(bytes(lobby.MAX_JOIN + 1))
+        with self.assertRaises(ValueError):
+            lobby.read_join(conn)
+
+    def test_slow_player_placed_without_lock(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def minefield(width, height, mine_count):
+            # Like a player whose connection is slow to take their minefield
+            if width == 9:
+                release.wait(5)
+            return MineField(width, height, mine_count)
+
+        quiet = lobby.Lobby(
+            None, bout_options={'minefield_constructor': minefield})
+        self.addCleanup(quiet.close)
+        conns = [sock for _ in range(2) for sock in socket.socketpair()]
+        for conn in conns:
+            self.addCleanup(conn.close)
+        slow = threading.Thread(
+            target=quiet.place,
+            args=(conns[0], 'slow', {'width': 9, 'players': 2}))
+        slow.start()
+        for _ in range(100):
+            if quiet.joining:
+                break
+            time.sleep(0.01)
+        quiet.place(conns[2], 'fast', {'width': 8})
+        self.assertTrue(slow.is_alive())
+        # The bout the slow player is joining isn't torn down meanwhile
+        self.assertEqual(quiet.reap(), 0)
+        release.set()
+        slow.join(5)
+        self.assertEqual(quiet.stats()['players'], 2)
+        self.assertEqual(quiet.joining, {})
+
+    def test_player_leaving_while_joining(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def minefield(width, height, mine_count):
+            release.wait(5)
+            return MineField(width, height, mine_count)
+
+        quiet = lobby.Lobby(
+            None, bout_options={'minefield_constructor': minefield})
+        self.addCleanup(quiet.close)
+        conn, client = socket.socketpair()
+        self.addCleanup(conn.close)
+        joining = threading.Thread(
+            target=quiet.place, args=(conn, 'leaving', {'players': 2}))
+        joining.start()
+        client.close()
+        release.set()
+        joining.join(5)
+        for _ in range(100):
+            if not quiet.stats()['players']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(quiet.reap(), 1)
+
+    def test_join_has_one_deadline(self):
+        conn, client = socket.socketpair()
+        self.addCleanup(conn.close)
+        self.addCleanup(client.close)
+        stop = threading.Event()
+        self.addCleanup(stop.set)
+
+        def trickle():
+            while not stop.wait(lobby.JOIN_TIMEOUT / 5):
+                client.send(b'x')
+
+        threading.Thread(target=trickle, daemon=True).start()
+        began = time.time()
+        self.assertEqual(lobby.read_join(conn)[0], {})
+        self.assertLess(time.time() - began, lobby.JOIN_TIMEOUT * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import threading
+import unittest
+import random
+import socket
+import time
+import os
+
+from . import lobby, server, supervisor
+from ..client.client import PlayerClient
+
+
+def make_lobby(srv):
+    return lobby.Lobby(srv)
+
+
+class TestSupervisor(unittest.TestCase):
+    def test_players_spread_over_workers(self):
+        port = random.randint(20000, 40000)
+        sup = supervisor.Supervisor(
+            server.Server('127.0.0.1', port), make_lobby, workers=2)
+        self.addCleanup(sup.close)
+        threading.Thread(target=sup.serve, daemon=True).start()
+
+        join = {'width': 8, 'height': 8, 'players': 2}
+        clients = [PlayerClient('127.0.0.1', port, join=join)
+                   for _ in range(4)]
+        self.assertEqual(len(set(c.name for c in clients)), 4)
+        for _ in range(100):
+            loads = sup.stats()['workers']
+            if sum(load.get('bouts', 0) for load in loads) == 2:
+                break
+            time.sleep(0.05)
+        # Both players of a bout are sent to the same worker
+        self.assertEqual([load['handed'] for load in loads], [2, 2])
+        self.assertEqual([load['bouts'] for load in loads], [1, 1])
+        self.assertEqual([load['players'] for load in loads], [2, 2])
+        self.assertEqual(len(set(load['pid'] for load in loads)), 2)
+
+    def test_same_bout_asked_differently(self):
+        port = random.randint(20000, 40000)
+        sup = supervisor.Supervisor(
+            server.Server('127.0.0.1', port), make_lobby, workers=2)
+        self.addCleanup(sup.close)
+        threading.Thread(target=sup.serve, daemon=True).start()
+
+        PlayerClient('127.0.0.1', port, join={'players': 2})
+        PlayerClient('127.0.0.1', port, join={
+            'width': 16, 'height': 16, 'mine_count': None, 'players': 2})
+        handed = [load['handed'] for load in sup.stats()['workers']]
+        self.assertEqual(sorted(handed), [0, 2])
+        self.assertEqual(sup.filling, {})
+
+        conn, other = socket.socketpair()
+        self.addCleanup(conn.close)
+        self.addCleanup(other.close)
+        with self.assertRaises(ValueError):
+            sup.hand_off(conn, ('127.0.0.1', 0), {},
+                         bytes(supervisor.MAX_HANDOFF))
+        self.assertEqual(sup.stats()['handed'], 2)
+
+    @unittest.skipUnless(os.path.isdir('/proc/self/fd'), 'Needs /proc')
+    def test_workers_dont_hold_listening_socket(self):
+        srv = server.Server('127.0.0.1', random.randint(20000, 40000))
+        sup = supervisor.Supervisor(srv, make_lobby, workers=1)
+        self.addCleanup(sup.close)
+        listening = os.fstat(srv.srvsock.fileno()).st_ino
+        fds = '/proc/{}/fd'.format(sup.processes[0].pid)
+        held = set()
+        for fd in os.listdir(fds):
+            try:
+                held.add(os.stat(os.path.join(fds, fd)).st_ino)
+            except OSError:
+                pass
+        self.assertNotIn(listening, held)
+
+
+if __name__ == '__main__':
+    unittest.main()
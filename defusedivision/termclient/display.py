@@ -77,8 +77,16 @@ def _downleft(cx, cy, cell, field):
             return Glyph(x, y, "┼")
 
 
+def cell_contents(cell):
+    '''
+    Returns the contents of a cell, which are only sent for probed cells
+    until the mines are shown.
+    '''
+    return cell.get('contents', Contents.empty)
+
+
 def _upright(cx, cy, cell, field):
-    x, y = cx + len(cell['contents']), cy - 1
+    x, y = cx + len(cell_contents(cell)), cy - 1
     if top_edge(cell, field):
         if right_edge(cell, field):
             return Glyph(x, y, "┐")
@@ -92,7 +100,7 @@ def _upright(cx, cy, cell, field):
 
 
 def _downright(cx, cy, cell, field):
-    x, y = cx + len(cell['contents']), cy + 1
+    x, y = cx + len(cell_contents(cell)), cy + 1
     if bottom_edge(cell, field):
         if right_edge(cell, field):
             return Glyph(x, y, "┘")
@@ -127,15 +135,19 @@ def build_contents(cell, player):
     Function build_contents returns a Glyph representing the contents of a
     cell, based on the state of that cell and the player who owns that cell.
     """
-    x = ((1 + len(cell['contents'])) * cell['x']) + 1
+    contents = cell_contents(cell)
+    x = ((1 + len(contents)) * cell['x']) + 1
     y = (2 * cell['y']) + 1
-    rv = Glyph(x, y, cell['contents'])
+    rv = Glyph(x, y, contents)
     rv.attr = get_colorpair('black-white')
 
     # Probed cells show the number of cells they touch and an appropriate color
     if cell['probed']:
-        mine_contacts = sum(
-            [int(v == True) for _, v in cell['neighbors'].items()])
+        mine_contacts = cell.get('contacts')
+        # Older servers only send which neighbors are mines
+        if mine_contacts is None:
+            mine_contacts = sum(
+                [int(v == True) for _, v in cell['neighbors'].items()])
         # print(mine_contacts)
         rv.strng = " {} ".format(mine_contacts)
         rv.attr = contacts_color(mine_contacts)
@@ -151,14 +163,14 @@ def build_contents(cell, player):
         rv.strng = Contents.flag
 
     if not player['living']:
-        if cell['contents'] == Contents.mine:
+        if contents == Contents.mine:
             rv.strng = Contents.mine
     return rv
 
 
 def assemble_glyphs(cell, player):
     state = player['minefield']
-    cwidth = len(cell['contents'])
+    cwidth = len(cell_contents(cell))
     # Starting cell position is:
     #     ((length_in_dimension+1)*n) + 1
     # ypos = lambda y: (2*y)+1
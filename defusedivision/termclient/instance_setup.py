@@ -20,12 +20,32 @@ Different possible modes:
 import time
 
 from .. import game, concurrency
+from ..boardpool import BoardFactory
+from ..noguess import NoGuessGenerator
 from ..server import server
 # from ..sound import sound
 from ..client import client as netclient
 from ..minesweeper import contents
 
 
+def layout_generator(args):
+    '''
+    Returns the noguess.NoGuessGenerator asked for by the command line
+    arguments, or None if no-guess minefields weren't asked for.
+    '''
+    if args.noguess > 0:
+        return NoGuessGenerator(budget=args.noguess)
+    return None
+
+
+def cell_format(args):
+    '''
+    Returns the format of net.CELL_FORMATS the command line arguments ask
+    for boards to be sent in.
+    '''
+    return 'json' if args.jsoncells else 'binary'
+
+
 def field_size(scr_w, scr_h, cellwidth=3):
     '''
     Field size returns the largest minefield dimensions which will fit in a
@@ -119,9 +139,16 @@ def create_client(stdscr, args, uiopts):
             max_players=1,
             minefield_size=(width, height),
             mine_count=args.mines,
-            player_constructor=srv.create_player)
+            player_constructor=srv.create_player,
+            minefield_constructor=game.MINEFIELD_ENGINES[args.engine],
+            board_factory=BoardFactory(
+                game.MINEFIELD_ENGINES[args.engine], args.poolsize),
+            layout_generator=layout_generator(args),
+            shared_layout=args.sharedlayout,
+            max_difficulty_spread=args.maxspread,
+            tick_rate=args.tickrate)
         concurrency.concurrent(lambda: bout.add_player())()
-        client = netclient.PlayerClient(host, port)
+        client = netclient.PlayerClient(host, port, cells=cell_format(args))
         # Auto-make a new minefield of the size we want
         if args.playername:
             client.send_input({'change-name': args.playername})
@@ -138,7 +165,11 @@ def create_client(stdscr, args, uiopts):
     elif uiopts['mode'] == 'Multiplayer':
         port = int(uiopts['connection']['port'])
         host = uiopts['connection']['hostname']
-        client = netclient.PlayerClient(host, port)
+        client = netclient.PlayerClient(host, port, join={
+            'width': width,
+            'height': height,
+            'mine_count': mine_count,
+        }, cells=cell_format(args))
 
         if too_tall or too_wide:
             stdscr.clear()
@@ -182,13 +213,20 @@ def create_client(stdscr, args, uiopts):
             max_players=3,
             minefield_size=(width, height),
             mine_count=args.mines,
-            player_constructor=srv.create_player)
+            player_constructor=srv.create_player,
+            minefield_constructor=game.MINEFIELD_ENGINES[args.engine],
+            board_factory=BoardFactory(
+                game.MINEFIELD_ENGINES[args.engine], args.poolsize),
+            layout_generator=layout_generator(args),
+            shared_layout=args.sharedlayout,
+            max_difficulty_spread=args.maxspread,
+            tick_rate=args.tickrate)
         def addplayers():
             while True:
                 if bout.add_player() is None:
                     return
         concurrency.concurrent(addplayers)()
-        client = netclient.PlayerClient(host, port)
+        client = netclient.PlayerClient(host, port, cells=cell_format(args))
 
         if too_tall or too_wide:
             stdscr.clear()
@@ -108,6 +108,13 @@ def draw_state(stdscr, state, me):
             for g in glyphs:
                 stdscr.addstr(g.y + starty, g.x + startx + xoffset, g.strng,
                               g.attr)
+        # Others' boards are hidden while a shared layout is played, so only
+        # how far along they are is drawn
+        if not field['cells'] and 'probed_count' in field:
+            progress = '{} probed, {} flagged'.format(
+                field['probed_count'], field['flag_count'])
+            progress = middlefmt.format(width).format(progress)[:width]
+            stdscr.addstr(height // 2 - 1, startx + xoffset, progress, attr)
         # If a user has died, draw a big 'you're dead' message in the middle of
         # their board
         if not state['players'][pname]['living']:
@@ -279,11 +286,23 @@ def main(stdscr, client, args):
 
     state = {'players':{}}
     waitkeyframe = False
+    # Whether we've asked the server for a keyframe and are waiting for it
+    resyncing = False
     while True:
         try:
             event = eventq.get()
         except KeyboardInterrupt:
             break
+        # Apply deltas to our copy of the state right away, so they're applied
+        # in the order they were sent.
+        if event[0] == "state-delta":
+            newstate = game.apply_delta(state, event[1])
+            if newstate is None:
+                if not resyncing:
+                    client.send_input({'keyframe': True})
+                    resyncing = True
+                continue
+            event = ('new-state', newstate)
         if event[0] == "user-input":
             # Handle terminal resizing during game by redrawing the window
             if event[1] == curses.KEY_RESIZE:
@@ -311,6 +330,7 @@ def main(stdscr, client, args):
 
         elif event[0] == "new-state":
             waitkeyframe = False
+            resyncing = False
             for oldplayer in state['players']:
                 if oldplayer in event[1]['players']:
                     if state['players'][oldplayer]['living'] != event[1]['players'][oldplayer]['living']:
@@ -0,0 +1,69 @@
+import unittest
+import time
+
+from .boardpool import BoardFactory
+from .minesweeper.arrayfield import ArrayMineField
+from . import game
+
+
+def wait_for(pred, timeout=5):
+    deadline = time.time() + timeout
+    while not pred() and time.time() < deadline:
+        time.sleep(0.01)
+    return pred()
+
+
+class TestBoardFactory(unittest.TestCase):
+    def test_prime_then_hit(self):
+        factory = BoardFactory(ArrayMineField, pool_size=2)
+        factory.prime(10, 8, 12)
+        self.assertTrue(wait_for(lambda: factory.stats()['generated'] >= 2))
+        field = factory.get(10, 8, 12)
+        self.assertEqual((field.width, field.height, field.mine_count),
+                         (10, 8, 12))
+        self.assertEqual(factory.stats()['hits'], 1)
+        self.assertEqual(factory.stats()['misses'], 0)
+
+    def test_miss_builds_on_request(self):
+        factory = BoardFactory(pool_size=0)
+        field = factory.get(5, 5, 3)
+        self.assertEqual(field.mine_count, 3)
+        self.assertEqual(factory.stats()['misses'], 1)
+
+    def test_impossible_board(self):
+        factory = BoardFactory(pool_size=2)
+        with self.assertRaises(ValueError):
+            factory.get(3, 3, 50)
+        self.assertEqual(factory.stats()['pools'], {})
+
+    def test_least_recently_used_pool_dropped(self):
+        factory = BoardFactory(pool_size=1, max_pools=2)
+        for size in (5, 6, 5, 7):
+            factory.get(size, size, 3)
+        stats = factory.stats()
+        self.assertEqual(sorted(stats['pools']), ['5x5:3', '7x7:3'])
+        self.assertEqual(stats['evicted'], 1)
+
+    def test_refill_survives_failing_constructor(self):
+        def constructor(width, height, mine_count):
+            if width == 7:
+                raise RuntimeError('Broken engine')
+            return ArrayMineField(width, height, mine_count)
+
+        factory = BoardFactory(constructor, pool_size=2)
+        with self.assertLogs(level='ERROR'):
+            factory.prime(7, 7, 3)
+            self.assertTrue(wait_for(lambda: not factory.stats()['pools']))
+        factory.prime(8, 8, 3)
+        self.assertTrue(wait_for(lambda: factory.stats()['generated'] >= 2))
+
+    def test_bout_draws_from_factory(self):
+        factory = BoardFactory(pool_size=2)
+        bout = game.Bout(minefield_size=(9, 9), board_factory=factory)
+        self.assertTrue(wait_for(lambda: factory.stats()['generated'] >= 2))
+        bout.add_player()
+        self.assertEqual(factory.stats()['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
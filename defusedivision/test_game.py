@@ -0,0 +1,279 @@
+import threading
+import unittest
+import time
+import random
+import copy
+
+from . import game
+from .minesweeper.arrayfield import ArrayMineField
+
+
+def replay(player, state=None):
+    """
+    Applies every message waiting in a player's stateq to `state`, the way a
+    client would, returning the resulting state and how many deltas were
+    received.
+    """
+    deltas = 0
+    while not player.stateq.empty():
+        kind, payload = player.stateq.get()
+        if kind == 'new-state':
+            # Keyframes share objects with the Bout, so take a copy to change
+            state = copy.deepcopy(payload)
+        elif kind == 'state-delta':
+            deltas += 1
+            state = game.apply_delta(state, payload)
+        elif kind == 'update-selected':
+            name, selected = payload
+            state['players'][name]['minefield']['selected'] = selected
+    return state, deltas
+
+
+class TestStateDelta(unittest.TestCase):
+    def play(self, **kwargs):
+        bout = game.Bout(max_players=2, minefield_size=(12, 12), **kwargs)
+        first, second = bout.add_player(), bout.add_player()
+        state, deltas = replay(first)
+        # Messages are replayed as they're sent, since a keyframe replaces
+        # the deltas still queued before it
+        for _ in range(200):
+            player = random.choice([first, second])
+            player.send_input(random.choice(
+                ['UP', 'DOWN', 'LEFT', 'RIGHT', 'PROBE', 'FLAG']))
+            state, sent = replay(first, state)
+            deltas += sent
+        first.send_input({'change-name': 'renamed'})
+        state, _ = replay(first, state)
+        self.assertGreater(deltas, 0)
+        self.assertEqual(state, bout.json(viewer=first))
+
+    def test_deltas_rebuild_state(self):
+        for engine in game.MINEFIELD_ENGINES.values():
+            self.play(minefield_constructor=engine)
+
+    def test_deltas_rebuild_shared_state(self):
+        self.play(shared_layout=True)
+
+    def test_keyframe_replaces_queued_deltas(self):
+        bout = game.Bout(max_players=1, minefield_constructor=ArrayMineField)
+        player = bout.add_player()
+        state, _ = replay(player)
+        player.send_input('FLAG')
+        # The rename is the change on which a keyframe is due
+        bout._since_keyframe = game.KEYFRAME_INTERVAL - 1
+        player.send_input({'change-name': 'renamed'})
+        self.assertEqual(player.stateq.qsize(), 1)
+        state, deltas = replay(player, state)
+        self.assertEqual(deltas, 0)
+        self.assertEqual(state, bout.json())
+
+    def test_gap_needs_keyframe(self):
+        bout = game.Bout(max_players=1, minefield_constructor=ArrayMineField)
+        player = bout.add_player()
+        state, _ = replay(player)
+        player.send_input('PROBE')
+        player.send_input('FLAG')
+        player.stateq.get()
+        _, delta = player.stateq.get()
+        self.assertIsNone(game.apply_delta(state, delta))
+        player.send_input({'keyframe': True})
+        kind, keyframe = player.stateq.get()
+        self.assertEqual(kind, 'new-state')
+        self.assertEqual(keyframe['seq'], delta['seq'])
+
+    def test_removed_player(self):
+        bout = game.Bout(max_players=2)
+        first, second = bout.add_player(), bout.add_player()
+        bout.remove_player(second.name)
+        state, _ = replay(first)
+        self.assertEqual(list(state['players']), [first.name])
+
+
+class TestInputBatches(unittest.TestCase):
+    def test_batch_sends_one_delta(self):
+        bout = game.Bout(max_players=2, minefield_constructor=ArrayMineField)
+        first, second = bout.add_player(), bout.add_player()
+        state, _ = replay(first)
+        for inpt in ['RIGHT', 'DOWN', 'FLAG', {'change-name': 'renamed'},
+                     'RIGHT', 'FLAG']:
+            bout.inputs.put({'player': first.name, 'input': inpt})
+        bout.inputs.put({'player': second.name, 'input': 'LEFT'})
+        bout.process_inputs()
+        state, deltas = replay(first, state)
+        self.assertEqual(deltas, 1)
+        self.assertEqual(bout.batches, 1)
+        self.assertEqual(state, bout.json())
+        self.assertEqual(state['players']['renamed']['minefield']['selected'],
+                         [2, 1])
+
+    def test_concurrent_inputs(self):
+        bout = game.Bout(max_players=4, minefield_size=(16, 16),
+                         minefield_constructor=ArrayMineField)
+        players = [bout.add_player() for _ in range(4)]
+
+        def play(player):
+            for i in range(300):
+                player.send_input(random.choice(
+                    ['UP', 'DOWN', 'LEFT', 'RIGHT', 'FLAG']))
+                if i % 100 == 0:
+                    player.send_input({'change-name': 'same'})
+
+        threads = [threading.Thread(target=play, args=(player, ))
+                   for player in players]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        bout.process_inputs()
+        self.assertEqual(bout.inputs_applied, 4 * 303)
+        state, _ = replay(players[0])
+        self.assertEqual(state, bout.json())
+
+    def test_inputs_applied_while_player_joins(self):
+        bout = game.Bout(max_players=3, minefield_constructor=ArrayMineField)
+        first = bout.add_player()
+        release = threading.Event()
+        joined = []
+
+        def slow_player(name, bout, **kwargs):
+            # Like a player waiting for a connection, then sending an input
+            # before they've been added
+            player = game.Player(name, bout, **kwargs)
+            player.send_input('RIGHT')
+            release.wait(5)
+            return player
+
+        thread = threading.Thread(
+            target=lambda: joined.append(bout.add_player(slow_player)))
+        thread.start()
+        self.addCleanup(release.set)
+        first.send_input('DOWN')
+        self.assertEqual(first.mfield.selected, [0, 1])
+        # The slow player's seat is taken, but they aren't playing yet
+        self.assertIsNotNone(bout.add_player())
+        self.assertIsNone(bout.add_player())
+        bout.remove_player(first.name)
+        release.set()
+        thread.join(5)
+        self.assertEqual(joined[0].mfield.selected, [1, 0])
+        self.assertEqual(len(bout.players), 2)
+
+
+class TestBroadcastTick(unittest.TestCase):
+    def test_changes_coalesced(self):
+        bout = game.Bout(max_players=2, minefield_constructor=ArrayMineField,
+                         tick_rate=20)
+        self.addCleanup(bout.close)
+        first, second = bout.add_player(), bout.add_player()
+        state, _ = replay(second)
+        began = time.monotonic()
+        for _ in range(100):
+            first.send_input(random.choice(['UP', 'DOWN', 'LEFT', 'RIGHT']))
+            first.send_input('FLAG')
+        time.sleep(0.2)
+        elapsed = time.monotonic() - began
+        state, deltas = replay(second, state)
+        # No more than one update per tick, however fast inputs arrive
+        self.assertLessEqual(deltas, elapsed * 20 + 1)
+        self.assertEqual(state, bout.json())
+        stats = bout.stats()
+        self.assertEqual(stats['events'], 200 + 2)
+        self.assertGreater(stats['coalesced'], 150)
+
+
+class TestPlayerJson(unittest.TestCase):
+    def test_cached_until_changed(self):
+        bout = game.Bout(max_players=1)
+        player = bout.add_player()
+        first = player.json()
+        self.assertIs(player.json(), first)
+        player.send_input('RIGHT')
+        moved = player.json()
+        self.assertIsNot(moved, first)
+        player.send_input({'change-name': 'renamed'})
+        self.assertEqual(player.json()['name'], 'renamed')
+        self.assertGreater(game.cache_stats()['player_json_hits'], 0)
+
+
+class TestHiddenMines(unittest.TestCase):
+    def cells(self, state, player):
+        return state['players'][player.name]['minefield']['cells']
+
+    def kill(self, player):
+        field = player.mfield
+        if not any(c['probed'] for c in field.json()['cells']):
+            # The first probe is always safe
+            player.send_input('PROBE')
+        idx = next(i for i in range(field.width * field.height)
+                   if field._is_mine(i) and not field._cell(i).probed)
+        field.selected = list(divmod(idx, field.height))
+        player.send_input('PROBE')
+
+    def shown(self, state, player):
+        return [c for c in self.cells(state, player)
+                if c.get('contents') == game.Contents.mine]
+
+    def test_mines_shown_once_dead(self):
+        bout = game.Bout(max_players=2, minefield_size=(8, 8),
+                         minefield_constructor=ArrayMineField)
+        first, second = bout.add_player(), bout.add_player()
+        first.send_input('PROBE')
+        state, _ = replay(first)
+        for cell in self.cells(state, first):
+            # Only probed cells say what they hold
+            self.assertEqual('contents' in cell, cell['probed'])
+            self.assertEqual('contacts' in cell, cell['probed'])
+            self.assertNotIn('neighbors', cell)
+
+        self.kill(first)
+        state, _ = replay(first, state)
+        self.assertFalse(state['players'][first.name]['living'])
+        self.assertEqual(state, bout.json())
+        self.assertEqual(len(self.shown(state, first)),
+                         first.mfield.mine_count)
+        # The other player is still playing, so their mines stay hidden
+        self.assertFalse(any('contents' in c for c in self.cells(state, second)))
+
+    def test_shared_layout_hidden_until_over(self):
+        bout = game.Bout(max_players=2, minefield_size=(8, 8),
+                         shared_layout=True)
+        first, second = bout.add_player(), bout.add_player()
+        self.kill(first)
+        state, _ = replay(first)
+        self.assertFalse(state['players'][first.name]['living'])
+        # Only the mine which was probed is shown, since the living player
+        # has the same mines to find
+        self.assertEqual(len(self.shown(state, first)), 1)
+        state, _ = replay(second)
+        self.assertFalse(state['players'][first.name]['living'])
+        self.assertEqual(self.cells(state, first), [])
+        self.kill(second)
+        state, _ = replay(second, state)
+        self.assertEqual(state, bout.json())
+        for player in (first, second):
+            self.assertEqual(len(self.shown(state, player)),
+                             player.mfield.mine_count)
+
+    def test_shared_layout_cells_hidden_from_others(self):
+        bout = game.Bout(max_players=2, minefield_size=(8, 8),
+                         shared_layout=True)
+        first, second = bout.add_player(), bout.add_player()
+        state, _ = replay(second)
+        first.send_input('PROBE')
+        first.send_input('RIGHT')
+        first.send_input('FLAG')
+        state, _ = replay(second, state)
+        self.assertEqual(state, bout.json(viewer=second))
+        # Only how far along the other player is can be seen
+        field = state['players'][first.name]['minefield']
+        self.assertEqual(field['cells'], [])
+        self.assertIsNone(field['selected'])
+        self.assertEqual(field['probed_count'], first.mfield.probed_count)
+        self.assertEqual(field['flag_count'], first.mfield.flag_count)
+        # While players see all of their own minefield
+        state, _ = replay(first)
+        self.assertEqual(state['players'][first.name], first.json())
+
+
+if __name__ == '__main__':
+    unittest.main()
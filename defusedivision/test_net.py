@@ -0,0 +1,234 @@
+import threading
+import unittest
+import struct
+import socket
+import gzip
+import json
+
+from . import game, net
+from .minesweeper.chunkfield import ChunkedMineField
+
+
+def drain(player, conn):
+    """
+    Sends every message waiting in a player's stateq on `conn`, as the
+    msg_send thread of a PlayerServer would.
+    """
+    while not player.stateq.empty():
+        net.send(conn, player.stateq.get())
+
+
+class TestFrame(unittest.TestCase):
+    def test_frame_is_its_tuple(self):
+        frame = net.Frame(('new-state', {'players': {}}))
+        kind, state = frame
+        self.assertEqual(kind, 'new-state')
+        self.assertEqual(frame, ('new-state', {'players': {}}))
+        data = frame.encoded()
+        self.assertTrue(data.endswith(net.SEP))
+        decoded = json.loads(gzip.decompress(data[:-len(net.SEP)]))
+        self.assertEqual(decoded, ['new-state', {'players': {}}])
+
+    def test_encoded_once(self):
+        frame = net.Frame(('update-selected', ('me', [0, 0])))
+        before = net.COUNTERS['encodes']
+        self.assertIs(frame.encoded(), frame.encoded())
+        self.assertEqual(net.COUNTERS['encodes'] - before, 1)
+
+    def test_encodes_independent_of_players(self):
+        sender, receiver = socket.socketpair()
+        receiver.setblocking(False)
+        encodes = []
+        try:
+            for count in (1, 4):
+                bout = game.Bout(max_players=count)
+                players = [bout.add_player() for _ in range(count)]
+                for player in players:
+                    while not player.stateq.empty():
+                        player.stateq.get()
+                before = net.COUNTERS['encodes']
+                for key in ['PROBE', 'RIGHT', 'FLAG', 'DOWN', 'PROBE']:
+                    players[0].send_input(key)
+                for player in players:
+                    drain(player, sender)
+                    try:
+                        while receiver.recv(65536):
+                            pass
+                    except BlockingIOError:
+                        pass
+                encodes.append(net.COUNTERS['encodes'] - before)
+        finally:
+            sender.close()
+            receiver.close()
+        self.assertEqual(encodes[0], 5)
+        self.assertEqual(encodes[0], encodes[1])
+
+
+class TestCodec(unittest.TestCase):
+    def test_stream_and_legacy_frames(self):
+        sender, receiver = net.Codec(), net.Codec()
+        msgs = [{'join': {}}, ('new-state', {'seq': 1}), 'UP',
+                ('update-selected', ('me', [0, 0]))]
+        data = sender.encode(msgs[0]) + net.Frame(msgs[1]).encoded()
+        sender.start_stream()
+        data += sender.encode(msgs[2]) + sender.encode(net.Frame(msgs[3]))
+        # Messages split anywhere are decoded once they're complete
+        received = []
+        for i in range(0, len(data), 7):
+            received += receiver.feed(data[i:i + 7])
+        self.assertEqual(received, [{'join': {}}, ['new-state', {'seq': 1}],
+                                    'UP', ['update-selected', ['me', [0, 0]]]])
+
+    def test_length_frames(self):
+        codec = net.Codec()
+        codec.agree(net.answer(net.PROTOCOL, compress=False))
+        self.assertEqual(codec.encode('UP')[:1], net.LENGTH)
+        # The gzip of this message happens to contain SEP, so it can only be
+        # framed by its length
+        data = gzip.compress(b'16236', mtime=0)
+        self.assertIn(net.SEP, data)
+        frame = net.LENGTH + struct.pack('>I', len(data)) + data
+        self.assertEqual(net.Codec().feed(frame + frame), [16236, 16236])
+
+    def test_receive_large_message(self):
+        sender, receiver = socket.socketpair()
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        codec = net.Codec()
+        codec.agree({'version': 2})
+        big = {'cells': [str(x) for x in range(200000)]}
+        data = codec.encode(big) + net.encode('UP')
+        self.assertGreater(len(data), net.RECV_SIZE)
+        threading.Thread(target=sender.sendall, args=(data, )).start()
+        received = []
+        codec = net.Codec()
+        while len(received) < 2:
+            received += codec.receive(receiver)
+        self.assertEqual(received, [big, 'UP'])
+        # The room the large message needed isn't kept
+        self.assertEqual(len(codec._inbuf), net.RECV_SIZE)
+
+    def test_frame_header_allocates_nothing(self):
+        header = net.LENGTH + struct.pack('>I', 60 << 20)
+        codec = net.Codec()
+        self.assertEqual(codec.feed(header), [])
+        self.assertEqual(codec.feed(bytes(1000)), [])
+        self.assertEqual(len(codec._inbuf), net.RECV_SIZE)
+        # Players may only send small frames to a server
+        codec = net.Codec()
+        codec.max_frame = net.MAX_PLAYER_MESSAGE
+        with self.assertRaises(ConnectionError):
+            codec.feed(header)
+        with self.assertRaises(ConnectionError):
+            codec.feed(b'x' * (net.MAX_PLAYER_MESSAGE + 1))
+
+    def test_oversized_message(self):
+        sender = net.Codec()
+        sender.agree({'version': 2})
+        message = sender.encode('x' * 5000)
+        sender.start_stream()
+        streamed = sender.encode('x' * 5000)
+        for data in (net.encode('x' * 5000), message, streamed):
+            receiver = net.Codec()
+            receiver.max_message = 1000
+            with self.assertRaises(ConnectionError):
+                receiver.feed(data)
+        self.assertEqual(net.Codec().feed(streamed), ['x' * 5000])
+
+    def test_stream_smaller_than_gzip(self):
+        codec = net.Codec()
+        codec.start_stream()
+        state = {'cells': [{'x': x, 'probed': x % 3 == 0} for x in range(50)]}
+        first = codec.encode(state)
+        # Repeating a message costs little once it's in the stream's window
+        self.assertLess(len(codec.encode(state)) * 4, len(first))
+        self.assertLess(len(first), len(net.encode(state)) + 8)
+
+
+class TestPackedCells(unittest.TestCase):
+    def setUp(self):
+        self.bout = game.Bout(max_players=2, minefield_size=(8, 6))
+        self.players = [self.bout.add_player() for _ in range(2)]
+        self.players[0].send_input('PROBE')
+        self.players[1].send_input('FLAG')
+
+    def test_keyframe_round_trip(self):
+        state = self.bout.json()
+        msg = json.loads(net.json_dump(net.pack_message(('new-state', state))))
+        for player in msg[1]['players'].values():
+            self.assertNotIn('cells', player['minefield'])
+        kind, unpacked = net.unpack_message(msg)
+        for name, player in state['players'].items():
+            self.assertEqual(
+                unpacked['players'][name]['minefield']['cells'],
+                player['minefield']['cells'])
+        self.assertEqual(state, self.bout.json())
+
+    def test_listed_cells(self):
+        cells = self.bout.json()['players'][self.players[0].name][
+            'minefield']['cells']
+        some = [cells[7], cells[3], cells[40]]
+        self.assertEqual(net.unpack_cells(net.pack_cells(some, 8, 6)),
+                         some)
+
+    def test_huge_minefield_left_as_json(self):
+        bout = game.Bout(max_players=1, minefield_size=(70000, 4),
+                         minefield_constructor=ChunkedMineField)
+        player = bout.add_player()
+        player.stateq.get()
+        player.mfield.selected = [69000, 2]
+        player.send_input('PROBE')
+        player.send_input('FLAG')
+        msgs = [player.stateq.get() for _ in range(player.stateq.qsize())]
+        self.assertEqual([kind for kind, _ in msgs],
+                         ['new-state', 'state-delta'])
+        for msg in msgs:
+            packed = json.loads(net.json_dump(net.pack_message(msg)))
+            self.assertEqual(net.unpack_message(packed),
+                             json.loads(net.json_dump(msg)))
+
+    def test_codec_sends_packed_cells(self):
+        codec, receiver = net.Codec(), net.Codec()
+        codec.agree(net.answer(net.PROTOCOL))
+        self.assertEqual(codec.cells, 'binary')
+        frame = net.Frame(('new-state', self.bout.json()))
+        msg, = receiver.feed(codec.encode(frame))
+        self.assertEqual(msg, net.unpack_message(
+            json.loads(net.json_dump(net.pack_message(frame)))))
+        self.assertLess(
+            len(frame.payload('binary')) * 10, len(frame.payload()))
+
+
+class TestStateQueue(unittest.TestCase):
+    def test_keyframe_supersedes(self):
+        q = net.StateQueue()
+        q.put(('state-delta', {'seq': 1}))
+        q.put(('update-selected', ('me', [0, 0])))
+        q.put(('update-selected', ('you', [0, 0])))
+        q.put(('update-selected', ('me', [1, 0])))
+        self.assertEqual(q.qsize(), 3)
+        q.put(('new-state', {'seq': 1}))
+        q.put(('state-delta', {'seq': 2}))
+        self.assertEqual(q.get(), ('new-state', {'seq': 1}))
+        self.assertEqual(q.get(), ('state-delta', {'seq': 2}))
+        self.assertEqual(q.stats()['superseded'], 4)
+
+    def test_overflow(self):
+        overflows = []
+        q = net.StateQueue(maxsize=3, on_overflow=lambda: overflows.append(1))
+        for seq in range(5):
+            q.put(('state-delta', {'seq': seq}))
+        q.put('die')
+        self.assertEqual(overflows, [1])
+        self.assertEqual([q.get() for _ in range(4)], [
+            ('state-delta', {'seq': 0}),
+            ('state-delta', {'seq': 1}),
+            ('state-delta', {'seq': 2}),
+            'die',
+        ])
+        stats = q.stats()
+        self.assertEqual((stats['dropped'], stats['max_depth']), (2, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
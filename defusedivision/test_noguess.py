@@ -0,0 +1,111 @@
+import threading
+import unittest
+import time
+
+from .noguess import NoGuessGenerator, foothold, solvable
+from .minesweeper.minefield import MineField
+from . import game
+
+
+class SlowGenerator(object):
+    '''
+    SlowGenerator stands in for a NoGuessGenerator, returning `positions`
+    once `release` is set.
+    '''
+
+    def __init__(self, positions):
+        self.positions = positions
+        self.release = threading.Event()
+
+    def layout(self, width, height, mine_count, start):
+        self.release.wait(5)
+        return self.positions
+
+
+def wait_for(check):
+    deadline = time.time() + 5
+    while not check() and time.time() < deadline:
+        time.sleep(0.01)
+    return check()
+
+
+class TestNoGuess(unittest.TestCase):
+    def test_solvable(self):
+        # A lone mine in the corner is found from the far corner...
+        self.assertTrue(solvable(4, 4, [(0, 0)], (3, 3)))
+        # ...but two mines split across a 2x2 board are a coin toss
+        self.assertFalse(solvable(2, 2, [(0, 0), (1, 1)], (0, 1)))
+        # ...and probing a mine first is never solvable
+        self.assertFalse(solvable(4, 4, [(0, 0)], (0, 0)))
+
+    def test_layout(self):
+        generator = NoGuessGenerator(workers=1, budget=5)
+        try:
+            layout = generator.layout(9, 9, 10, (4, 4))
+        finally:
+            generator.close()
+        self.assertEqual(len(layout), 10)
+        self.assertFalse(set(layout) & foothold(9, 9, 4, 4))
+        self.assertTrue(solvable(9, 9, layout, (4, 4)))
+        stats = generator.stats()
+        self.assertEqual(stats['solved'], 1)
+        self.assertGreater(stats['boards_per_core_sec'], 0)
+
+    def test_fallback(self):
+        generator = NoGuessGenerator(workers=1, budget=5, max_cells=50)
+        self.assertIsNone(generator.layout(9, 9, 10, (4, 4)))
+        self.assertEqual(generator.stats()['fallbacks'], 1)
+
+    def test_first_probe_uses_generator(self):
+        generator = NoGuessGenerator(workers=1, budget=5)
+        bout = game.Bout(minefield_size=(9, 9), layout_generator=generator)
+        field = bout.new_minefield(9, 9, 10)
+        field.self_check = True
+        field.selected = [2, 6]
+        try:
+            self.assertTrue(game._probe_selected(field))
+        finally:
+            generator.close()
+        layout = [(x, y) for x in range(9) for y in range(9)
+                  if field._is_mine(x * 9 + y)]
+        self.assertTrue(solvable(9, 9, layout, (2, 6)))
+
+    def test_first_probe_waits_for_layout(self):
+        generator = SlowGenerator([(0, 0), (8, 8)])
+        self.addCleanup(generator.release.set)
+        bout = game.Bout(minefield_size=(9, 9), mine_count=2,
+                         layout_generator=generator)
+        player = bout.add_player()
+        field = player.mfield
+        field.selected = [2, 6]
+        player.send_input('PROBE')
+        # Other inputs are applied while the layout is generated
+        player.send_input('RIGHT')
+        self.assertEqual(field.selected, [3, 6])
+        self.assertEqual(field.probed_count, 0)
+        generator.release.set()
+        self.assertTrue(wait_for(lambda: field.probed_count))
+        self.assertTrue(field.board[2][6].probed)
+        self.assertTrue(field._is_mine(0) and field._is_mine(80))
+        self.assertTrue(player.living)
+
+    def test_shared_layout_generated_ahead(self):
+        generator = SlowGenerator([(0, 0), (8, 8)])
+        generator.release.set()
+        bout = game.Bout(minefield_size=(9, 9), mine_count=2,
+                         layout_generator=generator, shared_layout=True)
+        self.assertTrue(wait_for(lambda: bout._next_layouts))
+        layout = bout.add_player().mfield.layout
+        self.assertEqual(layout.mines[0] + layout.mines[80], 2)
+
+    def test_load_layout(self):
+        field = MineField(5, 5, 3)
+        field.self_check = True
+        field.load_layout([(0, 0), (4, 4), (2, 2)])
+        self.assertEqual(field.board[1][1].mine_contacts(), 2)
+        with self.assertRaises(ValueError):
+            field.load_layout([(0, 0)])
+
+
+if __name__ == '__main__':
+    unittest.main()